@@ -1,7 +1,18 @@
 from typing import Optional
 import os
 from supabase import create_client, Client
-from models import AppConfig, Agent, User
+from models import AppConfig, Agent, AgentVersion, User
+from postgrest.exceptions import APIError
+import hashlib
+import json
+
+
+def get_etag(payload: dict) -> str:
+    # Content hash of a row, kept current on every upsert so conditional reads
+    # can compare it without loading the row
+    content = {key: value for key, value in payload.items() if key != "etag"}
+    serialized = json.dumps(content, sort_keys=True, default=str)
+    return hashlib.sha1(serialized.encode("utf-8")).hexdigest()
 
 
 class Database:
@@ -37,6 +48,7 @@ class Database:
         payload = agent.dict()
         # Remove created_at field
         payload.pop("created_at", None)
+        payload["etag"] = get_etag(payload)
         response = (
             self.supabase.table("agent")
             .upsert(
@@ -49,6 +61,45 @@ class Database:
             return Agent(**row)
         return None
 
+    def upsert_cached_image(self, app_id: str, source_hash: str, image: str):
+        self.supabase.table("build_cache").upsert(
+            {"app_id": app_id, "source_hash": source_hash, "image": image},
+            on_conflict="app_id,source_hash",
+        ).execute()
+
+    def insert_agent_version(self, agent: Agent, image_digest: str) -> AgentVersion:
+        """Record a new immutable version of the agent with the next number."""
+        for _ in range(5):
+            response = (
+                self.supabase.table("agent_version")
+                .select("version")
+                .filter("finic_agent_id", "eq", agent.finic_id)
+                .order("version", desc=True)
+                .limit(1)
+                .execute()
+            )
+            latest = response.data[0]["version"] if response.data else 0
+            version = AgentVersion(
+                finic_agent_id=agent.finic_id,
+                agent_id=agent.id,
+                app_id=agent.app_id,
+                version=latest + 1,
+                image_digest=image_digest,
+                source_hash=agent.source_hash,
+            )
+            payload = json.loads(version.json())
+            payload.pop("created_at", None)
+            # (finic_agent_id, version) is unique, so a concurrent deploy
+            # that took the number makes this insert fail and retry
+            try:
+                response = (
+                    self.supabase.table("agent_version").insert(payload).execute()
+                )
+            except APIError:
+                continue
+            return AgentVersion(**response.data[0])
+        raise Exception(f"Could not record a new version of agent {agent.id}")
+
     def get_agent(self, config: AppConfig, id: str) -> Optional[Agent]:
         response = (
             self.supabase.table("agent")
@@ -1,12 +1,15 @@
 from database import Database
 from models import AppConfig, Agent
 import os
+from typing import Optional
 import zipfile
 from google.cloud.devtools import cloudbuild_v1
 from google.oauth2 import service_account
 import json
 from datetime import timedelta
 from google.cloud import run_v2
+from google.api_core.operation import Operation
+from .build_config import get_build_config
 
 
 class Deployer:
@@ -21,7 +24,12 @@ class Deployer:
         self.build_client = cloudbuild_v1.CloudBuildClient(credentials=credentials)
         self.jobs_client = run_v2.JobsClient(credentials=credentials)
 
-    def deploy_agent(self, agent: Agent):
+    def deploy_agent(self, agent: Agent) -> Optional[str]:
+        operation = self.submit_build(agent=agent)
+        # Wait for the build to complete
+        return self.get_build_result(agent=agent, operation=operation)
+
+    def submit_build(self, agent: Agent) -> Operation:
         # Check if the job already exists in Cloud Run
         try:
             self.jobs_client.get_job(
@@ -45,52 +53,26 @@ class Deployer:
                 )
             ),
         )
-        operation = self.build_client.create_build(
-            project_id=self.project_id, build=build
-        )
+        return self.build_client.create_build(project_id=self.project_id, build=build)
 
-        # Wait for the build to complete
+    def get_build_result(self, agent: Agent, operation: Operation) -> Optional[str]:
+        """Return the digest of the pushed image once the build has finished."""
         result = operation.result()
         if result.status != cloudbuild_v1.Build.Status.SUCCESS:
             raise Exception(f"Build failed with status: {result.status}")
 
         print(f"Built and pushed Docker image: {agent.finic_id}")
+        return self._get_image_digest(result)
+
+    def _get_image_digest(self, build: cloudbuild_v1.Build) -> Optional[str]:
+        # Pin to the pushed digest so a later build can't change what the
+        # cached image points to
+        for image in build.results.images:
+            if image.digest:
+                return f"{image.name.split(':')[0]}@{image.digest}"
+        return None
 
     def _get_build_config(self, agent: Agent, job_exists: bool) -> dict:
-        image_name = f"gcr.io/{self.project_id}/{agent.finic_id}:latest"
-        gcs_source = f"gs://{self.deployments_bucket}/{agent.finic_id}.zip"
-        job_command = "update" if job_exists else "create"
-        return {
-            "steps": [
-                {
-                    "name": "gcr.io/cloud-builders/gsutil",
-                    "args": ["cp", gcs_source, "/workspace/source.zip"],
-                },
-                {
-                    "name": "gcr.io/cloud-builders/gcloud",
-                    "entrypoint": "bash",
-                    "args": [
-                        "-c",
-                        "apt-get update && apt-get install -y unzip && unzip /workspace/source.zip -d /workspace/unzipped",
-                    ],
-                },
-                {
-                    "name": "gcr.io/cloud-builders/docker",
-                    "args": ["build", "-t", image_name, "/workspace/unzipped"],
-                },
-                {
-                    "name": "gcr.io/cloud-builders/docker",
-                    "args": ["push", image_name],
-                },
-                {
-                    "name": "gcr.io/google.com/cloudsdktool/cloud-sdk",
-                    "entrypoint": "bash",
-                    "args": [
-                        "-c",
-                        f"gcloud run jobs {job_command} {Agent.get_cloud_job_id(agent)} --image {image_name} --region us-central1 "
-                        f"--tasks=1 --max-retries={agent.num_retries} --task-timeout=86400s --memory=4Gi",
-                    ],
-                },
-            ],
-            "images": [image_name],
-        }
+        return get_build_config(
+            agent=agent, project_id=self.project_id, job_exists=job_exists
+        )
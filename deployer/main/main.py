@@ -1,26 +1,95 @@
 from database import Database
 import os
+import time
+from collections import deque
+from typing import List
 from deployer.deployer import Deployer
-from models.models import AgentStatus
+from models.models import Agent, AgentStatus
 from dotenv import load_dotenv
 
 load_dotenv()
 
 API_KEY = os.getenv("FINIC_API_KEY")
 AGENT_ID = os.getenv("FINIC_AGENT_ID")
+# Comma separated list of agents to deploy in one run
+AGENT_IDS = os.getenv("FINIC_AGENT_IDS")
+SOURCE_HASH = os.getenv("FINIC_SOURCE_HASH")
+MAX_CONCURRENT_BUILDS = int(os.getenv("FINIC_MAX_CONCURRENT_BUILDS", 10))
+BUILD_POLL_INTERVAL = float(os.getenv("FINIC_BUILD_POLL_INTERVAL", 10))
+
+
+def get_agent_ids() -> List[str]:
+    agent_ids = [AGENT_ID] if AGENT_ID else []
+    if AGENT_IDS:
+        agent_ids += [agent_id.strip() for agent_id in AGENT_IDS.split(",")]
+    # Dedupe while keeping the requested order
+    return list(dict.fromkeys(agent_id for agent_id in agent_ids if agent_id))
+
+
+def on_build_success(db: Database, agent: Agent, image_digest: str):
+    agent.status = AgentStatus.deployed
+    agent.image_digest = image_digest
+    # A rebuild of an agent without new source keeps its recorded hash
+    if AGENT_ID == agent.id and SOURCE_HASH:
+        agent.source_hash = SOURCE_HASH
+    if agent.source_hash and image_digest:
+        db.upsert_cached_image(
+            app_id=agent.app_id, source_hash=agent.source_hash, image=image_digest
+        )
+    if image_digest:
+        version = db.insert_agent_version(agent=agent, image_digest=image_digest)
+        agent.current_version = version.version
+    db.upsert_agent(agent)
+
+
+def on_build_failure(db: Database, agent: Agent, error: Exception):
+    print(f"Failed to deploy agent {agent.id}: {error}")
+    agent.status = AgentStatus.failed
+    db.upsert_agent(agent)
 
 
 def main():
     db = Database()
     config = db.get_config(API_KEY)
-    agent = db.get_agent(config=config, id=AGENT_ID)
-    try:
-        deployer = Deployer()
-        deployer.deploy_agent(agent=agent)
-        agent.status = AgentStatus.deployed
-        db.upsert_agent(agent)
-        return agent
-    except Exception as e:
-        agent.status = AgentStatus.failed
-        db.upsert_agent(agent)
-        raise e
+    agents = []
+    for agent_id in get_agent_ids():
+        agent = db.get_agent(config=config, id=agent_id)
+        if agent is None:
+            print(f"Agent {agent_id} not found")
+            continue
+        agents.append(agent)
+
+    deployer = Deployer()
+    pending = deque(agents)
+    running = {}
+    failed = []
+    # Keep up to MAX_CONCURRENT_BUILDS builds in flight and poll them together,
+    # updating each agent as soon as its own build finishes
+    while pending or running:
+        while pending and len(running) < MAX_CONCURRENT_BUILDS:
+            agent = pending.popleft()
+            try:
+                running[agent.id] = (agent, deployer.submit_build(agent=agent))
+            except Exception as e:
+                on_build_failure(db, agent, e)
+                failed.append(agent.id)
+
+        for agent_id, (agent, operation) in list(running.items()):
+            if not operation.done():
+                continue
+            del running[agent_id]
+            try:
+                image_digest = deployer.get_build_result(
+                    agent=agent, operation=operation
+                )
+                on_build_success(db, agent, image_digest)
+            except Exception as e:
+                on_build_failure(db, agent, e)
+                failed.append(agent.id)
+
+        if running:
+            time.sleep(BUILD_POLL_INTERVAL)
+
+    if failed:
+        raise Exception(f"Failed to deploy agents: {', '.join(failed)}")
+    return agents
@@ -1 +1 @@
-from .models import AppConfig, Agent, User, AgentStatus, ExecutionStatus
+from .models import AppConfig, Agent, AgentVersion, User, AgentStatus, ExecutionStatus
@@ -1,7 +1,8 @@
 from enum import Enum
 import datetime
 from typing import Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+import uuid
 
 
 class AppConfig(BaseModel):
@@ -37,7 +38,29 @@ class Agent(BaseModel):
     status: AgentStatus
     created_at: Optional[datetime.datetime] = None
     num_retries: int = 3
+    # Hash of the uploaded source archive and the image built from it
+    source_hash: Optional[str] = None
+    image_digest: Optional[str] = None
+    # Results of identical runs are reused for this long; off when not set
+    cache_ttl_seconds: Optional[int] = None
+    # Version whose image the agent's job currently runs
+    current_version: Optional[int] = None
+    # Tasks of a map execution that may run at once; no limit when not set
+    parallelism: Optional[int] = None
+    etag: Optional[str] = None
 
     @staticmethod
     def get_cloud_job_id(agent: "Agent") -> str:
         return f"job-{agent.finic_id}"
+
+
+class AgentVersion(BaseModel):
+    # Written once per successful build and never updated
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    finic_agent_id: str
+    agent_id: str
+    app_id: str
+    version: int
+    image_digest: str
+    source_hash: Optional[str] = None
+    created_at: Optional[datetime.datetime] = None
@@ -0,0 +1,104 @@
+import unittest
+import os
+
+from deployer.build_config import (
+    DEPS_HASH_FILE,
+    IMAGE_DIGEST_FILE,
+    LOCKFILES,
+    get_build_config,
+)
+from models import Agent, AgentStatus
+
+SOURCE = os.path.join(
+    os.path.dirname(__file__), "..", "..", "server", "agent_deployer", "build_config.py"
+)
+COPY = os.path.join(os.path.dirname(__file__), "..", "deployer", "build_config.py")
+
+
+def make_agent(**kwargs) -> Agent:
+    options = {
+        "finic_id": "abc",
+        "id": "agent",
+        "app_id": "app",
+        "description": "",
+        "status": AgentStatus.deploying,
+    }
+    options.update(kwargs)
+    return Agent(**options)
+
+
+def get_scripts(config: dict) -> list:
+    # The shell command of each step, or its plain args
+    return [
+        step["args"][1] if step.get("entrypoint") == "bash" else " ".join(step["args"])
+        for step in config["steps"]
+    ]
+
+
+class TestBuildConfig(unittest.TestCase):
+    def setUp(self):
+        self.config = get_build_config(
+            agent=make_agent(), project_id="project", job_exists=True
+        )
+        self.scripts = get_scripts(self.config)
+
+    def test_first_step_hashes_the_lockfiles(self):
+        script = self.scripts[0]
+        for lockfile in LOCKFILES:
+            self.assertIn(lockfile, script)
+        self.assertIn("sha256sum", script)
+        self.assertTrue(script.endswith(f"> {DEPS_HASH_FILE}"))
+
+    def test_build_reuses_latest_and_deps_layers(self):
+        build = next(s for s in self.scripts if s.startswith("docker build"))
+        self.assertIn(
+            f"--cache-from gcr.io/project/abc:deps-$$(cat {DEPS_HASH_FILE})", build
+        )
+        self.assertIn("--cache-from gcr.io/project/abc:latest", build)
+        self.assertEqual(self.config["images"], ["gcr.io/project/abc:latest"])
+
+    def test_digest_is_written_after_the_push(self):
+        push = self.scripts.index("push gcr.io/project/abc:latest")
+        inspect = next(
+            i for i, s in enumerate(self.scripts) if s.startswith("docker inspect")
+        )
+        self.assertGreater(inspect, push)
+        self.assertIn("RepoDigests", self.scripts[inspect])
+        self.assertTrue(self.scripts[inspect].endswith(f"> {IMAGE_DIGEST_FILE}"))
+
+    def test_job_is_pointed_at_the_digest(self):
+        deploy = self.scripts[-1]
+        self.assertTrue(deploy.startswith("gcloud run jobs update job-abc "))
+        self.assertIn(f"--image $$(cat {IMAGE_DIGEST_FILE})", deploy)
+        self.assertIn("--region us-central1", deploy)
+        self.assertIn("--max-retries=3", deploy)
+        self.assertIn("--parallelism=0", deploy)
+
+    def test_new_job_is_created_with_the_agent_settings(self):
+        config = get_build_config(
+            agent=make_agent(num_retries=1, parallelism=4),
+            project_id="project",
+            job_exists=False,
+            region="europe-west1",
+        )
+        deploy = get_scripts(config)[-1]
+        self.assertTrue(deploy.startswith("gcloud run jobs create job-abc "))
+        self.assertIn("--region europe-west1", deploy)
+        self.assertIn("--max-retries=1", deploy)
+        self.assertIn("--parallelism=4", deploy)
+
+
+class TestVendoredCopy(unittest.TestCase):
+    def test_matches_the_server_source(self):
+        if not os.path.exists(SOURCE):
+            self.skipTest("server sources are not in this checkout")
+        with open(SOURCE) as source, open(COPY) as copy:
+            self.assertEqual(
+                copy.read(),
+                source.read(),
+                "deployer/deployer/build_config.py is out of date; run `make vendor` in server/",
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
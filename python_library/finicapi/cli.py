@@ -3,8 +3,16 @@ import sys
 import json
 import webbrowser
 from dotenv import load_dotenv
-from .finic import Finic
-import subprocess
+import tempfile
+from .finic import Finic, DEPLOY_ERROR_MESSAGE
+from .packaging import (
+    build_manifest,
+    get_archive_md5,
+    get_manifest_hash,
+    write_archive,
+    load_last_deploy,
+    save_last_deploy,
+)
 
 def check_api_key():
     # Load existing .env file if it exists
@@ -33,26 +41,16 @@ def check_api_key():
     
     return api_key
 
-def zip_files_cli(zip_file):
-    try:
-        # First zip command (for untracked files)
-        command_1 = (
-            f"git ls-files -z --others --exclude-standard | xargs -0 zip -r {zip_file}"
-        )
-        subprocess.run(
-            command_1, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
-        )
-
-        # Second zip command (for tracked files)
-        command_2 = f"git ls-files -z | xargs -0 zip -ur {zip_file}"
-        subprocess.run(
-            command_2, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
-        )
-
-        print(f"Zipped files into {zip_file}")
 
-    except subprocess.CalledProcessError as e:
-        print(f"Error occurred during zipping: {e}")
+def print_progress(uploaded: int, total: int):
+    percent = 100 if total == 0 else uploaded * 100 // total
+    bar = "#" * (percent // 5)
+    sys.stdout.write(
+        f"\rUploading project files [{bar:<20}] {percent}% ({uploaded}/{total} bytes)"
+    )
+    if uploaded >= total:
+        sys.stdout.write("\n")
+    sys.stdout.flush()
 
 
 def create_finic_app(argv=sys.argv):
@@ -70,7 +68,7 @@ def create_finic_app(argv=sys.argv):
 
 
 def deploy(argv=sys.argv):
-    import pdb; pdb.set_trace()
+    force = "--force" in argv[1:]
     api_key = check_api_key()
 
     # Check if finic_config.json exists
@@ -97,19 +95,64 @@ def deploy(argv=sys.argv):
             print("Please specify the num_retries in the finic_config.json file")
             return
         num_retries = config["num_retries"]
+        # Opt-in result caching, in seconds; 0 turns it off
+        cache_ttl_seconds = config.get("cache_ttl_seconds")
+        # Tasks of a map run that may run at once; no limit when not set
+        parallelism = config.get("parallelism")
 
     finic = Finic(api_key=api_key, url=server_url)
+    project_dir = os.getcwd()
+
+    manifest = build_manifest(project_dir)
+    # The deploy settings are part of the build, so they are part of the hash
+    deploy_state = {
+        "manifest_hash": get_manifest_hash(manifest),
+        "agent_name": agent_name,
+        "num_retries": num_retries,
+        "cache_ttl_seconds": cache_ttl_seconds,
+        "parallelism": parallelism,
+    }
+    last_deploy = load_last_deploy(project_dir, agent_id)
+    if not force and last_deploy is not None:
+        last_deploy.pop("files", None)
+        source_hash = last_deploy.pop("source_hash", None)
+        if last_deploy == deploy_state:
+            # The state is saved when the build starts, so only skip if the
+            # server reports that build as deployed
+            agent = finic.get_agent(agent_id)
+            if (
+                agent is not None
+                and agent.get("status") == "deployed"
+                and agent.get("source_hash") == source_hash
+            ):
+                print(
+                    "No changes since the last deploy. Skipping upload and build (use --force to redeploy)."
+                )
+                return
+            print("The last deploy has not finished successfully. Deploying again.")
+
+    # Build the archive outside the project so later runs never package it
+    with tempfile.TemporaryDirectory() as temp_dir:
+        zip_file = os.path.join(temp_dir, "project.zip")
+        write_archive(project_dir, manifest, zip_file)
+        source_hash = get_archive_md5(zip_file)
+        print(f"Packaged {len(manifest)} files into {zip_file}")
+
+        result = finic.deploy_agent(
+            agent_id,
+            agent_name,
+            num_retries,
+            zip_file,
+            progress_callback=print_progress,
+            cache_ttl_seconds=cache_ttl_seconds,
+            parallelism=parallelism,
+        )
 
-    temp_dir = os.path.join(os.getcwd(), "temp")
-    zip_file = os.path.join(temp_dir, "project.zip")
-
-    # Create the /tmp directory if it doesn't exist
-    os.makedirs(temp_dir, exist_ok=True)
-
-    # Zip the project into /tmp/project.zip, ignoring all .gitignore patterns
-
-    zip_files_cli(zip_file)
-
-    result = finic.deploy_agent(agent_id, agent_name, num_retries, zip_file)
+    if result != DEPLOY_ERROR_MESSAGE:
+        save_last_deploy(
+            project_dir,
+            agent_id,
+            {**deploy_state, "source_hash": source_hash, "files": manifest},
+        )
 
     print(result)
@@ -1,5 +1,17 @@
-from typing import Dict, Optional, List
+from typing import BinaryIO, Callable, Deque, Dict, Optional, List, Tuple
 from functools import wraps
+from collections import deque
+import asyncio
+import contextvars
+import hashlib
+import io
+import itertools
+import logging
+import random
+import tempfile
+import threading
+import time
+import traceback
 import json
 import os
 from enum import Enum
@@ -18,9 +30,22 @@ class FinicEnvironment(str, Enum):
 
 class LogSeverity(str, Enum):
     DEFAULT = "DEFAULT"
+    DEBUG = "DEBUG"
+    INFO = "INFO"
     WARNING = "WARNING"
     ERROR = "ERROR"
 
+    @staticmethod
+    def from_logging_level(level: int) -> "LogSeverity":
+        if level >= logging.ERROR:
+            return LogSeverity.ERROR
+        elif level >= logging.WARNING:
+            return LogSeverity.WARNING
+        elif level >= logging.INFO:
+            return LogSeverity.INFO
+        else:
+            return LogSeverity.DEBUG
+
 
 class ExecutionLog(BaseModel):
     severity: LogSeverity
@@ -34,38 +59,402 @@ class ExecutionLog(BaseModel):
 class ExecutionAttempt(BaseModel):
     success: bool
     attempt_number: int
+    task_index: int = 0
+    sequence: Optional[int] = None
     logs: List[ExecutionLog] = []
 
 
+class ResultsReference(BaseModel):
+    key: str
+    size: int
+    content_type: str = "application/json"
+
+
 class LogExecutionAttemptRequest(BaseModel):
     execution_id: str
     agent_id: str
     results: Dict[str, Any]
+    results_ref: Optional[ResultsReference] = None
     attempt: ExecutionAttempt
 
 
-class StdoutLogger:
-    def __init__(self, original_stdout):
-        self.logs: List[ExecutionLog] = []
-        self.original_stdout = original_stdout
+class AppendExecutionLogsRequest(BaseModel):
+    execution_id: str
+    agent_id: str
+    attempt_number: int
+    task_index: int = 0
+    sequence: Optional[int] = None
+    logs: List[ExecutionLog]
+
+
+DEPLOY_CHUNK_SIZE = 8 * 1024 * 1024
+DEPLOY_ERROR_MESSAGE = "Error in deploying agent"
+# Results larger than this (bytes of JSON) are uploaded to blob storage
+RESULTS_INLINE_LIMIT = int(os.getenv("FINIC_RESULTS_INLINE_LIMIT", 256 * 1024))
+# Input key holding the items of a map run
+MAP_ITEMS_KEY = "items"
 
-    def write(self, message):
-        if message.strip():  # Avoid logging empty messages
-            log = ExecutionLog(
-                severity=LogSeverity.DEFAULT,
-                timestamp=datetime.datetime.now(datetime.timezone.utc),
-                message=message.strip(),
+# Raw log entry: (severity, message, unix timestamp). ExecutionLog models are
+# only built when logs are handed off, which keeps the hot write path cheap.
+RawLog = Tuple[LogSeverity, str, float]
+
+_current_capture: contextvars.ContextVar[Optional["LogCapture"]] = (
+    contextvars.ContextVar("finic_log_capture", default=None)
+)
+_default_capture: Optional["LogCapture"] = None
+_install_lock = threading.Lock()
+# Orders the flushed log batches of this process's attempt on the server
+_log_batch_sequence = itertools.count()
+
+
+def _get_context_name() -> str:
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        return task.get_name()
+    return threading.current_thread().name
+
+
+def _active_capture() -> Optional["LogCapture"]:
+    # Threads that did not open their own capture fall back to the workflow's
+    return _current_capture.get() or _default_capture
+
+
+class LogCapture:
+    """Collects stdout, stderr and logging records for the current context.
+
+    Entering a capture binds it to the current thread or asyncio task, so
+    parallel steps that each open their own capture do not mix their logs.
+    Code running in a context without a capture (e.g. a plain worker thread)
+    logs into the workflow's default capture.
+
+    By default every log is kept in memory until the workflow ends. Passing
+    ``max_bytes`` bounds the buffer: once the captured messages exceed the cap
+    the oldest ones are dropped (ring buffer) and a warning recording how many
+    were dropped is emitted with the next batch. Passing ``flush_callback``
+    starts a background thread that drains the buffer every
+    ``flush_interval`` seconds and hands each batch to the callback with its
+    sequence number, so memory stays bounded and logs survive a crash of the
+    container. A batch that fails to send is kept and sent again with the
+    same sequence number, so the server stores it once.
+
+    Consecutive identical lines are collapsed into a single log followed by a
+    "repeated N times" marker.
+
+    When a capture opened with ``with`` exits, the logs still in its buffer
+    are also forwarded to the capture that was active before it (or to the
+    workflow's), prefixed with ``name``, so they are uploaded with the
+    workflow's logs. ``name`` defaults to the current asyncio task or thread.
+    """
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        flush_callback: Optional[Callable[[List[ExecutionLog], int], None]] = None,
+        flush_interval: float = 10.0,
+        batch_size: int = 500,
+        name: Optional[str] = None,
+    ):
+        self.name = name
+        self.logs: Deque[RawLog] = deque()
+        self.max_bytes = max_bytes
+        self.flush_callback = flush_callback
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._buffered_bytes = 0
+        # Batch taken for the flush callback and its sequence number, until
+        # it has been sent
+        self._pending: Optional[Tuple[int, List[ExecutionLog]]] = None
+        self._last_message: Optional[Tuple[LogSeverity, str]] = None
+        self._repeat_count = 0
+        self._partial_lines: Dict[LogSeverity, str] = {}
+        self._lock = threading.Lock()
+        self._token: Optional[contextvars.Token] = None
+        self._stop_event = threading.Event()
+        self._flush_thread: Optional[threading.Thread] = None
+        if self.flush_callback:
+            self._flush_thread = threading.Thread(
+                target=self._flush_loop, name="finic-log-flusher", daemon=True
+            )
+            self._flush_thread.start()
+
+    def __enter__(self) -> "LogCapture":
+        install_log_capture()
+        if self.name is None:
+            self.name = _get_context_name()
+        self._token = _current_capture.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _current_capture.reset(self._token)
+        self._token = None
+        self.close()
+        parent = _active_capture()
+        if parent is not None and parent is not self:
+            self._forward(parent)
+
+    def write(self, severity: LogSeverity, text: str):
+        """Record stream output, splitting it into lines."""
+        with self._lock:
+            text = self._partial_lines.pop(severity, "") + text
+            *lines, partial = text.split("\n")
+            if partial:
+                self._partial_lines[severity] = partial
+            now = time.time()
+            for line in lines:
+                self._record(severity, line, now)
+
+    def record(self, severity: LogSeverity, message: str, timestamp: float):
+        with self._lock:
+            self._record(severity, message, timestamp)
+
+    def get_logs(self) -> List[ExecutionLog]:
+        """Return every log that has not been sent by the flush callback."""
+        with self._lock:
+            self._end_lines()
+            pending = self._pending[1] if self._pending else []
+            self._pending = None
+            logs = (
+                pending
+                + self._take_dropped_warning()
+                + [self._to_execution_log(log) for log in self.logs]
+            )
+            self.logs.clear()
+            self._buffered_bytes = 0
+        return logs
+
+    def _end_lines(self):
+        for severity, partial in self._partial_lines.items():
+            self._record(severity, partial, time.time())
+        self._partial_lines.clear()
+        self._emit_repeats()
+
+    def _forward(self, parent: "LogCapture"):
+        # The logs stay in this capture too, so get_logs() still returns them
+        with self._lock:
+            self._end_lines()
+            logs = list(self.logs)
+            warning = self._get_dropped_warning(self.dropped)
+        prefix = f"[{self.name}] " if self.name else ""
+        for log in warning:
+            parent.record(log.severity, prefix + log.message, time.time())
+        for severity, message, timestamp in logs:
+            parent.record(severity, prefix + message, timestamp)
+
+    def close(self):
+        """Stop the background flusher. A batch whose send failed is tried
+        once more; remaining logs are left in the buffer."""
+        self._stop_event.set()
+        if self._flush_thread and self._flush_thread is not threading.current_thread():
+            self._flush_thread.join()
+        if self.flush_callback and self._pending is not None:
+            self._send_pending()
+
+    def _record(self, severity: LogSeverity, message: str, timestamp: float):
+        message = message.strip()
+        if not message:  # Avoid logging empty messages
+            return
+        if (severity, message) == self._last_message:
+            self._repeat_count += 1
+            return
+        self._emit_repeats()
+        self._last_message = (severity, message)
+        self._append((severity, message, timestamp))
+
+    def _append(self, log: RawLog):
+        self.logs.append(log)
+        self._buffered_bytes += len(log[1])
+        self._trim()
+
+    def _trim(self):
+        if self.max_bytes is None:
+            return
+        while self._buffered_bytes > self.max_bytes and len(self.logs) > 1:
+            dropped = self.logs.popleft()
+            self._buffered_bytes -= len(dropped[1])
+            self.dropped += 1
+
+    def _emit_repeats(self):
+        if self._repeat_count:
+            severity = self._last_message[0]
+            self._append(
+                (
+                    severity,
+                    f"Previous message repeated {self._repeat_count} times",
+                    time.time(),
+                )
             )
-            self.logs.append(log)
-            self.original_stdout.write(
-                f"{log.timestamp} [{log.severity.value}] {log.message}\n"
+            self._repeat_count = 0
+            self._last_message = None
+
+    def _take_dropped_warning(self) -> List[ExecutionLog]:
+        warning = self._get_dropped_warning(self.dropped)
+        self.dropped = 0
+        return warning
+
+    def _get_dropped_warning(self, dropped: int) -> List[ExecutionLog]:
+        if not dropped:
+            return []
+        return [
+            ExecutionLog(
+                severity=LogSeverity.WARNING,
+                timestamp=datetime.datetime.now(datetime.timezone.utc),
+                message=f"{dropped} log messages dropped because the log buffer exceeded {self.max_bytes} bytes",
             )
+        ]
+
+    def _take_batch(self) -> Optional[Tuple[int, List[ExecutionLog]]]:
+        # Called with the lock held. The sequence number is drawn once per
+        # batch, so a resent batch replaces its own row on the server.
+        batch = []
+        while self.logs and len(batch) < self.batch_size:
+            log = self.logs.popleft()
+            self._buffered_bytes -= len(log[1])
+            batch.append(self._to_execution_log(log))
+        if not batch:
+            return None
+        return next(_log_batch_sequence), self._take_dropped_warning() + batch
+
+    def _send_pending(self) -> bool:
+        with self._lock:
+            if self._pending is None:
+                self._pending = self._take_batch()
+            pending = self._pending
+        if pending is None:
+            return False
+        sequence, logs = pending
+        try:
+            self.flush_callback(logs, sequence)
+        except Exception as e:
+            # The batch stays pending and is sent again on the next tick
+            sys.__stderr__.write(f"Error in flushing logs: {e}\n")
+            return False
+        with self._lock:
+            if self._pending is pending:
+                self._pending = None
+        return True
+
+    def _flush_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            while self._send_pending():
+                pass
+
+    @staticmethod
+    def _to_execution_log(log: RawLog) -> ExecutionLog:
+        severity, message, timestamp = log
+        return ExecutionLog(
+            severity=severity,
+            message=message,
+            timestamp=datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc),
+        )
+
+
+class LogStream:
+    """Stand-in for sys.stdout / sys.stderr that echoes every write to the
+    original stream and records it in the active LogCapture."""
+
+    def __init__(self, original_stream, severity: LogSeverity):
+        self.original_stream = original_stream
+        self.severity = severity
+
+    def write(self, message):
+        self.original_stream.write(message)
+        capture = _active_capture()
+        if capture is not None:
+            capture.write(self.severity, message)
+        return len(message)
 
     def flush(self):
-        pass
+        self.original_stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.original_stream, name)
+
+
+class LogCaptureHandler(logging.Handler):
+    """Records logging module records in the active LogCapture."""
+
+    def emit(self, record: logging.LogRecord):
+        capture = _active_capture()
+        if capture is None:
+            return
+        try:
+            message = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        capture.record(
+            LogSeverity.from_logging_level(record.levelno), message, record.created
+        )
+
+
+def get_log_capture_level() -> int:
+    # Lowest level of logging records captured, e.g. FINIC_LOG_LEVEL=DEBUG
+    level = logging.getLevelName(os.getenv("FINIC_LOG_LEVEL", "INFO").upper())
+    return level if isinstance(level, int) else logging.INFO
+
+
+def install_log_capture():
+    """Route stdout, stderr, warnings and logging through LogCapture.
+
+    The streams and the handler are installed once per process. Which capture
+    a write ends up in is decided per context, so installing is thread-safe and
+    idempotent. The root logger is lowered to the capture level
+    (FINIC_LOG_LEVEL, INFO by default) so info records reach the capture;
+    console handlers keep the threshold they had.
+    """
+    with _install_lock:
+        if not isinstance(sys.stdout, LogStream):
+            sys.stdout = LogStream(sys.stdout, LogSeverity.DEFAULT)
+        if not isinstance(sys.stderr, LogStream):
+            sys.stderr = LogStream(sys.stderr, LogSeverity.ERROR)
+        root_logger = logging.getLogger()
+        if not any(isinstance(h, LogCaptureHandler) for h in root_logger.handlers):
+            if not root_logger.handlers:
+                # Adding a handler disables logging.lastResort, so keep echoing
+                # warnings and errors to the console the way it would have
+                console_handler = logging.StreamHandler(sys.stderr.original_stream)
+                console_handler.setLevel(logging.WARNING)
+                root_logger.addHandler(console_handler)
+            root_logger.addHandler(LogCaptureHandler())
+        level = get_log_capture_level()
+        if root_logger.level > level:
+            for handler in root_logger.handlers:
+                if handler.level == logging.NOTSET and not isinstance(
+                    handler, LogCaptureHandler
+                ):
+                    handler.setLevel(root_logger.level)
+            root_logger.setLevel(level)
+        # warnings are emitted through the "py.warnings" logger with severity WARNING
+        logging.captureWarnings(True)
 
-    def get_logs(self):
-        return self.logs
+
+def get_task_index() -> int:
+    return int(os.getenv("CLOUD_RUN_TASK_INDEX", 0))
+
+
+def get_task_shard(input_data: Dict) -> Dict:
+    """The input of this task of a map run: the items of its shard only.
+
+    The server sets FINIC_SHARD_SIZE for map runs and Cloud Run runs one task
+    per shard, so task CLOUD_RUN_TASK_INDEX of CLOUD_RUN_TASK_COUNT takes the
+    items from index * shard_size. Other runs get their input unchanged.
+    """
+    shard_size = os.getenv("FINIC_SHARD_SIZE")
+    if not shard_size or MAP_ITEMS_KEY not in input_data:
+        return input_data
+    task_count = int(os.getenv("CLOUD_RUN_TASK_COUNT", 1))
+    task_index = get_task_index()
+    if task_index >= task_count:
+        raise Exception(
+            f"Task index {task_index} is out of range for {task_count} tasks"
+        )
+    start = task_index * int(shard_size)
+    items = input_data[MAP_ITEMS_KEY][start : start + int(shard_size)]
+    return {**input_data, MAP_ITEMS_KEY: items}
 
 
 class Finic:
@@ -78,7 +467,6 @@ class Finic:
 
         default_env = os.environ.get("FINIC_ENV") or FinicEnvironment.LOCAL
         self.environment = environment if environment else FinicEnvironment(default_env)
-        self.secrets_manager = FinicSecretsManager(api_key, environment=environment)
         if url:
             self.url = url
         else:
@@ -87,32 +475,48 @@ class Finic:
             self.api_key = api_key
         else:
             self.api_key = os.getenv("FINIC_API_KEY")
+        self.secrets_manager = FinicSecretsManager(
+            self.api_key, environment=self.environment, url=self.url
+        )
 
     def deploy_agent(
-        self, agent_id: str, agent_name: str, num_retries: int, project_zipfile: str
+        self,
+        agent_id: str,
+        agent_name: str,
+        num_retries: int,
+        project_zipfile: str,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        cache_ttl_seconds: Optional[int] = None,
+        parallelism: Optional[int] = None,
     ):
-        with open(project_zipfile, "rb") as f:
-            upload_file = f.read()
-
+        deploy_settings = {
+            "agent_id": agent_id,
+            "agent_description": agent_name,
+            "num_retries": num_retries,
+            "cache_ttl_seconds": cache_ttl_seconds,
+            "parallelism": parallelism,
+        }
         response = requests.post(
             f"{self.url}/get-agent-upload-link",
             headers={
                 "Authorization": f"Bearer {self.api_key}",
                 "Content-Type": "application/json",
             },
-            json={
-                "agent_id": agent_id,
-                "agent_description": agent_name,
-                "num_retries": num_retries,
-            },
+            json=deploy_settings,
         )
 
         response_json = response.json()
 
-        upload_link = response_json["upload_link"]
-
-        # Upload the project zip file to the upload link
-        requests.put(upload_link, data=upload_file)
+        if response_json.get("resumable_upload_link"):
+            self._upload_resumable(
+                response_json["resumable_upload_link"],
+                project_zipfile,
+                progress_callback=progress_callback,
+            )
+        else:
+            # Stream the file from disk instead of reading it into memory
+            with open(project_zipfile, "rb") as f:
+                requests.put(response_json["upload_link"], data=f)
 
         print("Project files uploaded for build.")
 
@@ -122,11 +526,7 @@ class Finic:
                 "Authorization": f"Bearer {self.api_key}",
                 "Content-Type": "application/json",
             },
-            json={
-                "agent_id": agent_id,
-                "agent_description": agent_name,
-                "num_retries": num_retries,
-            },
+            json=deploy_settings,
         )
 
         response_json = response.json()
@@ -134,21 +534,132 @@ class Finic:
         if "id" in response_json:
             return "Deploying agent. Check Finic dashboard for status: https://app.finic.io/"
         else:
-            return "Error in deploying agent"
+            return DEPLOY_ERROR_MESSAGE
+
+    def _upload_resumable(
+        self,
+        session_url: str,
+        path: str,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        max_retries: int = 5,
+    ):
+        """Upload a file to a resumable upload session in chunks.
+
+        Only one chunk is held in memory at a time. If a chunk fails, the
+        session is asked how many bytes it has persisted and the upload
+        continues from there instead of starting over.
+        """
+        total = os.path.getsize(path)
+        chunk_size = int(os.getenv("FINIC_DEPLOY_CHUNK_SIZE", DEPLOY_CHUNK_SIZE))
+        # Resumable sessions only accept chunks in multiples of 256 KiB
+        chunk_size = max(256 * 1024, chunk_size - chunk_size % (256 * 1024))
+        offset = 0
+        retries = 0
+        # Set after a failure: the session is asked for its offset before the
+        # next chunk, and that query is retried like any other request
+        resync = False
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    if resync:
+                        offset = self._query_upload_offset(session_url, total)
+                        resync = False
+                        if offset >= total and total > 0:
+                            break
+                    f.seek(offset)
+                    chunk = f.read(chunk_size)
+                    end = offset + len(chunk) - 1
+                    # An empty archive is uploaded with a single final request
+                    content_range = (
+                        f"bytes {offset}-{end}/{total}" if chunk else f"bytes */{total}"
+                    )
+                    response = requests.put(
+                        session_url,
+                        data=chunk,
+                        headers={"Content-Range": content_range},
+                        timeout=60,
+                    )
+                    if response.status_code in (200, 201):
+                        break
+                    if response.status_code != 308 or not chunk:
+                        raise Exception(
+                            f"Upload returned {response.status_code}: {response.text}"
+                        )
+                    offset = self._get_persisted_offset(response)
+                    retries = 0
+                except Exception as e:
+                    retries += 1
+                    if retries > max_retries:
+                        raise Exception(f"Error in uploading project files: {e}")
+                    time.sleep(0.5 * (2**retries) * (0.5 + random.random()))
+                    resync = True
+                    continue
+                if progress_callback:
+                    progress_callback(offset, total)
+        if progress_callback:
+            progress_callback(total, total)
+
+    def _query_upload_offset(self, session_url: str, total: int) -> int:
+        response = requests.put(
+            session_url, headers={"Content-Range": f"bytes */{total}"}, timeout=30
+        )
+        if response.status_code in (200, 201):
+            return total
+        return self._get_persisted_offset(response)
+
+    @staticmethod
+    def _get_persisted_offset(response: requests.Response) -> int:
+        # A 308 carries "Range: bytes=0-N" once any bytes have been persisted
+        persisted = response.headers.get("Range")
+        if not persisted:
+            return 0
+        return int(persisted.split("-")[-1]) + 1
+
+    def start_run(
+        self,
+        agent_id: str,
+        input: Dict,
+        bypass_cache: bool = False,
+        version: Optional[int] = None,
+        map_items: Optional[List[Any]] = None,
+        shard_size: Optional[int] = None,
+    ):
+        """Start a run of the agent.
 
-    def start_run(self, agent_id: str, input: Dict):
+        With map_items, the items are split into shards of shard_size and each
+        shard runs as its own Cloud Run task. Every task sees its shard under
+        the "items" key of the input.
+        """
         response = requests.post(
             f"{self.url}/run-agent",
             headers={
                 "Authorization": f"Bearer {self.api_key}",
                 "Content-Type": "application/json",
             },
-            json={"agent_id": agent_id, "input": input},
+            json={
+                "agent_id": agent_id,
+                "input": input,
+                "bypass_cache": bypass_cache,
+                "version": version,
+                "map_items": map_items,
+                "shard_size": shard_size,
+            },
         )
 
         response_json = response.json()
         return response_json
 
+    def get_agent(self, agent_id: str) -> Optional[Dict]:
+        response = requests.get(
+            f"{self.url}/get-agent",
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            params={"agent_id": agent_id},
+            timeout=30,
+        )
+        if response.status_code != 200:
+            return None
+        return response.json()
+
     def get_runs(self, agent_id: str):
         # TODO
         pass
@@ -169,26 +680,197 @@ class Finic:
             execution_id = os.getenv("FINIC_EXECUTION_ID")
             agent_id = os.getenv("FINIC_AGENT_ID")
             attempt_number = os.getenv("CLOUD_RUN_TASK_ATTEMPT")
+            task_index = get_task_index()
+
+            results_ref = None
+            serialized_results = json.dumps(results or {}).encode("utf-8")
+            if len(serialized_results) > RESULTS_INLINE_LIMIT:
+                results_ref = self._upload_results(
+                    execution_id,
+                    agent_id,
+                    attempt_number,
+                    serialized_results,
+                    task_index=task_index,
+                )
+                results = {}
 
             payload = LogExecutionAttemptRequest(
                 execution_id=execution_id,
                 agent_id=agent_id,
                 results=results,
+                results_ref=results_ref,
                 attempt=ExecutionAttempt(
                     success=success,
                     logs=logs,
                     attempt_number=attempt_number,
+                    task_index=task_index,
                 ),
             )
-            requests.post(
-                f"{self.url}/log-execution-attempt",
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json",
+            self._upload_attempt(payload)
+
+    def _upload_results(
+        self,
+        execution_id: str,
+        agent_id: str,
+        attempt_number: str,
+        data: bytes,
+        task_index: int = 0,
+    ) -> ResultsReference:
+        # Large results go straight from the container to blob storage and only
+        # a reference is stored with the execution
+        response = self._post_with_retry(
+            "/get-results-upload-link",
+            {
+                "execution_id": execution_id,
+                "agent_id": agent_id,
+                "attempt_number": attempt_number,
+                "task_index": task_index,
+            },
+        )
+        response_json = response.json()
+        upload_link = response_json["upload_link"]
+        if upload_link.startswith("file://"):
+            with open(upload_link[len("file://") :], "wb") as f:
+                f.write(data)
+        else:
+            response = requests.put(
+                upload_link,
+                data=data,
+                headers={"Content-Type": "application/json"},
+                timeout=300,
+            )
+            response.raise_for_status()
+        return ResultsReference(key=response_json["key"], size=len(data))
+
+    def _upload_attempt(self, payload: LogExecutionAttemptRequest):
+        # The serialized attempt is uploaded in bounded chunks that the server
+        # reassembles on commit. Chunks are keyed by execution, task, attempt
+        # and index, so retrying any call is safe.
+        data = payload.json()
+        chunk_size = int(os.getenv("FINIC_UPLOAD_CHUNK_SIZE", 512 * 1024))
+        chunks = [data[i : i + chunk_size] for i in range(0, len(data), chunk_size)]
+        for index, chunk in enumerate(chunks):
+            self._post_with_retry(
+                "/upload-execution-attempt-chunk",
+                {
+                    "execution_id": payload.execution_id,
+                    "agent_id": payload.agent_id,
+                    "attempt_number": payload.attempt.attempt_number,
+                    "task_index": payload.attempt.task_index,
+                    "chunk_index": index,
+                    "data": chunk,
                 },
-                json=json.loads(payload.json()),
-                timeout=5,
             )
+        response = self._post_with_retry(
+            "/commit-execution-attempt",
+            {
+                "execution_id": payload.execution_id,
+                "agent_id": payload.agent_id,
+                "attempt_number": payload.attempt.attempt_number,
+                "task_index": payload.attempt.task_index,
+                "num_chunks": len(chunks),
+                "checksum": hashlib.sha256(data.encode("utf-8")).hexdigest(),
+            },
+        )
+        if not response.json().get("committed"):
+            raise Exception(
+                f"Attempt {payload.attempt.attempt_number} of execution {payload.execution_id} was not stored"
+            )
+
+    def _post_with_retry(
+        self,
+        path: str,
+        body: Dict,
+        max_attempts: int = 5,
+        timeout: float = 30,
+        backoff: float = 0.5,
+    ) -> requests.Response:
+        """POST to the Finic API, retrying connection errors, timeouts, 429s and
+        5xx responses with exponential backoff and jitter."""
+        for attempt in range(max_attempts):
+            try:
+                response = requests.post(
+                    f"{self.url}{path}",
+                    headers={
+                        "Authorization": f"Bearer {self.api_key}",
+                        "Content-Type": "application/json",
+                    },
+                    json=body,
+                    timeout=timeout,
+                )
+                if response.status_code != 429 and response.status_code < 500:
+                    response.raise_for_status()
+                    return response
+                error = Exception(
+                    f"{path} returned {response.status_code}: {response.text}"
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            if attempt < max_attempts - 1:
+                time.sleep(backoff * (2**attempt) * (0.5 + random.random()))
+        raise Exception(
+            f"Request to {path} failed after {max_attempts} attempts: {error}"
+        )
+
+    def append_logs(self, logs: List[ExecutionLog], sequence: int):
+        payload = AppendExecutionLogsRequest(
+            execution_id=os.getenv("FINIC_EXECUTION_ID"),
+            agent_id=os.getenv("FINIC_AGENT_ID"),
+            attempt_number=os.getenv("CLOUD_RUN_TASK_ATTEMPT"),
+            task_index=get_task_index(),
+            sequence=sequence,
+            logs=logs,
+        )
+        response = requests.post(
+            f"{self.url}/append-execution-logs",
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json",
+            },
+            json=json.loads(payload.json()),
+            timeout=5,
+        )
+        response.raise_for_status()
+
+    def capture_logs(self, name: Optional[str] = None) -> LogCapture:
+        """Open a separate log capture for the current thread or task.
+
+        Use it as a context manager around parallel steps so their logs are
+        kept apart. The logs are returned by ``get_logs()`` on the capture,
+        and when it exits they are added to the workflow's logs prefixed with
+        ``name`` (the thread or task name by default).
+        """
+        return LogCapture(name=name)
+
+    def _create_log_capture(self) -> LogCapture:
+        if self.environment == FinicEnvironment.LOCAL:
+            return LogCapture()
+        return LogCapture(
+            max_bytes=int(os.getenv("FINIC_LOG_MAX_BYTES", 10 * 1024 * 1024)),
+            flush_callback=self.append_logs,
+            flush_interval=float(os.getenv("FINIC_LOG_FLUSH_INTERVAL", 10)),
+        )
+
+    def open_input(self) -> BinaryIO:
+        """Open the run input as a binary file.
+
+        Small inputs arrive inline in FINIC_INPUT. Large ones are stored by the
+        server and passed as FINIC_INPUT_URL; they are streamed to a temporary
+        file rather than held in memory, so workflows can also parse them
+        incrementally from the returned file.
+        """
+        input_url = os.environ.get("FINIC_INPUT_URL")
+        if not input_url:
+            return io.BytesIO(os.environ.get("FINIC_INPUT").encode("utf-8"))
+        if input_url.startswith("file://"):
+            return open(input_url[len("file://") :], "rb")
+        f = tempfile.TemporaryFile()
+        with requests.get(input_url, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                f.write(chunk)
+        f.seek(0)
+        return f
 
     def workflow_entrypoint(self, input_model: BaseModel):
 
@@ -207,9 +889,11 @@ class Finic:
                 raise Exception("Error in reading input.json file: ", e)
         else:
             try:
-                input_data = json.loads(os.environ.get("FINIC_INPUT"))
+                with self.open_input() as f:
+                    input_data = json.load(f)
             except Exception as e:
                 raise Exception("Error in parsing input data: ", e)
+            input_data = get_task_shard(input_data)
 
         try:
             input_data = input_model(**input_data)
@@ -219,19 +903,26 @@ class Finic:
         def decorator(func):
             @wraps(func)
             def wrapper():
-                stdout_logger = StdoutLogger(original_stdout=sys.stdout)
+                global _default_capture
+                if self.environment != FinicEnvironment.LOCAL:
+                    # Load every credential up front so lookups are in memory
+                    try:
+                        self.secrets_manager.prefetch()
+                    except Exception as e:
+                        print(f"Error in prefetching credentials: {e}")
+                capture = self._create_log_capture()
+                _default_capture = capture
                 try:
-                    sys.stdout = stdout_logger
-                    results = func(input_data)
-                    logs = stdout_logger.get_logs()
-                    self.log_attempt(success=True, logs=logs, results=results)
+                    with capture:
+                        results = func(input_data)
                 except Exception as e:
-                    logs = stdout_logger.get_logs()
+                    capture.close()
+                    logs = capture.get_logs()
                     logs.append(
                         ExecutionLog(
                             severity=LogSeverity.ERROR,
                             timestamp=datetime.datetime.now(datetime.timezone.utc),
-                            message=str(e),
+                            message=traceback.format_exc(),
                         )
                     )
                     self.log_attempt(
@@ -240,6 +931,11 @@ class Finic:
                         results={},
                     )
                     raise e
+                else:
+                    logs = capture.get_logs()
+                    self.log_attempt(success=True, logs=logs, results=results)
+                finally:
+                    _default_capture = None
 
             return wrapper
 
@@ -247,9 +943,29 @@ class Finic:
 
 
 class FinicSecretsManager:
-    def __init__(self, api_key, environment: FinicEnvironment):
+    """Looks up credentials for the workflow.
+
+    All credentials are loaded in one go (from secrets.json locally, or from
+    the Finic API in one bulk request) and kept in memory for ``ttl`` seconds,
+    so lookups in a tight loop make no file or network calls.
+    """
+
+    def __init__(
+        self,
+        api_key,
+        environment: FinicEnvironment,
+        url: Optional[str] = None,
+        ttl: Optional[float] = None,
+    ):
         self.api_key = api_key
         self.environment = environment
+        self.url = url
+        self.ttl = (
+            ttl if ttl is not None else float(os.getenv("FINIC_SECRETS_TTL", 300))
+        )
+        self._credentials: Optional[Dict[str, Dict]] = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
 
     def save_credentials(self, credentials: Dict, credential_id: str):
         if self.environment == FinicEnvironment.LOCAL:
@@ -258,23 +974,67 @@ class FinicSecretsManager:
             )
         else:
             # Save secrets in Finic API
-            pass
+            response = requests.post(
+                f"{self.url}/save-credentials",
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                },
+                json={"credential_id": credential_id, "credentials": credentials},
+                timeout=30,
+            )
+            response.raise_for_status()
+            with self._lock:
+                if self._credentials is not None:
+                    self._credentials = {
+                        **self._credentials,
+                        credential_id: credentials,
+                    }
 
     def get_credentials(self, credential_id: str):
-        if self.environment == FinicEnvironment.LOCAL:
-            # Check if secrets.json file is present
-            path = os.path.join(os.getcwd(), "secrets.json")
-            if not os.path.exists(path):
-                raise Exception(
-                    "If you are running the workflow locally, please provide secrets.json file in the base directory containing pyproject.toml"
-                )
+        return self._get_all_credentials().get(credential_id, {})
 
-            try:
-                with open(path, "r") as f:
-                    secrets = json.load(f)
-                    return secrets.get(credential_id, {})
-            except Exception as e:
-                raise Exception("Error in reading secrets.json file: ", e)
-        else:
-            # Fetch secrets from Finic API
-            pass
+    def prefetch(self):
+        """Load every credential into the cache ahead of the first lookup."""
+        self._get_all_credentials()
+
+    def _get_all_credentials(self) -> Dict[str, Dict]:
+        # Fast path without the lock: the dict is replaced, never mutated in place
+        credentials = self._credentials
+        if credentials is not None and time.monotonic() < self._expires_at:
+            return credentials
+        with self._lock:
+            if self._credentials is None or time.monotonic() >= self._expires_at:
+                if self.environment == FinicEnvironment.LOCAL:
+                    self._credentials = self._read_local_credentials()
+                else:
+                    self._credentials = self._fetch_remote_credentials()
+                self._expires_at = time.monotonic() + self.ttl
+            return self._credentials
+
+    def _read_local_credentials(self) -> Dict[str, Dict]:
+        # Check if secrets.json file is present
+        path = os.path.join(os.getcwd(), "secrets.json")
+        if not os.path.exists(path):
+            raise Exception(
+                "If you are running the workflow locally, please provide secrets.json file in the base directory containing pyproject.toml"
+            )
+
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            raise Exception("Error in reading secrets.json file: ", e)
+
+    def _fetch_remote_credentials(self) -> Dict[str, Dict]:
+        # Fetch secrets from Finic API
+        try:
+            response = requests.get(
+                f"{self.url}/list-credentials",
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=30,
+            )
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            raise Exception("Error in fetching credentials: ", e)
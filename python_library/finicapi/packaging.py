@@ -0,0 +1,160 @@
+from typing import Dict, List, Optional
+import fnmatch
+import hashlib
+import json
+import os
+import stat
+import subprocess
+import zipfile
+
+# Fixed timestamp for archive entries so identical sources give identical zips
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+# Deploy state lives here and is never packaged
+STATE_DIR = ".finic"
+ALWAYS_EXCLUDED = [".git/", f"{STATE_DIR}/"]
+
+
+def _git_ls_files(project_dir: str) -> Optional[List[str]]:
+    try:
+        result = subprocess.run(
+            ["git", "ls-files", "-z", "--cached", "--others", "--exclude-standard"],
+            cwd=project_dir,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return [path for path in result.stdout.decode("utf-8").split("\0") if path]
+
+
+def _read_gitignore(project_dir: str) -> List[str]:
+    path = os.path.join(project_dir, ".gitignore")
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def _is_ignored(path: str, is_dir: bool, patterns: List[str]) -> bool:
+    # Supports the common .gitignore forms: globs, anchored "/pattern",
+    # directory-only "pattern/" and negation "!pattern"
+    ignored = False
+    name = os.path.basename(path)
+    for pattern in patterns:
+        negate = pattern.startswith("!")
+        pattern = pattern[1:] if negate else pattern
+        if pattern.endswith("/"):
+            if not is_dir:
+                continue
+            pattern = pattern.rstrip("/")
+        if "/" in pattern:
+            matched = fnmatch.fnmatch(path, pattern.lstrip("/"))
+        else:
+            matched = fnmatch.fnmatch(name, pattern)
+        if matched:
+            ignored = not negate
+    return ignored
+
+
+def _walk_files(project_dir: str) -> List[str]:
+    patterns = _read_gitignore(project_dir)
+    files = []
+    for root, dirs, filenames in os.walk(project_dir):
+        rel_root = os.path.relpath(root, project_dir)
+        rel_root = "" if rel_root == "." else rel_root.replace(os.sep, "/") + "/"
+        dirs[:] = [d for d in dirs if not _is_ignored(rel_root + d, True, patterns)]
+        for filename in filenames:
+            path = rel_root + filename
+            if not _is_ignored(path, False, patterns):
+                files.append(path)
+    return files
+
+
+def list_project_files(project_dir: str) -> List[str]:
+    """List the files to package, respecting .gitignore.
+
+    Uses git when the project is a repository, so nested .gitignore files and
+    global excludes apply. Otherwise the top-level .gitignore is matched in
+    Python.
+    """
+    files = _git_ls_files(project_dir)
+    if files is None:
+        files = _walk_files(project_dir)
+    return sorted(
+        path
+        for path in set(files)
+        if not any(path.startswith(prefix) for prefix in ALWAYS_EXCLUDED)
+        # git lists tracked files that were deleted from the working tree
+        and os.path.isfile(os.path.join(project_dir, path))
+    )
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_manifest(project_dir: str) -> Dict[str, str]:
+    """Map every packaged file to the sha256 of its content."""
+    return {
+        path: _hash_file(os.path.join(project_dir, path))
+        for path in list_project_files(project_dir)
+    }
+
+
+def get_manifest_hash(manifest: Dict[str, str]) -> str:
+    digest = hashlib.sha256()
+    for path in sorted(manifest):
+        digest.update(f"{path}\0{manifest[path]}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def write_archive(project_dir: str, manifest: Dict[str, str], zip_file: str):
+    """Write a reproducible zip: sorted entries, fixed timestamps and modes."""
+    with zipfile.ZipFile(zip_file, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for path in sorted(manifest):
+            full_path = os.path.join(project_dir, path)
+            executable = os.stat(full_path).st_mode & stat.S_IXUSR
+            info = zipfile.ZipInfo(path, date_time=ZIP_DATE_TIME)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = (0o755 if executable else 0o644) << 16
+            with open(full_path, "rb") as src, archive.open(info, "w") as dst:
+                for block in iter(lambda: src.read(1024 * 1024), b""):
+                    dst.write(block)
+
+
+def get_archive_md5(zip_file: str) -> str:
+    """MD5 of the archive, which is what the server records as the source
+    hash of a successful build."""
+    digest = hashlib.md5()
+    with open(zip_file, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _last_deploy_path(project_dir: str, agent_id: str) -> str:
+    return os.path.join(project_dir, STATE_DIR, f"last_deploy_{agent_id}.json")
+
+
+def load_last_deploy(project_dir: str, agent_id: str) -> Optional[Dict]:
+    path = _last_deploy_path(project_dir, agent_id)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_last_deploy(project_dir: str, agent_id: str, deploy: Dict):
+    path = _last_deploy_path(project_dir, agent_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(deploy, f, indent=2, sort_keys=True)
@@ -1,6 +1,9 @@
 from database import Database
 from models import AppConfig, Agent
+from models.models import AgentVersion
 from fastapi import UploadFile
+from typing import Dict, List, Optional
+import base64
 import os
 import zipfile
 from google.cloud.devtools import cloudbuild_v1
@@ -9,6 +12,9 @@ import json
 from google.cloud import storage
 from datetime import timedelta
 from google.cloud import run_v2
+from google.api_core.exceptions import NotFound
+from google.protobuf import duration_pb2
+from .build_config import get_build_config
 
 
 class AgentDeployer:
@@ -37,29 +43,94 @@ class AgentDeployer:
         )
         return url
 
+    def get_agent_resumable_upload_link(self, agent: Agent) -> str:
+        # The session URI lets the client upload in chunks and resume from the
+        # last persisted byte after an interruption. Sessions stay valid for
+        # a week and need no further credentials.
+        bucket = self.storage_client.get_bucket(self.deployments_bucket)
+        blob = bucket.blob(f"{agent.finic_id}.zip")
+        return blob.create_resumable_upload_session(content_type="application/zip")
+
+    def get_source_hash(self, agent: Agent) -> Optional[str]:
+        # Archives are packaged reproducibly, so the MD5 GCS computes on upload
+        # identifies the source without downloading it. Composite objects
+        # have no MD5 and are always rebuilt.
+        bucket = self.storage_client.bucket(self.deployments_bucket)
+        blob = bucket.get_blob(f"{agent.finic_id}.zip")
+        if blob is None or not blob.md5_hash:
+            return None
+        return base64.b64decode(blob.md5_hash).hex()
+
+    def deploy_cached_image(self, agent: Agent, image: str):
+        """Point the agent's job at an already built image, skipping the build.
+        Also used to roll back to an earlier version's digest."""
+        self._deploy_image(
+            agent=agent, image=image, job_id=Agent.get_cloud_job_id(agent)
+        )
+
+    def deploy_version_job(self, agent: Agent, version: AgentVersion) -> str:
+        """Job that runs a pinned version, created the first time a run
+        targets it. Version images never change, so an existing job is
+        used as is."""
+        job_id = Agent.get_version_job_id(agent, version.version)
+        self._deploy_image(
+            agent=agent, image=version.image_digest, job_id=job_id, update=False
+        )
+        return job_id
+
+    def _deploy_image(self, agent: Agent, image: str, job_id: str, update: bool = True):
+        job_name = f"projects/{self.project_id}/locations/{self.location}/jobs/{job_id}"
+        try:
+            job = self.jobs_client.get_job(name=job_name)
+        except NotFound:
+            job = None
+
+        if job is None:
+            job = run_v2.Job(
+                template=run_v2.ExecutionTemplate(
+                    task_count=1,
+                    parallelism=agent.parallelism or 0,
+                    template=run_v2.TaskTemplate(
+                        containers=[
+                            run_v2.Container(
+                                image=image,
+                                resources=run_v2.ResourceRequirements(
+                                    limits={"memory": "4Gi"}
+                                ),
+                            )
+                        ],
+                        max_retries=agent.num_retries,
+                        timeout=duration_pb2.Duration(seconds=86400),
+                    ),
+                )
+            )
+            operation = self.jobs_client.create_job(
+                parent=f"projects/{self.project_id}/locations/{self.location}",
+                job=job,
+                job_id=job_id,
+            )
+        elif update:
+            job.template.template.containers[0].image = image
+            job.template.template.max_retries = agent.num_retries
+            job.template.parallelism = agent.parallelism or 0
+            operation = self.jobs_client.update_job(job=job)
+        else:
+            return
+        operation.result()
+
     def deploy_agent(
         self,
         agent: Agent,
         secret_key: str,
+        source_hash: Optional[str] = None,
     ):
-        request = run_v2.RunJobRequest(
-            name=f"projects/{self.project_id}/locations/{self.location}/jobs/finic-deployer",
-            overrides={
-                "container_overrides": [
-                    {
-                        "env": [
-                            {"name": "FINIC_API_KEY", "value": secret_key},
-                            {"name": "FINIC_AGENT_ID", "value": agent.id},
-                        ]
-                    }
-                ]
-            },
-        )
-        operation = self.jobs_client.run_job(request)
-
-        execution_path = operation.metadata.name
-        deployment_id = execution_path.split("/")[-1]
-        return deployment_id
+        env = [
+            {"name": "FINIC_API_KEY", "value": secret_key},
+            {"name": "FINIC_AGENT_ID", "value": agent.id},
+        ]
+        if source_hash:
+            env.append({"name": "FINIC_SOURCE_HASH", "value": source_hash})
+        return self._run_deployer(env)
 
         try:
             self.jobs_client.get_job(
@@ -94,41 +165,30 @@ class AgentDeployer:
 
         print(f"Built and pushed Docker image: {agent.finic_id}")
 
+    def deploy_agents(self, agents: List[Agent], secret_key: str):
+        """Rebuild several agents in one deployer run. The deployer submits
+        their builds concurrently and reuses each agent's recorded source hash."""
+        env = [
+            {"name": "FINIC_API_KEY", "value": secret_key},
+            {"name": "FINIC_AGENT_IDS", "value": ",".join(a.id for a in agents)},
+        ]
+        return self._run_deployer(env)
+
+    def _run_deployer(self, env: List[Dict]) -> str:
+        request = run_v2.RunJobRequest(
+            name=f"projects/{self.project_id}/locations/{self.location}/jobs/finic-deployer",
+            overrides={"container_overrides": [{"env": env}]},
+        )
+        operation = self.jobs_client.run_job(request)
+
+        execution_path = operation.metadata.name
+        deployment_id = execution_path.split("/")[-1]
+        return deployment_id
+
     def _get_build_config(self, agent: Agent, job_exists: bool) -> dict:
-        image_name = f"gcr.io/{self.project_id}/{agent.finic_id}:latest"
-        gcs_source = f"gs://{self.deployments_bucket}/{agent.finic_id}.zip"
-        job_command = "update" if job_exists else "create"
-        return {
-            "steps": [
-                {
-                    "name": "gcr.io/cloud-builders/gsutil",
-                    "args": ["cp", gcs_source, "/workspace/source.zip"],
-                },
-                {
-                    "name": "gcr.io/cloud-builders/gcloud",
-                    "entrypoint": "bash",
-                    "args": [
-                        "-c",
-                        "apt-get update && apt-get install -y unzip && unzip /workspace/source.zip -d /workspace/unzipped",
-                    ],
-                },
-                {
-                    "name": "gcr.io/cloud-builders/docker",
-                    "args": ["build", "-t", image_name, "/workspace/unzipped"],
-                },
-                {
-                    "name": "gcr.io/cloud-builders/docker",
-                    "args": ["push", image_name],
-                },
-                {
-                    "name": "gcr.io/google.com/cloudsdktool/cloud-sdk",
-                    "entrypoint": "bash",
-                    "args": [
-                        "-c",
-                        f"gcloud run jobs {job_command} {Agent.get_cloud_job_id(agent)} --image {image_name} --region us-central1 "
-                        f"--tasks=1 --max-retries={agent.num_retries} --task-timeout=86400s --memory=4Gi",
-                    ],
-                },
-            ],
-            "images": [image_name],
-        }
+        return get_build_config(
+            agent=agent,
+            project_id=self.project_id,
+            job_exists=job_exists,
+            region=self.location,
+        )
@@ -0,0 +1,104 @@
+# The server and the deployer are built as separate images, so each has a
+# copy of this module. server/agent_deployer/build_config.py is the source:
+# edit it and run `make vendor` in server/. deployer/tests fails if the two
+# differ.
+from models import Agent
+
+# Stock Cloud Build images already ship bash, coreutils, docker and gcloud, so
+# no step installs tools at build time.
+DOCKER_BUILDER = "gcr.io/cloud-builders/docker"
+GCLOUD_BUILDER = "gcr.io/google.com/cloudsdktool/cloud-sdk"
+
+# Files that determine an agent's dependency layers
+LOCKFILES = [
+    "poetry.lock",
+    "pyproject.toml",
+    "requirements.txt",
+    "Pipfile.lock",
+    "package-lock.json",
+]
+DEPS_HASH_FILE = "/workspace/.finic_deps_hash"
+IMAGE_DIGEST_FILE = "/workspace/.finic_image_digest"
+
+
+def get_build_config(
+    agent: Agent,
+    project_id: str,
+    job_exists: bool,
+    region: str = "us-central1",
+) -> dict:
+    """Build steps for an agent image.
+
+    The source archive is given to Cloud Build as the build source, which
+    unpacks it into /workspace, so there is no copy or unzip step. Images are
+    pushed under two tags: ``latest`` and ``deps-<hash of the lockfiles>``.
+    Both are pulled and passed to ``--cache-from``, so a code-only change
+    reuses the dependency layers of the previous build, and a lockfile that
+    was built before reuses its layers even if ``latest`` moved on. The job
+    is pointed at the pushed digest rather than ``latest``, so every version
+    stays addressable and a rollback only needs to re-point the job.
+
+    Only depends on its arguments, so it can be tested without GCP access.
+    """
+    repository = f"gcr.io/{project_id}/{agent.finic_id}"
+    image_name = f"{repository}:latest"
+    # "$$" escapes Cloud Build substitution, leaving a shell "$(...)"
+    deps_image = f"{repository}:deps-$$(cat {DEPS_HASH_FILE})"
+    job_command = "update" if job_exists else "create"
+    lockfiles = " ".join(LOCKFILES)
+    return {
+        "steps": [
+            {
+                "name": DOCKER_BUILDER,
+                "entrypoint": "bash",
+                "args": [
+                    "-c",
+                    f"cd /workspace && cat {lockfiles} 2>/dev/null | sha256sum | cut -c1-16 > {DEPS_HASH_FILE}",
+                ],
+            },
+            {
+                "name": DOCKER_BUILDER,
+                "entrypoint": "bash",
+                "args": [
+                    "-c",
+                    f"docker pull {deps_image}; docker pull {image_name}; true",
+                ],
+            },
+            {
+                "name": DOCKER_BUILDER,
+                "entrypoint": "bash",
+                "args": [
+                    "-c",
+                    f"docker build --cache-from {deps_image} --cache-from {image_name} "
+                    f"-t {image_name} -t {deps_image} /workspace",
+                ],
+            },
+            {
+                "name": DOCKER_BUILDER,
+                "entrypoint": "bash",
+                "args": ["-c", f"docker push {deps_image}"],
+            },
+            {
+                "name": DOCKER_BUILDER,
+                "args": ["push", image_name],
+            },
+            {
+                "name": DOCKER_BUILDER,
+                "entrypoint": "bash",
+                "args": [
+                    "-c",
+                    f"docker inspect --format '{{{{index .RepoDigests 0}}}}' {image_name} > {IMAGE_DIGEST_FILE}",
+                ],
+            },
+            {
+                "name": GCLOUD_BUILDER,
+                "entrypoint": "bash",
+                "args": [
+                    "-c",
+                    f"gcloud run jobs {job_command} {Agent.get_cloud_job_id(agent)} --image $$(cat {IMAGE_DIGEST_FILE}) --region {region} "
+                    f"--tasks=1 --parallelism={agent.parallelism or 0} --max-retries={agent.num_retries} --task-timeout=86400s --memory=4Gi",
+                ],
+            },
+        ],
+        "images": [image_name],
+    }
@@ -1 +1,6 @@
-from .agent_runner import AgentRunner
+from .agent_runner import (
+    AgentRunner,
+    MAP_ITEMS_KEY,
+    MAP_DEFAULT_SHARD_SIZE,
+    MAP_MAX_TASKS,
+)
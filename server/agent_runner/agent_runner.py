@@ -1,6 +1,6 @@
 import io
 from fastapi import UploadFile
-from typing import List, Optional, Tuple, Dict
+from typing import List, Optional, Tuple, Dict, Union
 from models.models import (
     AppConfig,
     User,
@@ -10,7 +10,10 @@ from models.models import (
     ExecutionStatus,
     ExecutionAttempt,
     ExecutionLog,
+    ExecutionLogBatch,
+    ExecutionTask,
     LogSeverity,
+    ResultsReference,
 )
 from supabase import create_client, Client
 import os
@@ -26,12 +29,29 @@ import pdb
 from collections import deque
 from database import Database
 import json
+import math
 from google.cloud import run_v2
 from google.oauth2 import service_account
 import uuid
 from google.cloud import logging_v2
 import pytz
 import asyncio
+from blob_storage import get_blob_storage
+
+# Inputs whose JSON is longer than this are passed through blob storage
+INPUT_INLINE_LIMIT = int(os.getenv("FINIC_INPUT_INLINE_LIMIT", 32 * 1024))
+# Entries per Cloud Logging page; the API default of 50 means many round trips
+LOG_PAGE_SIZE = int(os.getenv("CLOUD_LOGGING_PAGE_SIZE", 1000))
+TASK_ATTEMPT_LABEL = "run.googleapis.com/task_attempt"
+TASK_INDEX_LABEL = "run.googleapis.com/task_index"
+LOG_INGESTION_DELAY = datetime.timedelta(
+    seconds=int(os.getenv("CLOUD_LOGGING_INGESTION_DELAY", 300))
+)
+# Input key holding the items of a map execution; each task runs one shard
+MAP_ITEMS_KEY = "items"
+MAP_DEFAULT_SHARD_SIZE = int(os.getenv("MAP_DEFAULT_SHARD_SIZE", 100))
+# Cloud Run's limit on tasks per job execution
+MAP_MAX_TASKS = 10000
 
 
 class AgentRunner:
@@ -45,24 +65,56 @@ class AgentRunner:
         self.project = os.getenv("GCLOUD_PROJECT")
         self.location = os.getenv("GCLOUD_LOCATION")
         self.logging_client = logging_v2.Client(credentials=self.credentials)
+        self.blob_storage = get_blob_storage()
+
+    def _get_input_env(self, agent: Agent, execution_id: str, input: Dict) -> Dict:
+        serialized_input = json.dumps(input)
+        if len(serialized_input) <= INPUT_INLINE_LIMIT:
+            return {"name": "FINIC_INPUT", "value": serialized_input}
+        # Env overrides are size limited, so large inputs are passed by
+        # reference and downloaded by the agent
+        key = f"inputs/{agent.app_id}/{execution_id}.json"
+        self.blob_storage.put(
+            key, serialized_input.encode("utf-8"), content_type="application/json"
+        )
+        url = self.blob_storage.get_download_url(
+            key, expiration=datetime.timedelta(days=7)
+        )
+        return {"name": "FINIC_INPUT_URL", "value": url}
+
+    def start_agent(
+        self,
+        secret_key: str,
+        agent: Agent,
+        input: Dict,
+        job_id: Optional[str] = None,
+        shard_size: Optional[int] = None,
+    ) -> Execution:
+        """Start a Cloud Run execution of the agent's job.
 
-    def start_agent(self, secret_key: str, agent: Agent, input: Dict) -> Execution:
+        With a shard_size, the MAP_ITEMS_KEY list of the input is split into
+        shards of that size and the execution runs one task per shard. Every
+        task gets the whole input and picks its shard by CLOUD_RUN_TASK_INDEX.
+        """
         client = run_v2.JobsClient(credentials=self.credentials)
         execution_id = str(uuid.uuid4())
+        job_id = job_id or Agent.get_cloud_job_id(agent)
+        env = [
+            {"name": "FINIC_ENV", "value": FinicEnvironment.PROD.value},
+            self._get_input_env(agent, execution_id, input),
+            {"name": "FINIC_API_KEY", "value": secret_key},
+            {"name": "FINIC_AGENT_ID", "value": agent.id},
+            {"name": "FINIC_EXECUTION_ID", "value": execution_id},
+        ]
+        task_count = 1
+        if shard_size is not None:
+            task_count = math.ceil(len(input[MAP_ITEMS_KEY]) / shard_size)
+            env.append({"name": "FINIC_SHARD_SIZE", "value": str(shard_size)})
         request = run_v2.RunJobRequest(
-            name=f"projects/{self.project}/locations/{self.location}/jobs/{Agent.get_cloud_job_id(agent)}",
+            name=f"projects/{self.project}/locations/{self.location}/jobs/{job_id}",
             overrides={
-                "container_overrides": [
-                    {
-                        "env": [
-                            {"name": "FINIC_ENV", "value": FinicEnvironment.PROD.value},
-                            {"name": "FINIC_INPUT", "value": json.dumps(input)},
-                            {"name": "FINIC_API_KEY", "value": secret_key},
-                            {"name": "FINIC_AGENT_ID", "value": agent.id},
-                            {"name": "FINIC_EXECUTION_ID", "value": execution_id},
-                        ]
-                    }
-                ]
+                "container_overrides": [{"env": env}],
+                "task_count": task_count,
             },
         )
         operation = client.run_job(request)
@@ -78,36 +130,287 @@ class AgentRunner:
             cloud_provider_id=cloud_provider_id,
             status=ExecutionStatus.running,
             start_time=datetime.datetime.now(tz=datetime.timezone.utc),
+            task_count=task_count,
+            shard_size=shard_size,
         )
 
-    def _get_logs_for_execution(
-        self, execution: Execution, agent: Agent, attempt_number: int
-    ) -> List[ExecutionLog]:
+    def _get_logs_key(
+        self, execution: Execution, attempt_number: int, task_index: int = 0
+    ) -> str:
+        if task_index:
+            return f"logs/{execution.app_id}/{execution.id}/task-{task_index}/{attempt_number}.json"
+        return f"logs/{execution.app_id}/{execution.id}/{attempt_number}.json"
+
+    def _get_cached_logs(
+        self, execution: Execution
+    ) -> Dict[Tuple[int, int], List[ExecutionLog]]:
+        cached = {}
+        prefix = f"logs/{execution.app_id}/{execution.id}/"
+        for key in self.blob_storage.list(prefix):
+            *task, filename = key[len(prefix) :].split("/")
+            task_index = int(task[0][len("task-") :]) if task else 0
+            attempt_number = int(filename.split(".")[0])
+            data = json.loads(b"".join(self.blob_storage.stream(key)))
+            cached[(task_index, attempt_number)] = [ExecutionLog(**log) for log in data]
+        return cached
+
+    def _cache_logs(
+        self,
+        execution: Execution,
+        attempt_number: int,
+        task_index: int,
+        logs: List[ExecutionLog],
+    ):
+        data = json.dumps([json.loads(log.json()) for log in logs])
+        self.blob_storage.put(
+            self._get_logs_key(execution, attempt_number, task_index),
+            data.encode("utf-8"),
+            content_type="application/json",
+        )
+
+    def get_logs_for_execution(
+        self, execution: Execution, agent: Agent
+    ) -> Dict[Tuple[int, int], List[ExecutionLog]]:
+        """Cloud Logging entries of every attempt, keyed by task index and
+        attempt number.
+
+        All attempts are fetched in one query and split by the task_index and
+        task_attempt labels. Logs of a finished execution never change, so
+        they are cached in blob storage and later views make no Logging API
+        calls.
+        """
+        # Logs are final once the execution has ended and late entries have
+        # had time to be ingested
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
+        final = (
+            execution.status != ExecutionStatus.running
+            and execution.end_time is not None
+            and now - execution.end_time > LOG_INGESTION_DELAY
+        )
+        if final:
+            cached = self._get_cached_logs(execution)
+            if cached:
+                return dict(sorted(cached.items()))
+
         filters = [
-            f'resource.type ="cloud_run_job"',
-            f'resource.labels.job_name="{Agent.get_cloud_job_id(agent)}"',
+            f'resource.type="cloud_run_job"',
+            f'resource.labels.job_name="{execution.cloud_job_id or Agent.get_cloud_job_id(agent)}"',
             f'labels."run.googleapis.com/execution_name"="{execution.cloud_provider_id}"',
-            f'labels."run.googleapis.com/task_attempt"="{attempt_number}"',
         ]
-        logs = []
+        fetched: Dict[Tuple[int, int], List[ExecutionLog]] = {}
         for entry in self.logging_client.list_entries(
             resource_names=[f"projects/{self.project}"],
-            filter_=" ".join(filters),
+            filter_=" AND ".join(filters),
             order_by=logging_v2.ASCENDING,
+            page_size=LOG_PAGE_SIZE,
         ):
-
             severity = LogSeverity.from_cloud_logging_severity(entry.severity)
             if severity is None:
                 print(f"Unknown severity: {entry.severity}")
                 continue
-            logs.append(
+            labels = entry.labels or {}
+            key = (
+                int(labels.get(TASK_INDEX_LABEL, 0)),
+                int(labels.get(TASK_ATTEMPT_LABEL, 0)),
+            )
+            fetched.setdefault(key, []).append(
                 ExecutionLog(
                     severity=severity,
                     message=str(entry.payload),
                     timestamp=entry.timestamp,
                 )
             )
-        return logs
+
+        if final:
+            # Attempts without entries are cached too, so a finished
+            # execution is always served from the cache
+            for attempt in execution.attempts:
+                fetched.setdefault((attempt.task_index, attempt.attempt_number), [])
+            for (task_index, attempt_number), logs in fetched.items():
+                self._cache_logs(execution, attempt_number, task_index, logs)
+        return dict(sorted(fetched.items()))
+
+    @staticmethod
+    def attach_logs(
+        attempts: List[ExecutionAttempt],
+        logs: Dict[Tuple[int, int], List[ExecutionLog]],
+    ) -> List[ExecutionAttempt]:
+        """Attempts with their logs replaced by the Cloud Logging entries of
+        the same task and attempt. Entries of an attempt that was never
+        recorded become an unfinished attempt."""
+        merged = {(a.task_index, a.attempt_number): a.copy() for a in attempts}
+        for (task_index, attempt_number), attempt_logs in logs.items():
+            attempt = merged.get((task_index, attempt_number))
+            if attempt is None:
+                attempt = ExecutionAttempt(
+                    success=False,
+                    attempt_number=attempt_number,
+                    task_index=task_index,
+                    finished=False,
+                )
+                merged[(task_index, attempt_number)] = attempt
+            attempt.logs = attempt_logs
+        return [merged[key] for key in sorted(merged)]
+
+    @staticmethod
+    def merge_flushed_logs(
+        attempts: List[ExecutionAttempt], batches: List[ExecutionLogBatch]
+    ) -> List[ExecutionAttempt]:
+        """Attempts with the logs their containers flushed while running.
+
+        Batches of an attempt that has not been recorded yet become an
+        unfinished attempt, so the logs of a container that died before
+        reporting are kept. Batches of recorded attempts are already part of
+        their logs and are skipped.
+        """
+        merged = {(a.task_index, a.attempt_number): a.copy() for a in attempts}
+        for batch in sorted(
+            batches, key=lambda b: (b.task_index, b.attempt_number, b.sequence)
+        ):
+            key = (batch.task_index, batch.attempt_number)
+            attempt = merged.get(key)
+            if attempt is None:
+                attempt = ExecutionAttempt(
+                    success=False,
+                    attempt_number=batch.attempt_number,
+                    task_index=batch.task_index,
+                    logs=[],
+                    finished=False,
+                )
+                merged[key] = attempt
+            if not attempt.finished:
+                attempt.logs = attempt.logs + batch.logs
+        return [merged[key] for key in sorted(merged)]
+
+    @staticmethod
+    def get_attempt(
+        execution: Union[Execution, ExecutionTask],
+        attempt_number: int,
+        task_index: int = 0,
+    ) -> Optional[ExecutionAttempt]:
+        return next(
+            (
+                a
+                for a in execution.attempts
+                if a.attempt_number == attempt_number and a.task_index == task_index
+            ),
+            None,
+        )
+
+    @staticmethod
+    def is_attempt_recorded(
+        execution: Union[Execution, ExecutionTask],
+        attempt_number: int,
+        task_index: int = 0,
+    ) -> bool:
+        attempt = AgentRunner.get_attempt(execution, attempt_number, task_index)
+        return attempt is not None and attempt.finished
+
+    def get_results_key(
+        self, app_id: str, execution_id: str, attempt_number: int, task_index: int = 0
+    ) -> str:
+        if task_index:
+            return f"results/{app_id}/{execution_id}/task-{task_index}/{attempt_number}.json"
+        return f"results/{app_id}/{execution_id}/{attempt_number}.json"
+
+    def get_results_upload_link(
+        self, app_id: str, execution_id: str, attempt_number: int, task_index: int = 0
+    ) -> Tuple[str, str]:
+        key = self.get_results_key(app_id, execution_id, attempt_number, task_index)
+        url = self.blob_storage.get_upload_url(
+            key, expiration=datetime.timedelta(hours=1), content_type="application/json"
+        )
+        return key, url
+
+    @staticmethod
+    def get_task_attempts(tasks: List[ExecutionTask]) -> List[ExecutionAttempt]:
+        return [
+            a
+            for task in sorted(tasks, key=lambda t: t.task_index)
+            for a in task.attempts
+        ]
+
+    def update_task(
+        self,
+        agent: Agent,
+        task: ExecutionTask,
+        attempt: ExecutionAttempt,
+        results: Dict,
+        results_ref: Optional[ResultsReference] = None,
+    ) -> ExecutionTask:
+        task.attempts = self._add_attempt(task.attempts, attempt)
+        # A settled task keeps its outcome, e.g. when a recorded attempt is
+        # sent again
+        if task.status != ExecutionStatus.running:
+            return task
+        if attempt.success:
+            task.status = ExecutionStatus.successful
+            task.results = results
+            task.results_ref = results_ref
+        elif len(task.attempts) >= agent.num_retries + 1:
+            task.status = ExecutionStatus.failed
+        return task
+
+    @staticmethod
+    def update_map_execution(
+        execution: Execution, tasks: List[ExecutionTask]
+    ) -> Execution:
+        # A map execution succeeds once every task has succeeded and fails as
+        # soon as any task runs out of retries, like the Cloud Run execution
+        execution.attempts = AgentRunner.get_task_attempts(tasks)
+        succeeded = {
+            t.task_index: t for t in tasks if t.status == ExecutionStatus.successful
+        }
+        if any(t.status == ExecutionStatus.failed for t in tasks):
+            execution.status = ExecutionStatus.failed
+            execution.end_time = datetime.datetime.now(tz=datetime.timezone.utc)
+        elif len(succeeded) == execution.task_count:
+            execution.status = ExecutionStatus.successful
+            execution.end_time = datetime.datetime.now(tz=datetime.timezone.utc)
+            # Results are listed in shard order. Offloaded results are in
+            # task_results_refs and are None in the list.
+            execution.results = {
+                "results": [
+                    succeeded[i].results if succeeded[i].results_ref is None else None
+                    for i in range(execution.task_count)
+                ]
+            }
+            execution.task_results_refs = {
+                i: t.results_ref
+                for i, t in succeeded.items()
+                if t.results_ref is not None
+            }
+        return execution
+
+    def verify_results_ref(
+        self, app_id: str, execution_id: str, results_ref: ResultsReference
+    ) -> ResultsReference:
+        # Only accept references to this execution's own results, and take the
+        # size from storage rather than from the client
+        prefix = f"results/{app_id}/{execution_id}/"
+        if not results_ref.key.startswith(prefix):
+            raise Exception(f"Invalid results reference: {results_ref.key}")
+        size = self.blob_storage.get_size(results_ref.key)
+        if size is None:
+            raise Exception(f"Results not found: {results_ref.key}")
+        return ResultsReference(
+            key=results_ref.key, size=size, content_type=results_ref.content_type
+        )
+
+    @staticmethod
+    def _add_attempt(
+        attempts: List[ExecutionAttempt], attempt: ExecutionAttempt
+    ) -> List[ExecutionAttempt]:
+        # Keep any logs that were flushed before the attempt finished
+        merged = {(a.task_index, a.attempt_number): a for a in attempts}
+        key = (attempt.task_index, attempt.attempt_number)
+        flushed = merged.get(key)
+        if flushed is not None and not flushed.finished:
+            attempt.logs = flushed.logs + attempt.logs
+        merged[key] = attempt
+
+        # Make sure the list is deduped and ordered by task and attempt number
+        return [merged[key] for key in sorted(merged)]
 
     def update_execution(
         self,
@@ -115,29 +418,16 @@ class AgentRunner:
         execution: Execution,
         attempt: ExecutionAttempt,
         results: Dict,
+        results_ref: Optional[ResultsReference] = None,
     ):
-
-        # Add the attempt to the execution
-        execution.attempts.append(attempt)
-
-        # Make sure the list is deduped and ordered by attempt number
-        execution.attempts = list(
-            sorted(
-                list(
-                    {
-                        attempt.attempt_number: attempt
-                        for attempt in execution.attempts
-                    }.values()
-                ),
-                key=lambda x: x.attempt_number,
-            )
-        )
+        execution.attempts = self._add_attempt(execution.attempts, attempt)
 
         # Update the execution status
         if attempt.success:
             execution.status = ExecutionStatus.successful
             execution.end_time = datetime.datetime.now(tz=datetime.timezone.utc)
             execution.results = results
+            execution.results_ref = results_ref
         elif len(execution.attempts) == agent.num_retries + 1:
             execution.status = ExecutionStatus.failed
             execution.end_time = datetime.datetime.now(tz=datetime.timezone.utc)
@@ -0,0 +1,6 @@
+from .analytics import (
+    DurationSketch,
+    RollupUpdater,
+    compute_rollups,
+    summarize_rollups,
+)
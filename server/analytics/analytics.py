@@ -0,0 +1,240 @@
+from typing import Dict, List, Optional
+from models.models import (
+    AgentRollup,
+    Execution,
+    ExecutionStatus,
+    RollupGranularity,
+)
+import datetime
+import math
+import os
+import uuid
+import numpy as np
+import pandas as pd
+
+# Relative accuracy of the duration percentiles
+SKETCH_ACCURACY = float(os.getenv("ROLLUP_SKETCH_ACCURACY", 0.02))
+SKETCH_GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+# Durations below this many seconds share the lowest bucket
+SKETCH_MIN_DURATION = 0.001
+ROLLUP_MAX_RETRIES = 5
+TERMINAL_STATUSES = [ExecutionStatus.successful, ExecutionStatus.failed]
+GRANULARITY_FREQUENCIES = {RollupGranularity.hour: "h", RollupGranularity.day: "D"}
+
+
+class DurationSketch:
+    """Log-scale histogram of durations.
+
+    Every bucket spans a constant ratio, so a percentile read from it is
+    within SKETCH_ACCURACY of the true value. Sketches merge by adding
+    counts, which is what lets hourly rollups be updated one execution at a
+    time and combined into any range.
+    """
+
+    def __init__(self, counts: Optional[Dict[str, int]] = None):
+        self.counts = {int(key): value for key, value in (counts or {}).items()}
+
+    @staticmethod
+    def get_index(duration: float) -> int:
+        return math.ceil(math.log(max(duration, SKETCH_MIN_DURATION), SKETCH_GAMMA))
+
+    def add(self, duration: float, count: int = 1):
+        index = self.get_index(duration)
+        self.counts[index] = self.counts.get(index, 0) + count
+
+    def merge(self, other: "DurationSketch"):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+
+    def quantile(self, q: float) -> Optional[float]:
+        total = sum(self.counts.values())
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen > rank:
+                break
+        # Midpoint of the bucket (gamma^(i-1), gamma^i]
+        return 2 * SKETCH_GAMMA**index / (SKETCH_GAMMA + 1)
+
+    def to_dict(self) -> Dict[str, int]:
+        return {str(index): count for index, count in sorted(self.counts.items())}
+
+
+def get_bucket_start(
+    timestamp: datetime.datetime, granularity: RollupGranularity
+) -> datetime.datetime:
+    timestamp = timestamp.astimezone(datetime.timezone.utc)
+    if granularity == RollupGranularity.day:
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def get_duration(execution: Execution) -> Optional[float]:
+    if execution.start_time is None or execution.end_time is None:
+        return None
+    return (execution.end_time - execution.start_time).total_seconds()
+
+
+class RollupUpdater:
+    """Folds finished executions into the hourly and daily rollups."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def record_execution(self, execution: Execution):
+        if execution.status not in TERMINAL_STATUSES or execution.end_time is None:
+            return
+        for granularity in RollupGranularity:
+            self._record(execution, granularity)
+
+    def _record(self, execution: Execution, granularity: RollupGranularity):
+        bucket_start = get_bucket_start(execution.end_time, granularity)
+        id = AgentRollup.get_id(
+            execution.app_id, execution.user_defined_agent_id, granularity, bucket_start
+        )
+        duration = get_duration(execution)
+        # Read-modify-write guarded by the row version, retried on conflict
+        for _ in range(ROLLUP_MAX_RETRIES):
+            rollup = self.db.get_rollups([id]).get(id)
+            expected_version = rollup.version if rollup else None
+            if rollup is None:
+                rollup = AgentRollup(
+                    id=id,
+                    app_id=execution.app_id,
+                    agent_id=execution.user_defined_agent_id,
+                    granularity=granularity,
+                    bucket_start=bucket_start,
+                )
+            status = execution.status.value
+            rollup.status_counts[status] = rollup.status_counts.get(status, 0) + 1
+            # Every task of a map execution has its own first attempt
+            rollup.retries += max(len(execution.attempts) - execution.task_count, 0)
+            if duration is not None:
+                sketch = DurationSketch(rollup.duration_sketch)
+                sketch.add(duration)
+                rollup.duration_sketch = sketch.to_dict()
+            rollup.version = str(uuid.uuid4())
+            if expected_version is None:
+                if self.db.insert_rollup(rollup):
+                    return
+            elif self.db.update_rollup(rollup, expected_version):
+                return
+        raise Exception(f"Could not update rollup {id}: too many concurrent writes")
+
+
+def compute_rollups(
+    executions: List[Execution],
+    complete_after: Optional[datetime.datetime] = None,
+) -> List[AgentRollup]:
+    """Recompute rollups from scratch with pandas, for backfills.
+
+    Buckets starting before complete_after are left out. Executions that
+    ended before it may have been archived, so those buckets can't be
+    rebuilt from the remaining rows and keep their stored rollups.
+    """
+    rows = [
+        {
+            "app_id": execution.app_id,
+            "agent_id": execution.user_defined_agent_id,
+            "status": execution.status.value,
+            "start_time": execution.start_time,
+            "end_time": execution.end_time,
+            "attempts": len(execution.attempts),
+            "task_count": execution.task_count,
+        }
+        for execution in executions
+        if execution.status in TERMINAL_STATUSES and execution.end_time is not None
+    ]
+    if not rows:
+        return []
+    df = pd.DataFrame(rows)
+    df["start_time"] = pd.to_datetime(df["start_time"], utc=True)
+    df["end_time"] = pd.to_datetime(df["end_time"], utc=True)
+    df["retries"] = (df["attempts"] - df["task_count"]).clip(lower=0)
+    duration = (df["end_time"] - df["start_time"]).dt.total_seconds()
+    df["sketch_index"] = np.ceil(
+        np.log(np.maximum(duration, SKETCH_MIN_DURATION)) / np.log(SKETCH_GAMMA)
+    )
+
+    rollups = []
+    keys = ["app_id", "agent_id", "bucket_start"]
+    for granularity, frequency in GRANULARITY_FREQUENCIES.items():
+        df["bucket_start"] = df["end_time"].dt.floor(frequency)
+        buckets = df
+        if complete_after is not None:
+            buckets = df[df["bucket_start"] >= pd.Timestamp(complete_after)]
+        if buckets.empty:
+            continue
+        status_counts = buckets.groupby(keys + ["status"]).size().unstack(fill_value=0)
+        retries = buckets.groupby(keys)["retries"].sum()
+        sketches = (
+            buckets.dropna(subset=["sketch_index"])
+            .astype({"sketch_index": int})
+            .groupby(keys + ["sketch_index"])
+            .size()
+        )
+        sketch_dicts: Dict[tuple, Dict[str, int]] = {}
+        for (app_id, agent_id, bucket_start, index), count in sketches.items():
+            sketch_dicts.setdefault((app_id, agent_id, bucket_start), {})[
+                str(index)
+            ] = int(count)
+        for key, counts in status_counts.iterrows():
+            app_id, agent_id, bucket_start = key
+            bucket_start = bucket_start.to_pydatetime()
+            rollups.append(
+                AgentRollup(
+                    id=AgentRollup.get_id(app_id, agent_id, granularity, bucket_start),
+                    app_id=app_id,
+                    agent_id=agent_id,
+                    granularity=granularity,
+                    bucket_start=bucket_start,
+                    status_counts={
+                        status: int(count) for status, count in counts.items() if count
+                    },
+                    retries=int(retries[key]),
+                    duration_sketch=sketch_dicts.get(key, {}),
+                )
+            )
+    return rollups
+
+
+def summarize(
+    status_counts: Dict[str, int], retries: int, sketch: DurationSketch
+) -> Dict:
+    total = sum(status_counts.values())
+    successful = status_counts.get(ExecutionStatus.successful.value, 0)
+    return {
+        "status_counts": status_counts,
+        "total": total,
+        "success_rate": successful / total if total else None,
+        "retries": retries,
+        "p50_duration": sketch.quantile(0.5),
+        "p95_duration": sketch.quantile(0.95),
+    }
+
+
+def summarize_rollups(rollups: List[AgentRollup]) -> Dict:
+    """Per-bucket stats plus the stats of all buckets merged."""
+    buckets = []
+    total_counts: Dict[str, int] = {}
+    total_retries = 0
+    total_sketch = DurationSketch()
+    for rollup in rollups:
+        sketch = DurationSketch(rollup.duration_sketch)
+        buckets.append(
+            {
+                "bucket_start": rollup.bucket_start,
+                **summarize(rollup.status_counts, rollup.retries, sketch),
+            }
+        )
+        for status, count in rollup.status_counts.items():
+            total_counts[status] = total_counts.get(status, 0) + count
+        total_retries += rollup.retries
+        total_sketch.merge(sketch)
+    return {
+        "buckets": buckets,
+        "total": summarize(total_counts, total_retries, total_sketch),
+    }
@@ -0,0 +1,195 @@
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from models.models import Execution, ExecutionStatus
+from blob_storage import BlobStorage
+import asyncio
+import datetime
+import io
+import json
+import os
+import uuid
+import pandas as pd
+
+ARCHIVE_PREFIX = "archive/executions"
+# Archiving is off unless an age is configured
+ARCHIVE_AFTER_DAYS = os.getenv("ARCHIVE_AFTER_DAYS")
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", 3600))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 500))
+# A claimed batch is left to the worker that claimed it for this long, after
+# which another worker may take it over
+ARCHIVE_LEASE = datetime.timedelta(
+    seconds=float(os.getenv("ARCHIVE_LEASE_SECONDS", 600))
+)
+PARQUET_COMPRESSION = "zstd"
+# Nested fields are stored as JSON strings so every file has the same schema
+JSON_COLUMNS = [
+    "results",
+    "results_ref",
+    "attempts",
+    "task_results_refs",
+]
+TIMESTAMP_COLUMNS = ["start_time", "end_time"]
+
+
+def get_partition_date(execution: Execution) -> datetime.date:
+    timestamp = execution.start_time or execution.end_time
+    return timestamp.astimezone(datetime.timezone.utc).date()
+
+
+def get_partition_prefix(
+    app_id: str, agent_id: Optional[str] = None, date: Optional[datetime.date] = None
+) -> str:
+    prefix = f"{ARCHIVE_PREFIX}/app_id={app_id}/"
+    if agent_id is not None:
+        prefix += f"agent_id={agent_id}/"
+        if date is not None:
+            prefix += f"date={date.isoformat()}/"
+    return prefix
+
+
+def parse_partition_date(key: str) -> Optional[datetime.date]:
+    for part in key.split("/"):
+        if part.startswith("date="):
+            return datetime.date.fromisoformat(part[len("date=") :])
+    return None
+
+
+def to_dataframe(executions: List[Execution]) -> pd.DataFrame:
+    rows = []
+    for execution in executions:
+        row = json.loads(execution.json(exclude={"etag"}))
+        for column in JSON_COLUMNS:
+            row[column] = json.dumps(row[column])
+        rows.append(row)
+    df = pd.DataFrame(rows)
+    for column in TIMESTAMP_COLUMNS:
+        df[column] = pd.to_datetime(df[column], utc=True)
+    return df
+
+
+def from_dataframe(df: pd.DataFrame) -> List[Execution]:
+    executions = []
+    for row in df.to_dict(orient="records"):
+        # Columns added after a file was written come back as NaN, so the
+        # model defaults apply instead
+        row = {
+            key: value
+            for key, value in row.items()
+            if not (isinstance(value, float) and pd.isna(value))
+        }
+        for column in JSON_COLUMNS:
+            if column in row:
+                row[column] = json.loads(row[column])
+        for column in TIMESTAMP_COLUMNS:
+            row[column] = None if pd.isna(row[column]) else row[column].to_pydatetime()
+        executions.append(Execution(**row))
+    return executions
+
+
+class ExecutionArchiver:
+    """Moves finished executions older than ARCHIVE_AFTER_DAYS out of the
+    execution table into Parquet files on blob storage, partitioned as
+    archive/executions/app_id=.../agent_id=.../date=.../<batch>.parquet.
+
+    Every worker runs the archiver, so each batch is claimed with a lease
+    first and only the worker that claimed it writes it. Files are written
+    before rows are deleted, so a crash in between can leave an execution
+    both archived and in the table until its lease runs out; the query path
+    dedupes by id.
+    """
+
+    def __init__(self, db, blob_storage: BlobStorage):
+        self.db = db
+        self.blob_storage = blob_storage
+
+    @staticmethod
+    def get_cutoff() -> Optional[datetime.datetime]:
+        """Executions that ended before this are archived; None when
+        archiving is off."""
+        if not ARCHIVE_AFTER_DAYS:
+            return None
+        age = datetime.timedelta(days=float(ARCHIVE_AFTER_DAYS))
+        return datetime.datetime.now(tz=datetime.timezone.utc) - age
+
+    async def run(self):
+        while True:
+            try:
+                cutoff = self.get_cutoff()
+                archived = await asyncio.to_thread(self.archive_before, cutoff)
+                if archived:
+                    print(f"Archived {archived} executions")
+            except Exception as e:
+                print(f"Error in archiving executions: {e}")
+            await asyncio.sleep(ARCHIVE_INTERVAL)
+
+    def archive_before(self, cutoff: datetime.datetime) -> int:
+        archived = 0
+        while True:
+            now = datetime.datetime.now(tz=datetime.timezone.utc)
+            executions = self.db.claim_executions_to_archive(
+                cutoff=cutoff,
+                now=now,
+                lease_until=now + ARCHIVE_LEASE,
+                limit=ARCHIVE_BATCH_SIZE,
+            )
+            if not executions:
+                return archived
+            self.write_partitions(executions)
+            self.db.delete_executions([execution.id for execution in executions])
+            archived += len(executions)
+            if len(executions) < ARCHIVE_BATCH_SIZE:
+                return archived
+
+    def write_partitions(self, executions: List[Execution]):
+        partitions: Dict[Tuple[str, str, datetime.date], List[Execution]] = defaultdict(
+            list
+        )
+        for execution in executions:
+            key = (
+                execution.app_id,
+                execution.user_defined_agent_id,
+                get_partition_date(execution),
+            )
+            partitions[key].append(execution)
+        for (app_id, agent_id, date), partition in partitions.items():
+            buffer = io.BytesIO()
+            to_dataframe(partition).to_parquet(
+                buffer, index=False, compression=PARQUET_COMPRESSION
+            )
+            key = (
+                get_partition_prefix(app_id, agent_id, date) + f"{uuid.uuid4()}.parquet"
+            )
+            self.blob_storage.put(
+                key, buffer.getvalue(), content_type="application/vnd.apache.parquet"
+            )
+
+    def query(
+        self,
+        app_id: str,
+        agent_id: Optional[str] = None,
+        start_date: Optional[datetime.date] = None,
+        end_date: Optional[datetime.date] = None,
+        status: Optional[ExecutionStatus] = None,
+        execution_id: Optional[str] = None,
+    ) -> List[Execution]:
+        # Partition pruning: only files whose date is in range are read
+        keys = [
+            key
+            for key in self.blob_storage.list(get_partition_prefix(app_id, agent_id))
+            if key.endswith(".parquet")
+            and (start_date is None or parse_partition_date(key) >= start_date)
+            and (end_date is None or parse_partition_date(key) <= end_date)
+        ]
+        frames = []
+        for key in keys:
+            data = b"".join(self.blob_storage.stream(key))
+            df = pd.read_parquet(io.BytesIO(data))
+            if status is not None:
+                df = df[df["status"] == status.value]
+            if execution_id is not None:
+                df = df[df["id"] == execution_id]
+            frames.append(df)
+        if not frames:
+            return []
+        df = pd.concat(frames).drop_duplicates(subset="id")
+        return from_dataframe(df.sort_values("start_time"))
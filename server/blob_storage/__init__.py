@@ -0,0 +1,6 @@
+from .blob_storage import (
+    BlobStorage,
+    GCSBlobStorage,
+    LocalBlobStorage,
+    get_blob_storage,
+)
@@ -0,0 +1,151 @@
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Iterator, List, Optional, Union
+from datetime import timedelta
+import json
+import os
+import shutil
+from google.cloud import storage
+from google.oauth2 import service_account
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class BlobStorage(ABC):
+    """Stores large payloads outside the database."""
+
+    @abstractmethod
+    def put(self, key: str, data: Union[bytes, BinaryIO], content_type: str):
+        pass
+
+    @abstractmethod
+    def stream(self, key: str) -> Iterator[bytes]:
+        pass
+
+    @abstractmethod
+    def get_size(self, key: str) -> Optional[int]:
+        pass
+
+    @abstractmethod
+    def get_download_url(self, key: str, expiration: timedelta) -> str:
+        pass
+
+    @abstractmethod
+    def get_upload_url(self, key: str, expiration: timedelta, content_type: str) -> str:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        pass
+
+    @abstractmethod
+    def list(self, prefix: str) -> List[str]:
+        pass
+
+
+class GCSBlobStorage(BlobStorage):
+    def __init__(self, bucket_name: Optional[str] = None):
+        credentials = service_account.Credentials.from_service_account_info(
+            json.loads(os.getenv("GCLOUD_SERVICE_ACCOUNT"))
+        )
+        self.client = storage.Client(credentials=credentials)
+        self.bucket = self.client.bucket(bucket_name or os.getenv("BLOB_BUCKET"))
+
+    def put(self, key: str, data: Union[bytes, BinaryIO], content_type: str):
+        blob = self.bucket.blob(key)
+        if isinstance(data, bytes):
+            blob.upload_from_string(data, content_type=content_type)
+        else:
+            blob.upload_from_file(data, content_type=content_type)
+
+    def stream(self, key: str) -> Iterator[bytes]:
+        with self.bucket.blob(key).open("rb", chunk_size=CHUNK_SIZE) as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                yield chunk
+
+    def get_size(self, key: str) -> Optional[int]:
+        blob = self.bucket.get_blob(key)
+        return blob.size if blob else None
+
+    def get_download_url(self, key: str, expiration: timedelta) -> str:
+        return self.bucket.blob(key).generate_signed_url(
+            version="v4", expiration=expiration, method="GET"
+        )
+
+    def get_upload_url(self, key: str, expiration: timedelta, content_type: str) -> str:
+        return self.bucket.blob(key).generate_signed_url(
+            version="v4",
+            expiration=expiration,
+            method="PUT",
+            content_type=content_type,
+        )
+
+    def delete(self, key: str):
+        self.bucket.blob(key).delete()
+
+    def list(self, prefix: str) -> List[str]:
+        return [
+            blob.name for blob in self.client.list_blobs(self.bucket, prefix=prefix)
+        ]
+
+
+class LocalBlobStorage(BlobStorage):
+    """Filesystem stand-in for GCS, for local development and tests. URLs are
+    file:// paths, so they only work for agents on the same machine."""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = os.path.abspath(
+            root or os.getenv("LOCAL_BLOB_DIR") or "local_dir/blobs"
+        )
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise Exception(f"Invalid blob key: {key}")
+        return path
+
+    def put(self, key: str, data: Union[bytes, BinaryIO], content_type: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            if isinstance(data, bytes):
+                f.write(data)
+            else:
+                shutil.copyfileobj(data, f, CHUNK_SIZE)
+
+    def stream(self, key: str) -> Iterator[bytes]:
+        with open(self._path(key), "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                yield chunk
+
+    def get_size(self, key: str) -> Optional[int]:
+        path = self._path(key)
+        return os.path.getsize(path) if os.path.exists(path) else None
+
+    def get_download_url(self, key: str, expiration: timedelta) -> str:
+        return f"file://{self._path(key)}"
+
+    def get_upload_url(self, key: str, expiration: timedelta, content_type: str) -> str:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return f"file://{path}"
+
+    def delete(self, key: str):
+        path = self._path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def list(self, prefix: str) -> List[str]:
+        keys = []
+        for root, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                key = os.path.relpath(os.path.join(root, filename), self.root)
+                key = key.replace(os.sep, "/")
+                if key.startswith(prefix):
+                    keys.append(key)
+        return sorted(keys)
+
+
+def get_blob_storage() -> BlobStorage:
+    if os.getenv("BLOB_STORAGE", "gcs") == "local":
+        return LocalBlobStorage()
+    return GCSBlobStorage()
@@ -1,16 +1,29 @@
 import io
 from fastapi import UploadFile
 import json
-from typing import List, Optional, Tuple
+import hashlib
+from typing import Dict, Iterator, List, Optional, Tuple
 from models.models import (
     AppConfig,
     User,
     Agent,
+    AgentRollup,
+    AgentVersion,
     Execution,
+    ExecutionLogBatch,
+    ExecutionStatus,
+    ExecutionTask,
+    ResultCacheEntry,
+    RollupGranularity,
+    Schedule,
+    Webhook,
+    WebhookDelivery,
+    WebhookDeliveryStatus,
 )
 from supabase import create_client, Client
 import os
 from storage3.utils import StorageException
+from postgrest.exceptions import APIError
 
 from io import StringIO
 from bs4 import BeautifulSoup
@@ -26,6 +39,14 @@ def get_file_size(file: io.BytesIO) -> int:
     return file.getbuffer().nbytes
 
 
+def get_etag(payload: dict) -> str:
+    # Content hash of a row, kept current on every upsert so conditional reads
+    # can compare it without loading the row
+    content = {key: value for key, value in payload.items() if key != "etag"}
+    serialized = json.dumps(content, sort_keys=True, default=str)
+    return hashlib.sha1(serialized.encode("utf-8")).hexdigest()
+
+
 class Database:
     def __init__(self):
         supabase_url = os.environ.get("SUPABASE_URL")
@@ -59,6 +80,7 @@ class Database:
         payload = agent.dict()
         # Remove created_at field
         payload.pop("created_at", None)
+        payload["etag"] = get_etag(payload)
         response = (
             self.supabase.table("agent")
             .upsert(
@@ -84,6 +106,78 @@ class Database:
             return Agent(**row)
         return None
 
+    def list_credentials(self, config: AppConfig) -> Dict[str, Dict]:
+        response = (
+            self.supabase.table("credential")
+            .select("id, credentials")
+            .filter("app_id", "eq", config.app_id)
+            .execute()
+        )
+        return {row["id"]: row["credentials"] for row in response.data}
+
+    def upsert_credentials(
+        self, config: AppConfig, credential_id: str, credentials: Dict
+    ):
+        self.supabase.table("credential").upsert(
+            {"app_id": config.app_id, "id": credential_id, "credentials": credentials},
+            on_conflict="app_id,id",
+        ).execute()
+
+    def get_cached_image(self, app_id: str, source_hash: str) -> Optional[str]:
+        response = (
+            self.supabase.table("build_cache")
+            .select("image")
+            .filter("app_id", "eq", app_id)
+            .filter("source_hash", "eq", source_hash)
+            .execute()
+        )
+        if len(response.data) > 0:
+            return response.data[0]["image"]
+        return None
+
+    def upsert_cached_image(self, app_id: str, source_hash: str, image: str):
+        self.supabase.table("build_cache").upsert(
+            {"app_id": app_id, "source_hash": source_hash, "image": image},
+            on_conflict="app_id,source_hash",
+        ).execute()
+
+    def get_agent_etag(self, config: AppConfig, id: str) -> Optional[str]:
+        response = (
+            self.supabase.table("agent")
+            .select("etag")
+            .filter("app_id", "eq", config.app_id)
+            .filter("id", "eq", id)
+            .execute()
+        )
+        if len(response.data) > 0:
+            return response.data[0]["etag"]
+        return None
+
+    def get_agents_etag(self, config: AppConfig) -> str:
+        # One tag for the whole list, derived from the per-agent tags
+        response = (
+            self.supabase.table("agent")
+            .select("id, etag")
+            .filter("app_id", "eq", config.app_id)
+            .execute()
+        )
+        return get_etag({row["id"]: row["etag"] for row in response.data})
+
+    def get_execution_etag(
+        self, config: AppConfig, user_defined_agent_id: str, execution_id: str
+    ) -> Optional[str]:
+        response = (
+            self.supabase.table("execution")
+            .select("etag")
+            .filter("app_id", "eq", config.app_id)
+            .filter("user_defined_agent_id", "eq", user_defined_agent_id)
+            .filter("id", "eq", execution_id)
+            .execute()
+        )
+        if len(response.data) > 0:
+            return response.data[0]["etag"]
+        return None
+
     def get_user(self, config: AppConfig) -> Optional[Agent]:
         response = (
             self.supabase.table("user")
@@ -124,6 +218,43 @@ class Database:
         response = query.execute()
         return [Execution(**row) for row in response.data]
 
+    def iter_executions(
+        self,
+        config: AppConfig,
+        user_defined_agent_id: Optional[str] = None,
+        status: Optional[ExecutionStatus] = None,
+        start_time: Optional[datetime.datetime] = None,
+        end_time: Optional[datetime.datetime] = None,
+        page_size: int = 500,
+    ) -> Iterator[Execution]:
+        # Keyset pagination on id, so each page is an index range scan and
+        # only one page is held in memory at a time
+        last_id = None
+        while True:
+            query = (
+                self.supabase.table("execution")
+                .select("*")
+                .filter("app_id", "eq", config.app_id)
+            )
+            if user_defined_agent_id:
+                query = query.filter(
+                    "user_defined_agent_id", "eq", user_defined_agent_id
+                )
+            if status:
+                query = query.filter("status", "eq", status.value)
+            if start_time:
+                query = query.filter("start_time", "gte", start_time.isoformat())
+            if end_time:
+                query = query.filter("start_time", "lte", end_time.isoformat())
+            if last_id is not None:
+                query = query.filter("id", "gt", last_id)
+            response = query.order("id").limit(page_size).execute()
+            for row in response.data:
+                yield Execution(**row)
+            if len(response.data) < page_size:
+                return
+            last_id = response.data[-1]["id"]
+
     def get_execution(
         self, config: AppConfig, finic_agent_id: str, execution_id: str
     ) -> Optional[Execution]:
@@ -140,12 +271,585 @@ class Database:
             return Execution(**row)
         return None
 
-    def upsert_execution(self, execution: Execution) -> Optional[Execution]:
-        json_payload = execution.json()
-        payload = json.loads(json_payload)
+    def _get_execution_payload(self, execution: Execution) -> Dict:
+        payload = json.loads(execution.json())
+        # Not part of the etag, so saving an unchanged execution keeps it
+        payload.pop("updated_at", None)
+        payload.pop("etag", None)
+        payload["etag"] = get_etag(payload)
+        payload["updated_at"] = datetime.datetime.now(
+            tz=datetime.timezone.utc
+        ).isoformat()
+        return payload
 
+    def upsert_execution(self, execution: Execution) -> Optional[Execution]:
+        payload = self._get_execution_payload(execution)
         response = self.supabase.table("execution").upsert(payload).execute()
         if len(response.data) > 0:
             row = response.data[0]
             return Execution(**row)
         return None
+
+    def update_execution_if_status(
+        self, execution: Execution, expected_status: ExecutionStatus
+    ) -> bool:
+        # False if the stored execution no longer has expected_status
+        response = (
+            self.supabase.table("execution")
+            .update(self._get_execution_payload(execution))
+            .filter("id", "eq", execution.id)
+            .filter("status", "eq", expected_status.value)
+            .execute()
+        )
+        return len(response.data) > 0
+
+    def list_updated_executions(
+        self, app_ids: List[str], since: datetime.datetime
+    ) -> List[Execution]:
+        response = (
+            self.supabase.table("execution")
+            .select(
+                "id, finic_agent_id, user_defined_agent_id, app_id, cloud_provider_id, status, start_time, end_time, updated_at"
+            )
+            .in_("app_id", app_ids)
+            .filter("updated_at", "gt", since.isoformat())
+            .order("updated_at")
+            .execute()
+        )
+        return [Execution(**row) for row in response.data]
+
+    def upsert_execution_attempt_chunk(
+        self,
+        config: AppConfig,
+        execution_id: str,
+        attempt_number: int,
+        chunk_index: int,
+        data: str,
+        task_index: int = 0,
+    ):
+        # Keyed on (execution_id, task_index, attempt_number, chunk_index) so
+        # retried uploads overwrite the same row
+        self.supabase.table("execution_attempt_chunk").upsert(
+            {
+                "app_id": config.app_id,
+                "execution_id": execution_id,
+                "task_index": task_index,
+                "attempt_number": attempt_number,
+                "chunk_index": chunk_index,
+                "data": data,
+            },
+            on_conflict="execution_id,task_index,attempt_number,chunk_index",
+        ).execute()
+
+    def list_execution_attempt_chunks(
+        self,
+        config: AppConfig,
+        execution_id: str,
+        attempt_number: int,
+        task_index: int = 0,
+    ) -> List[Tuple[int, str]]:
+        response = (
+            self.supabase.table("execution_attempt_chunk")
+            .select("chunk_index, data")
+            .filter("app_id", "eq", config.app_id)
+            .filter("execution_id", "eq", execution_id)
+            .filter("task_index", "eq", task_index)
+            .filter("attempt_number", "eq", attempt_number)
+            .order("chunk_index")
+            .execute()
+        )
+        return [(row["chunk_index"], row["data"]) for row in response.data]
+
+    def delete_execution_attempt_chunks(
+        self,
+        config: AppConfig,
+        execution_id: str,
+        attempt_number: int,
+        task_index: int = 0,
+    ):
+        (
+            self.supabase.table("execution_attempt_chunk")
+            .delete()
+            .filter("app_id", "eq", config.app_id)
+            .filter("execution_id", "eq", execution_id)
+            .filter("task_index", "eq", task_index)
+            .filter("attempt_number", "eq", attempt_number)
+            .execute()
+        )
+
+    def insert_execution_log_batch(self, config: AppConfig, batch: ExecutionLogBatch):
+        # Keyed on (execution_id, task_index, attempt_number, sequence) so a
+        # retried flush overwrites its own row and never touches the execution
+        payload = json.loads(batch.json())
+        payload["app_id"] = config.app_id
+        self.supabase.table("execution_log_batch").upsert(
+            payload,
+            on_conflict="execution_id,task_index,attempt_number,sequence",
+        ).execute()
+
+    def list_execution_log_batch_keys(
+        self, config: AppConfig, execution_id: str
+    ) -> List[Tuple[int, int, int]]:
+        response = (
+            self.supabase.table("execution_log_batch")
+            .select("task_index, attempt_number, sequence")
+            .filter("app_id", "eq", config.app_id)
+            .filter("execution_id", "eq", execution_id)
+            .order("task_index")
+            .order("attempt_number")
+            .order("sequence")
+            .execute()
+        )
+        return [
+            (row["task_index"], row["attempt_number"], row["sequence"])
+            for row in response.data
+        ]
+
+    def list_execution_log_batches(
+        self, config: AppConfig, execution_id: str, task_index: Optional[int] = None
+    ) -> List[ExecutionLogBatch]:
+        query = (
+            self.supabase.table("execution_log_batch")
+            .select("execution_id, task_index, attempt_number, sequence, logs")
+            .filter("app_id", "eq", config.app_id)
+            .filter("execution_id", "eq", execution_id)
+        )
+        if task_index is not None:
+            query = query.filter("task_index", "eq", task_index)
+        response = (
+            query.order("task_index")
+            .order("attempt_number")
+            .order("sequence")
+            .execute()
+        )
+        return [ExecutionLogBatch(**row) for row in response.data]
+
+    def delete_execution_log_batches(
+        self,
+        config: AppConfig,
+        execution_id: str,
+        task_index: int,
+        max_attempt_number: int,
+    ):
+        # Batches of later attempts may still be arriving, so only the merged
+        # attempts are deleted
+        (
+            self.supabase.table("execution_log_batch")
+            .delete()
+            .filter("app_id", "eq", config.app_id)
+            .filter("execution_id", "eq", execution_id)
+            .filter("task_index", "eq", task_index)
+            .filter("attempt_number", "lte", max_attempt_number)
+            .execute()
+        )
+
+    def get_execution_task(
+        self, config: AppConfig, execution_id: str, task_index: int
+    ) -> Optional[ExecutionTask]:
+        response = (
+            self.supabase.table("execution_task")
+            .select("*")
+            .filter("app_id", "eq", config.app_id)
+            .filter("execution_id", "eq", execution_id)
+            .filter("task_index", "eq", task_index)
+            .execute()
+        )
+        if len(response.data) > 0:
+            return ExecutionTask(**response.data[0])
+        return None
+
+    def upsert_execution_task(self, config: AppConfig, task: ExecutionTask):
+        # Keyed on (execution_id, task_index); only the task itself writes it
+        payload = json.loads(task.json())
+        payload["etag"] = get_etag(payload)
+        payload["app_id"] = config.app_id
+        self.supabase.table("execution_task").upsert(
+            payload, on_conflict="execution_id,task_index"
+        ).execute()
+
+    def list_execution_tasks(
+        self, config: AppConfig, execution_id: str
+    ) -> List[ExecutionTask]:
+        response = (
+            self.supabase.table("execution_task")
+            .select("*")
+            .filter("app_id", "eq", config.app_id)
+            .filter("execution_id", "eq", execution_id)
+            .order("task_index")
+            .execute()
+        )
+        return [ExecutionTask(**row) for row in response.data]
+
+    def list_execution_task_etags(
+        self, config: AppConfig, execution_id: str
+    ) -> Dict[int, str]:
+        response = (
+            self.supabase.table("execution_task")
+            .select("task_index, etag")
+            .filter("app_id", "eq", config.app_id)
+            .filter("execution_id", "eq", execution_id)
+            .execute()
+        )
+        return {row["task_index"]: row["etag"] for row in response.data}
+
+    def upsert_webhook(self, webhook: Webhook) -> Optional[Webhook]:
+        payload = webhook.dict()
+        payload.pop("created_at", None)
+        response = self.supabase.table("webhook").upsert(payload).execute()
+        if len(response.data) > 0:
+            return Webhook(**response.data[0])
+        return None
+
+    def list_webhooks(self, config: AppConfig) -> List[Webhook]:
+        response = (
+            self.supabase.table("webhook")
+            .select("*")
+            .filter("app_id", "eq", config.app_id)
+            .execute()
+        )
+        return [Webhook(**row) for row in response.data]
+
+    def list_webhooks_for_agent(self, app_id: str, agent_id: str) -> List[Webhook]:
+        response = (
+            self.supabase.table("webhook")
+            .select("*")
+            .filter("app_id", "eq", app_id)
+            .or_(f"agent_id.is.null,agent_id.eq.{agent_id}")
+            .execute()
+        )
+        return [Webhook(**row) for row in response.data]
+
+    def get_webhooks(self, ids: List[str]) -> Dict[str, Webhook]:
+        response = self.supabase.table("webhook").select("*").in_("id", ids).execute()
+        return {row["id"]: Webhook(**row) for row in response.data}
+
+    def delete_webhook(self, config: AppConfig, id: str):
+        (
+            self.supabase.table("webhook")
+            .delete()
+            .filter("app_id", "eq", config.app_id)
+            .filter("id", "eq", id)
+            .execute()
+        )
+
+    def insert_webhook_deliveries(self, deliveries: List[WebhookDelivery]):
+        payload = [json.loads(delivery.json()) for delivery in deliveries]
+        self.supabase.table("webhook_delivery").insert(payload).execute()
+
+    def claim_webhook_deliveries(
+        self, now: datetime.datetime, lease_until: datetime.datetime, limit: int
+    ) -> List[WebhookDelivery]:
+        response = (
+            self.supabase.table("webhook_delivery")
+            .select("id")
+            .filter("status", "eq", WebhookDeliveryStatus.pending.value)
+            .filter("next_attempt_at", "lte", now.isoformat())
+            .order("next_attempt_at")
+            .limit(limit)
+            .execute()
+        )
+        if not response.data:
+            return []
+        # Pushing next_attempt_at out is the claim: a row another worker has
+        # already claimed no longer matches the filter and is not returned
+        response = (
+            self.supabase.table("webhook_delivery")
+            .update({"next_attempt_at": lease_until.isoformat()})
+            .in_("id", [row["id"] for row in response.data])
+            .filter("status", "eq", WebhookDeliveryStatus.pending.value)
+            .filter("next_attempt_at", "lte", now.isoformat())
+            .execute()
+        )
+        return [WebhookDelivery(**row) for row in response.data]
+
+    def mark_webhook_deliveries_delivered(self, ids: List[str]):
+        (
+            self.supabase.table("webhook_delivery")
+            .update({"status": WebhookDeliveryStatus.delivered.value})
+            .in_("id", ids)
+            .execute()
+        )
+
+    def mark_webhook_deliveries_failed(self, ids: List[str], error: str):
+        (
+            self.supabase.table("webhook_delivery")
+            .update({"status": WebhookDeliveryStatus.failed.value, "last_error": error})
+            .in_("id", ids)
+            .execute()
+        )
+
+    def reschedule_webhook_delivery(
+        self, id: str, attempts: int, next_attempt_at: datetime.datetime, error: str
+    ):
+        (
+            self.supabase.table("webhook_delivery")
+            .update(
+                {
+                    "attempts": attempts,
+                    "next_attempt_at": next_attempt_at.isoformat(),
+                    "last_error": error,
+                }
+            )
+            .filter("id", "eq", id)
+            .execute()
+        )
+
+    def get_rollups(self, ids: List[str]) -> Dict[str, AgentRollup]:
+        response = (
+            self.supabase.table("agent_rollup").select("*").in_("id", ids).execute()
+        )
+        return {row["id"]: AgentRollup(**row) for row in response.data}
+
+    def insert_rollup(self, rollup: AgentRollup) -> bool:
+        # False if another writer created the row first
+        try:
+            self.supabase.table("agent_rollup").insert(
+                json.loads(rollup.json())
+            ).execute()
+            return True
+        except APIError:
+            return False
+
+    def update_rollup(self, rollup: AgentRollup, expected_version: str) -> bool:
+        # False if the row changed since it was read
+        response = (
+            self.supabase.table("agent_rollup")
+            .update(json.loads(rollup.json()))
+            .filter("id", "eq", rollup.id)
+            .filter("version", "eq", expected_version)
+            .execute()
+        )
+        return len(response.data) > 0
+
+    def upsert_rollups(self, rollups: List[AgentRollup]):
+        if not rollups:
+            return
+        payload = [json.loads(rollup.json()) for rollup in rollups]
+        self.supabase.table("agent_rollup").upsert(payload).execute()
+
+    def list_rollups(
+        self,
+        config: AppConfig,
+        agent_id: str,
+        granularity: RollupGranularity,
+        start_time: Optional[datetime.datetime] = None,
+        end_time: Optional[datetime.datetime] = None,
+    ) -> List[AgentRollup]:
+        query = (
+            self.supabase.table("agent_rollup")
+            .select("*")
+            .filter("app_id", "eq", config.app_id)
+            .filter("agent_id", "eq", agent_id)
+            .filter("granularity", "eq", granularity.value)
+        )
+        if start_time:
+            query = query.filter("bucket_start", "gte", start_time.isoformat())
+        if end_time:
+            query = query.filter("bucket_start", "lte", end_time.isoformat())
+        response = query.order("bucket_start").execute()
+        return [AgentRollup(**row) for row in response.data]
+
+    def claim_executions_to_archive(
+        self,
+        cutoff: datetime.datetime,
+        now: datetime.datetime,
+        lease_until: datetime.datetime,
+        limit: int,
+    ) -> List[Execution]:
+        unleased = (
+            f"archive_lease_until.is.null,archive_lease_until.lt.{now.isoformat()}"
+        )
+        response = (
+            self.supabase.table("execution")
+            .select("id")
+            .in_(
+                "status",
+                [ExecutionStatus.successful.value, ExecutionStatus.failed.value],
+            )
+            .filter("end_time", "lt", cutoff.isoformat())
+            .or_(unleased)
+            .order("end_time")
+            .limit(limit)
+            .execute()
+        )
+        if not response.data:
+            return []
+        # Setting archive_lease_until is the claim: rows another worker has
+        # already leased no longer match the filter and are not returned
+        response = (
+            self.supabase.table("execution")
+            .update({"archive_lease_until": lease_until.isoformat()})
+            .in_("id", [row["id"] for row in response.data])
+            .or_(unleased)
+            .execute()
+        )
+        return [Execution(**row) for row in response.data]
+
+    def delete_executions(self, ids: List[str]):
+        self.supabase.table("execution_task").delete().in_(
+            "execution_id", ids
+        ).execute()
+        self.supabase.table("execution").delete().in_("id", ids).execute()
+
+    def upsert_schedule(self, schedule: Schedule) -> Optional[Schedule]:
+        payload = json.loads(schedule.json())
+        payload.pop("created_at", None)
+        response = self.supabase.table("schedule").upsert(payload).execute()
+        if len(response.data) > 0:
+            return Schedule(**response.data[0])
+        return None
+
+    def list_schedules(
+        self, config: AppConfig, agent_id: Optional[str] = None
+    ) -> List[Schedule]:
+        query = (
+            self.supabase.table("schedule")
+            .select("*")
+            .filter("app_id", "eq", config.app_id)
+        )
+        if agent_id:
+            query = query.filter("agent_id", "eq", agent_id)
+        response = query.execute()
+        return [Schedule(**row) for row in response.data]
+
+    def list_enabled_schedules(self) -> List[Schedule]:
+        response = (
+            self.supabase.table("schedule")
+            .select("*")
+            .filter("enabled", "eq", True)
+            .execute()
+        )
+        return [Schedule(**row) for row in response.data]
+
+    def delete_schedule(self, config: AppConfig, id: str):
+        (
+            self.supabase.table("schedule")
+            .delete()
+            .filter("app_id", "eq", config.app_id)
+            .filter("id", "eq", id)
+            .execute()
+        )
+
+    def claim_schedule_tick(
+        self,
+        id: str,
+        tick: datetime.datetime,
+        next_run_at: datetime.datetime,
+        now: datetime.datetime,
+    ) -> bool:
+        # Only the worker whose update still sees the tick gets a row back
+        response = (
+            self.supabase.table("schedule")
+            .update(
+                {"next_run_at": next_run_at.isoformat(), "last_run_at": now.isoformat()}
+            )
+            .filter("id", "eq", id)
+            .filter("next_run_at", "eq", tick.isoformat())
+            .execute()
+        )
+        return len(response.data) > 0
+
+    def get_result_cache_entry(
+        self, app_id: str, key: str, now: datetime.datetime
+    ) -> Optional[ResultCacheEntry]:
+        response = (
+            self.supabase.table("result_cache")
+            .select("*")
+            .filter("app_id", "eq", app_id)
+            .filter("key", "eq", key)
+            .filter("expires_at", "gt", now.isoformat())
+            .execute()
+        )
+        if len(response.data) > 0:
+            return ResultCacheEntry(**response.data[0])
+        return None
+
+    def upsert_result_cache_entry(self, entry: ResultCacheEntry):
+        self.supabase.table("result_cache").upsert(json.loads(entry.json())).execute()
+
+    def evict_result_cache_entries(
+        self, app_id: str, agent_id: str, now: datetime.datetime, max_entries: int
+    ):
+        (
+            self.supabase.table("result_cache")
+            .delete()
+            .filter("app_id", "eq", app_id)
+            .filter("agent_id", "eq", agent_id)
+            .filter("expires_at", "lte", now.isoformat())
+            .execute()
+        )
+        # Oldest entries beyond the agent's limit
+        response = (
+            self.supabase.table("result_cache")
+            .select("key")
+            .filter("app_id", "eq", app_id)
+            .filter("agent_id", "eq", agent_id)
+            .order("created_at", desc=True)
+            .range(max_entries, max_entries + 999)
+            .execute()
+        )
+        if response.data:
+            (
+                self.supabase.table("result_cache")
+                .delete()
+                .filter("app_id", "eq", app_id)
+                .in_("key", [row["key"] for row in response.data])
+                .execute()
+            )
+
+    def insert_agent_version(self, agent: Agent, image_digest: str) -> AgentVersion:
+        """Record a new immutable version of the agent with the next number."""
+        for _ in range(5):
+            response = (
+                self.supabase.table("agent_version")
+                .select("version")
+                .filter("finic_agent_id", "eq", agent.finic_id)
+                .order("version", desc=True)
+                .limit(1)
+                .execute()
+            )
+            latest = response.data[0]["version"] if response.data else 0
+            version = AgentVersion(
+                finic_agent_id=agent.finic_id,
+                agent_id=agent.id,
+                app_id=agent.app_id,
+                version=latest + 1,
+                image_digest=image_digest,
+                source_hash=agent.source_hash,
+            )
+            payload = json.loads(version.json())
+            payload.pop("created_at", None)
+            # (finic_agent_id, version) is unique, so a concurrent deploy
+            # that took the number makes this insert fail and retry
+            try:
+                response = (
+                    self.supabase.table("agent_version").insert(payload).execute()
+                )
+            except APIError:
+                continue
+            return AgentVersion(**response.data[0])
+        raise Exception(f"Could not record a new version of agent {agent.id}")
+
+    def get_agent_version(
+        self, finic_agent_id: str, version: int
+    ) -> Optional[AgentVersion]:
+        response = (
+            self.supabase.table("agent_version")
+            .select("*")
+            .filter("finic_agent_id", "eq", finic_agent_id)
+            .filter("version", "eq", version)
+            .execute()
+        )
+        if len(response.data) > 0:
+            return AgentVersion(**response.data[0])
+        return None
+
+    def list_agent_versions(self, finic_agent_id: str) -> List[AgentVersion]:
+        response = (
+            self.supabase.table("agent_version")
+            .select("*")
+            .filter("finic_agent_id", "eq", finic_agent_id)
+            .order("version", desc=True)
+            .execute()
+        )
+        return [AgentVersion(**row) for row in response.data]
@@ -0,0 +1 @@
+from .execution_events import ExecutionEventHub, Subscription
@@ -0,0 +1,124 @@
+from typing import Dict, Optional, Set
+from collections import OrderedDict, defaultdict
+from models.models import Execution
+import asyncio
+import datetime
+import os
+
+# Events buffered per subscriber before it counts as a slow consumer
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("EXECUTION_EVENTS_QUEUE_SIZE", 256))
+# Status changes saved by other workers and instances are read from the
+# execution table this often
+POLL_INTERVAL = float(os.getenv("EXECUTION_EVENTS_POLL_INTERVAL", 1))
+# Rows are re-read this far back, so clock skew between servers writing
+# updated_at doesn't lose changes; repeats are dropped by status
+POLL_LOOKBACK = datetime.timedelta(
+    seconds=float(os.getenv("EXECUTION_EVENTS_POLL_LOOKBACK", 10))
+)
+# Executions whose last published status is remembered for deduplication
+STATUS_CACHE_SIZE = 10000
+
+
+class Subscription:
+    def __init__(self, app_id: str, agent_id: Optional[str] = None):
+        self.app_id = app_id
+        self.agent_id = agent_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def matches(self, execution: Execution) -> bool:
+        return self.agent_id is None or self.agent_id == execution.user_defined_agent_id
+
+    def offer(self, event: Dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow consumer: drop what it has not read yet and ask it to
+            # refetch, instead of letting its backlog grow without bound
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+
+
+class ExecutionEventHub:
+    """Fans out execution status changes to the WebSocket subscribers of an
+    app. Publishing never blocks on a subscriber.
+
+    Changes saved in this process are published directly. The ones saved by
+    other workers or server instances are picked up by ``run``, which polls
+    the execution table by updated_at for the apps that have subscribers
+    here. Subscribers are only touched on the event loop, so ``publish`` is
+    safe to call from worker threads.
+    """
+
+    def __init__(self, db=None):
+        self.db = db
+        self.subscriptions: Dict[str, Set[Subscription]] = defaultdict(set)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.last_status: "OrderedDict[str, str]" = OrderedDict()
+
+    def subscribe(self, app_id: str, agent_id: Optional[str] = None) -> Subscription:
+        self.loop = asyncio.get_running_loop()
+        subscription = Subscription(app_id=app_id, agent_id=agent_id)
+        self.subscriptions[app_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self.subscriptions.get(subscription.app_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self.subscriptions[subscription.app_id]
+
+    def publish(self, execution: Execution):
+        # Nobody has subscribed in this process yet
+        if self.loop is None or self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self._dispatch, execution)
+
+    async def run(self):
+        cursor = datetime.datetime.now(tz=datetime.timezone.utc)
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            app_ids = list(self.subscriptions)
+            if not app_ids or self.db is None:
+                cursor = datetime.datetime.now(tz=datetime.timezone.utc)
+                continue
+            try:
+                executions = await asyncio.to_thread(
+                    self.db.list_updated_executions,
+                    app_ids=app_ids,
+                    since=cursor - POLL_LOOKBACK,
+                )
+            except Exception as e:
+                print(f"Error in polling execution events: {e}")
+                continue
+            for execution in executions:
+                if execution.updated_at is not None:
+                    cursor = max(cursor, execution.updated_at)
+                self._dispatch(execution)
+
+    def _dispatch(self, execution: Execution):
+        status = execution.status.value
+        if self.last_status.get(execution.id) == status:
+            return
+        self.last_status[execution.id] = status
+        self.last_status.move_to_end(execution.id)
+        while len(self.last_status) > STATUS_CACHE_SIZE:
+            self.last_status.popitem(last=False)
+        subscriptions = self.subscriptions.get(execution.app_id)
+        if not subscriptions:
+            return
+        event = {
+            "type": "execution.status",
+            "execution_id": execution.id,
+            "agent_id": execution.user_defined_agent_id,
+            "status": status,
+            "start_time": (
+                execution.start_time.isoformat() if execution.start_time else None
+            ),
+            "end_time": execution.end_time.isoformat() if execution.end_time else None,
+        }
+        for subscription in subscriptions:
+            if subscription.matches(execution):
+                subscription.offer(event)
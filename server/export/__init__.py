@@ -0,0 +1 @@
+from .export import ExportFormat, export_executions
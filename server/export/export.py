@@ -0,0 +1,67 @@
+from enum import Enum
+from typing import Iterable, Iterator
+from models.models import Execution
+import csv
+import io
+import json
+
+CSV_COLUMNS = [
+    "id",
+    "agent_id",
+    "finic_agent_id",
+    "status",
+    "start_time",
+    "end_time",
+    "duration_seconds",
+    "attempts",
+    "results",
+]
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+    @property
+    def media_type(self) -> str:
+        if self == ExportFormat.csv:
+            return "text/csv"
+        return "application/x-ndjson"
+
+
+def to_csv_row(execution: Execution) -> list:
+    duration = None
+    if execution.start_time and execution.end_time:
+        duration = (execution.end_time - execution.start_time).total_seconds()
+    return [
+        execution.id,
+        execution.user_defined_agent_id,
+        execution.finic_agent_id,
+        execution.status.value,
+        execution.start_time.isoformat() if execution.start_time else "",
+        execution.end_time.isoformat() if execution.end_time else "",
+        "" if duration is None else duration,
+        len(execution.attempts),
+        json.dumps(execution.results),
+    ]
+
+
+def export_executions(
+    executions: Iterable[Execution], format: ExportFormat
+) -> Iterator[str]:
+    """Serialize executions one at a time, for a StreamingResponse."""
+    if format == ExportFormat.ndjson:
+        for execution in executions:
+            yield execution.json(exclude={"etag"}) + "\n"
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for execution in executions:
+        writer.writerow(to_csv_row(execution))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, when nothing matched
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,6 @@
+from .log_search import (
+    LogSearchIndex,
+    SQLiteLogSearchIndex,
+    SupabaseLogSearchIndex,
+    get_log_search_index,
+)
@@ -0,0 +1,275 @@
+from abc import ABC, abstractmethod
+from typing import List, Optional
+from models.models import ExecutionLog, LogSearchResult, LogSeverity
+from supabase import create_client
+import datetime
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+
+SNIPPET_RADIUS = 60
+
+
+def get_log_id(
+    execution_id: str,
+    attempt_number: int,
+    index: int,
+    log: ExecutionLog,
+    sequence: Optional[int] = None,
+) -> str:
+    # Deterministic, so re-indexing a retried upload doesn't duplicate logs.
+    # Flushed batches are positioned by their sequence number instead of an
+    # offset into the attempt's logs.
+    timestamp = log.timestamp.isoformat() if log.timestamp else ""
+    position = index if sequence is None else f"{sequence}.{index}"
+    key = f"{execution_id}:{attempt_number}:{position}:{timestamp}:{log.message}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def to_utc_iso(timestamp: Optional[datetime.datetime]) -> Optional[str]:
+    # Stored as UTC ISO strings so they compare correctly as text
+    if timestamp is None:
+        return None
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+    return timestamp.astimezone(datetime.timezone.utc).isoformat()
+
+
+def make_snippet(message: str, query: str) -> str:
+    terms = [re.escape(term) for term in query.split() if term]
+    match = re.search("|".join(terms), message, re.IGNORECASE) if terms else None
+    if match is None:
+        return message[: SNIPPET_RADIUS * 2]
+    start = max(0, match.start() - SNIPPET_RADIUS)
+    end = min(len(message), match.end() + SNIPPET_RADIUS)
+    snippet = message[start:end]
+    snippet = re.sub(f"({'|'.join(terms)})", r"[\1]", snippet, flags=re.IGNORECASE)
+    return (
+        ("..." if start > 0 else "") + snippet + ("..." if end < len(message) else "")
+    )
+
+
+class LogSearchIndex(ABC):
+    """Inverted index over execution logs, filled as attempts are recorded."""
+
+    @abstractmethod
+    def index_logs(
+        self,
+        app_id: str,
+        agent_id: str,
+        execution_id: str,
+        attempt_number: int,
+        logs: List[ExecutionLog],
+        offset: int = 0,
+        sequence: Optional[int] = None,
+    ):
+        pass
+
+    @abstractmethod
+    def search(
+        self,
+        app_id: str,
+        query: str,
+        agent_id: Optional[str] = None,
+        severity: Optional[LogSeverity] = None,
+        start_time: Optional[datetime.datetime] = None,
+        end_time: Optional[datetime.datetime] = None,
+        limit: int = 50,
+    ) -> List[LogSearchResult]:
+        pass
+
+
+class SQLiteLogSearchIndex(LogSearchIndex):
+    """FTS5 index in a local SQLite file, for local development."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("LOG_SEARCH_DB", "local_dir/log_search.db")
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS execution_log (
+                    rowid INTEGER PRIMARY KEY,
+                    log_id TEXT UNIQUE,
+                    app_id TEXT,
+                    agent_id TEXT,
+                    execution_id TEXT,
+                    attempt_number INTEGER,
+                    severity TEXT,
+                    timestamp TEXT
+                );
+                CREATE INDEX IF NOT EXISTS execution_log_app_agent_time
+                    ON execution_log (app_id, agent_id, timestamp);
+                CREATE VIRTUAL TABLE IF NOT EXISTS execution_log_fts
+                    USING fts5(message);
+                """)
+
+    def index_logs(
+        self,
+        app_id: str,
+        agent_id: str,
+        execution_id: str,
+        attempt_number: int,
+        logs: List[ExecutionLog],
+        offset: int = 0,
+        sequence: Optional[int] = None,
+    ):
+        with self.lock, self.connection:
+            for index, log in enumerate(logs, start=offset):
+                cursor = self.connection.execute(
+                    "INSERT OR IGNORE INTO execution_log (log_id, app_id, agent_id, execution_id, attempt_number, severity, timestamp) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        get_log_id(execution_id, attempt_number, index, log, sequence),
+                        app_id,
+                        agent_id,
+                        execution_id,
+                        attempt_number,
+                        log.severity.value,
+                        to_utc_iso(log.timestamp),
+                    ),
+                )
+                if cursor.rowcount == 1:
+                    self.connection.execute(
+                        "INSERT INTO execution_log_fts (rowid, message) VALUES (?, ?)",
+                        (cursor.lastrowid, log.message),
+                    )
+
+    def search(
+        self,
+        app_id: str,
+        query: str,
+        agent_id: Optional[str] = None,
+        severity: Optional[LogSeverity] = None,
+        start_time: Optional[datetime.datetime] = None,
+        end_time: Optional[datetime.datetime] = None,
+        limit: int = 50,
+    ) -> List[LogSearchResult]:
+        # Quote every term so user input can't inject FTS5 query syntax
+        match = " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+        if not match:
+            return []
+        sql = (
+            "SELECT l.execution_id, l.agent_id, l.attempt_number, l.severity, l.timestamp, "
+            "snippet(execution_log_fts, 0, '[', ']', '...', 16) "
+            "FROM execution_log_fts JOIN execution_log l ON l.rowid = execution_log_fts.rowid "
+            "WHERE execution_log_fts MATCH ? AND l.app_id = ?"
+        )
+        params = [match, app_id]
+        if agent_id:
+            sql += " AND l.agent_id = ?"
+            params.append(agent_id)
+        if severity:
+            sql += " AND l.severity = ?"
+            params.append(severity.value)
+        if start_time:
+            sql += " AND l.timestamp >= ?"
+            params.append(to_utc_iso(start_time))
+        if end_time:
+            sql += " AND l.timestamp <= ?"
+            params.append(to_utc_iso(end_time))
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            rows = self.connection.execute(sql, params).fetchall()
+        return [
+            LogSearchResult(
+                execution_id=row[0],
+                agent_id=row[1],
+                attempt_number=row[2],
+                severity=row[3],
+                timestamp=row[4],
+                snippet=row[5],
+            )
+            for row in rows
+        ]
+
+
+class SupabaseLogSearchIndex(LogSearchIndex):
+    """Postgres full-text search over the execution_log table, whose
+    message_tsv column is a generated tsvector with a GIN index."""
+
+    def __init__(self):
+        self.supabase = create_client(
+            os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY")
+        )
+
+    def index_logs(
+        self,
+        app_id: str,
+        agent_id: str,
+        execution_id: str,
+        attempt_number: int,
+        logs: List[ExecutionLog],
+        offset: int = 0,
+        sequence: Optional[int] = None,
+    ):
+        if not logs:
+            return
+        rows = [
+            {
+                "id": get_log_id(execution_id, attempt_number, index, log, sequence),
+                "app_id": app_id,
+                "agent_id": agent_id,
+                "execution_id": execution_id,
+                "attempt_number": attempt_number,
+                "severity": log.severity.value,
+                "timestamp": log.timestamp.isoformat() if log.timestamp else None,
+                "message": log.message,
+            }
+            for index, log in enumerate(logs, start=offset)
+        ]
+        self.supabase.table("execution_log").upsert(
+            rows, ignore_duplicates=True
+        ).execute()
+
+    def search(
+        self,
+        app_id: str,
+        query: str,
+        agent_id: Optional[str] = None,
+        severity: Optional[LogSeverity] = None,
+        start_time: Optional[datetime.datetime] = None,
+        end_time: Optional[datetime.datetime] = None,
+        limit: int = 50,
+    ) -> List[LogSearchResult]:
+        if not query.strip():
+            return []
+        request = (
+            self.supabase.table("execution_log")
+            .select(
+                "execution_id, agent_id, attempt_number, severity, timestamp, message"
+            )
+            .filter("app_id", "eq", app_id)
+            .filter("message_tsv", "wfts", query)
+        )
+        if agent_id:
+            request = request.filter("agent_id", "eq", agent_id)
+        if severity:
+            request = request.filter("severity", "eq", severity.value)
+        if start_time:
+            request = request.filter("timestamp", "gte", start_time.isoformat())
+        if end_time:
+            request = request.filter("timestamp", "lte", end_time.isoformat())
+        response = request.order("timestamp", desc=True).limit(limit).execute()
+        return [
+            LogSearchResult(
+                execution_id=row["execution_id"],
+                agent_id=row["agent_id"],
+                attempt_number=row["attempt_number"],
+                severity=row["severity"],
+                timestamp=row["timestamp"],
+                snippet=make_snippet(row["message"], query),
+            )
+            for row in response.data
+        ]
+
+
+def get_log_search_index() -> LogSearchIndex:
+    if os.getenv("LOG_SEARCH_BACKEND", "supabase") == "sqlite":
+        return SQLiteLogSearchIndex()
+    return SupabaseLogSearchIndex()
@@ -1,2 +1,13 @@
-from .models import AppConfig, User, Agent, AgentStatus, Execution, ExecutionStatus
+from .models import (
+    AppConfig,
+    User,
+    Agent,
+    AgentStatus,
+    AgentVersion,
+    Execution,
+    ExecutionStatus,
+    Schedule,
+    Webhook,
+    WebhookDelivery,
+)
 from .api import GetAgentRequest, GetExecutionRequest
@@ -3,7 +3,14 @@ from enum import Enum
 import datetime
 import uuid
 from typing import List, Optional, Dict, Any
-from .models import AppConfig, User, Agent, ExecutionAttempt
+from .models import (
+    AppConfig,
+    User,
+    Agent,
+    ExecutionAttempt,
+    ExecutionLog,
+    ResultsReference,
+)
 
 
 class GetAgentRequest(BaseModel):
@@ -19,6 +26,12 @@ class DeployAgentRequest(BaseModel):
     agent_id: str
     agent_description: str
     num_retries: int
+    cache_ttl_seconds: Optional[int] = None
+    parallelism: Optional[int] = None
+
+
+class DeployAgentsRequest(BaseModel):
+    agent_ids: List[str]
 
 
 class DeleteAgentRequest(BaseModel):
@@ -29,10 +42,87 @@ class DeleteAgentRequest(BaseModel):
 class RunAgentRequest(BaseModel):
     agent_id: str
     input: Dict[str, Any] = {}
+    # Always start a fresh run, even if a cached result exists
+    bypass_cache: bool = False
+    # Run a specific agent version instead of the current one
+    version: Optional[int] = None
+    # Map mode: split these items into shards, each run by its own task
+    map_items: Optional[List[Any]] = None
+    shard_size: Optional[int] = None
 
 
 class LogExecutionAttemptRequest(BaseModel):
     execution_id: str
     agent_id: str
     results: Dict[str, Any]
+    results_ref: Optional[ResultsReference] = None
     attempt: ExecutionAttempt
+
+
+class AppendExecutionLogsRequest(BaseModel):
+    execution_id: str
+    agent_id: str
+    attempt_number: int
+    task_index: int = 0
+    # Orders the batches of an attempt and makes retried uploads idempotent
+    sequence: Optional[int] = None
+    logs: List[ExecutionLog]
+
+
+class UploadExecutionAttemptChunkRequest(BaseModel):
+    execution_id: str
+    agent_id: str
+    attempt_number: int
+    task_index: int = 0
+    chunk_index: int
+    data: str
+
+
+class CommitExecutionAttemptRequest(BaseModel):
+    execution_id: str
+    agent_id: str
+    attempt_number: int
+    task_index: int = 0
+    num_chunks: int
+    checksum: str
+
+
+class SaveCredentialsRequest(BaseModel):
+    credential_id: str
+    credentials: Dict[str, Any]
+
+
+class GetResultsUploadLinkRequest(BaseModel):
+    execution_id: str
+    agent_id: str
+    attempt_number: int
+    task_index: int = 0
+
+
+class CreateWebhookRequest(BaseModel):
+    url: str
+    agent_id: Optional[str] = None
+
+
+class DeleteWebhookRequest(BaseModel):
+    webhook_id: str
+
+
+class RecomputeAnalyticsRequest(BaseModel):
+    agent_id: Optional[str] = None
+
+
+class CreateScheduleRequest(BaseModel):
+    agent_id: str
+    cron: str
+    input: Dict[str, Any] = {}
+    jitter_seconds: Optional[int] = None
+
+
+class DeleteScheduleRequest(BaseModel):
+    schedule_id: str
+
+
+class RollbackAgentRequest(BaseModel):
+    agent_id: str
+    version: int
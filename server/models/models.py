@@ -4,6 +4,7 @@ from abc import ABC, abstractmethod
 from typing import List, Optional, Dict, Any, Tuple, Type, Union
 from enum import Enum
 import datetime
+import uuid
 
 
 class AppConfig(BaseModel):
@@ -39,14 +40,30 @@ class Agent(BaseModel):
     status: AgentStatus
     created_at: Optional[datetime.datetime] = None
     num_retries: int = 3
+    # Hash of the uploaded source archive and the image built from it
+    source_hash: Optional[str] = None
+    image_digest: Optional[str] = None
+    # Results of identical runs are reused for this long; off when not set
+    cache_ttl_seconds: Optional[int] = None
+    # Version whose image the agent's job currently runs
+    current_version: Optional[int] = None
+    # Tasks of a map execution that may run at once; no limit when not set
+    parallelism: Optional[int] = None
+    etag: Optional[str] = None
 
     @staticmethod
     def get_cloud_job_id(agent: "Agent") -> str:
         return f"job-{agent.finic_id}"
 
+    @staticmethod
+    def get_version_job_id(agent: "Agent", version: int) -> str:
+        return f"job-{agent.finic_id}-v{version}"
+
 
 class LogSeverity(str, Enum):
     DEFAULT = "DEFAULT"
+    DEBUG = "DEBUG"
+    INFO = "INFO"
     WARNING = "WARNING"
     ERROR = "ERROR"
 
@@ -54,6 +71,10 @@ class LogSeverity(str, Enum):
     def from_cloud_logging_severity(severity: str) -> "LogSeverity":
         if severity == "DEFAULT" or severity is None:
             return LogSeverity.DEFAULT
+        elif severity == "DEBUG":
+            return LogSeverity.DEBUG
+        elif severity in ["INFO", "NOTICE"]:
+            return LogSeverity.INFO
         elif severity == "WARNING":
             return LogSeverity.WARNING
         elif severity in ["ERROR", "CRITICAL", "ALERT", "EMERGENCY"]:
@@ -74,7 +95,49 @@ class ExecutionLog(BaseModel):
 class ExecutionAttempt(BaseModel):
     success: bool
     attempt_number: int
+    # Cloud Run task that made the attempt; always 0 unless a map execution
+    task_index: int = 0
     logs: List[ExecutionLog] = []
+    # False while only streamed logs have been received for the attempt
+    finished: bool = True
+
+
+class ExecutionLogBatch(BaseModel):
+    # Logs flushed by a running attempt, stored append-only until the
+    # attempt is recorded
+    execution_id: str
+    task_index: int = 0
+    attempt_number: int
+    sequence: int
+    logs: List[ExecutionLog] = []
+
+
+class LogSearchResult(BaseModel):
+    execution_id: str
+    agent_id: str
+    attempt_number: int
+    severity: LogSeverity
+    timestamp: Optional[datetime.datetime] = None
+    snippet: str
+
+
+class ResultsReference(BaseModel):
+    # Results too large to keep in the execution row live in blob storage
+    key: str
+    size: int
+    content_type: str = "application/json"
+
+
+class ExecutionTask(BaseModel):
+    # One task of a map execution. Tasks finish concurrently, so each keeps
+    # its attempts and results in its own row until the execution is settled.
+    execution_id: str
+    task_index: int
+    status: ExecutionStatus = ExecutionStatus.running
+    attempts: List[ExecutionAttempt] = []
+    results: Dict[str, Any] = {}
+    results_ref: Optional[ResultsReference] = None
+    etag: Optional[str] = None
 
 
 class Execution(BaseModel):
@@ -87,11 +150,141 @@ class Execution(BaseModel):
     start_time: Optional[datetime.datetime] = None
     end_time: Optional[datetime.datetime] = None
     results: Dict[str, Any] = {}
+    results_ref: Optional[ResultsReference] = None
     attempts: List[ExecutionAttempt] = []
+    # Map executions split their input items into shards of shard_size, one
+    # Cloud Run task each, and are the only ones with a shard_size. Offloaded
+    # results of their tasks are kept by task index.
+    task_count: int = 1
+    shard_size: Optional[int] = None
+    task_results_refs: Dict[int, ResultsReference] = {}
+    # Agent version that ran, and its Cloud Run job when pinned to a version
+    agent_version: Optional[int] = None
+    cloud_job_id: Optional[str] = None
+    # Hash of the image digest and canonical input, for result caching
+    input_hash: Optional[str] = None
+    # Execution whose results were reused, for a cache hit
+    cached_from: Optional[str] = None
+    # Set on every save; other servers poll it for status changes
+    updated_at: Optional[datetime.datetime] = None
+    etag: Optional[str] = None
 
     class Config:
         json_encoders = {datetime: lambda v: v.isoformat() if v else None}
 
+    @staticmethod
+    def get_task_results(
+        execution: "Execution", task_index: int
+    ) -> Optional[Tuple[Dict[str, Any], Optional[ResultsReference]]]:
+        """Results of one task of a settled map execution and, if they were
+        offloaded, their reference; None if there is no such task.
+
+        References were checked when their task was recorded. A cached
+        execution shares them with the run it was copied from, so they are
+        under that run's key prefix rather than its own."""
+        task_results = execution.results.get("results")
+        if execution.shard_size is None or not isinstance(task_results, list):
+            return None
+        if task_index < 0 or task_index >= len(task_results):
+            return None
+        return task_results[task_index], execution.task_results_refs.get(task_index)
+
+
+class Webhook(BaseModel):
+    id: str
+    app_id: str
+    url: str
+    secret: str
+    # Fires for every agent in the app when not set
+    agent_id: Optional[str] = None
+    created_at: Optional[datetime.datetime] = None
+
+
+class WebhookDeliveryStatus(str, Enum):
+    pending = "pending"
+    delivered = "delivered"
+    failed = "failed"
+
+
+class WebhookDelivery(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    webhook_id: str
+    app_id: str
+    event: Dict[str, Any]
+    status: WebhookDeliveryStatus = WebhookDeliveryStatus.pending
+    attempts: int = 0
+    next_attempt_at: datetime.datetime = Field(
+        default_factory=lambda: datetime.datetime.now(tz=datetime.timezone.utc)
+    )
+    last_error: Optional[str] = None
+
+
+class Schedule(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    app_id: str
+    # Scheduled runs use this user's secret key, like /run-agent calls
+    user_id: str
+    agent_id: str
+    cron: str
+    input: Dict[str, Any] = {}
+    # Each run starts up to this many seconds after its tick
+    jitter_seconds: int = 0
+    enabled: bool = True
+    next_run_at: datetime.datetime
+    last_run_at: Optional[datetime.datetime] = None
+    created_at: Optional[datetime.datetime] = None
+
+
+class ResultCacheEntry(BaseModel):
+    key: str
+    app_id: str
+    agent_id: str
+    execution_id: str
+    expires_at: datetime.datetime
+    created_at: datetime.datetime = Field(
+        default_factory=lambda: datetime.datetime.now(tz=datetime.timezone.utc)
+    )
+
+
+class AgentVersion(BaseModel):
+    # Written once per successful build and never updated
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    finic_agent_id: str
+    agent_id: str
+    app_id: str
+    version: int
+    image_digest: str
+    source_hash: Optional[str] = None
+    created_at: Optional[datetime.datetime] = None
+
+
+class RollupGranularity(str, Enum):
+    hour = "hour"
+    day = "day"
+
+
+class AgentRollup(BaseModel):
+    id: str
+    app_id: str
+    agent_id: str
+    granularity: RollupGranularity
+    bucket_start: datetime.datetime
+    status_counts: Dict[str, int] = {}
+    retries: int = 0
+    # Log-scale histogram of durations in seconds, keyed by bucket index
+    duration_sketch: Dict[str, int] = {}
+    # Replaced on every write, for optimistic concurrency
+    version: str = Field(default_factory=lambda: str(uuid.uuid4()))
+
+    @staticmethod
+    def get_id(
+        app_id: str,
+        agent_id: str,
+        granularity: RollupGranularity,
+        bucket_start: datetime.datetime,
+    ) -> str:
+        return f"{app_id}:{agent_id}:{granularity.value}:{bucket_start.isoformat()}"
+
 
 class FinicEnvironment(str, Enum):
     LOCAL = "local"
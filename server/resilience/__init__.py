@@ -0,0 +1,12 @@
+from .resilience import (
+    BreakerState,
+    BulkheadFullError,
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceededError,
+    Dependency,
+    DependencyUnavailableError,
+    ResilientClient,
+    get_dependency_states,
+    register_dependency,
+)
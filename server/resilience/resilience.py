@@ -0,0 +1,269 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from enum import Enum
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+import functools
+import inspect
+import random
+import threading
+import time
+
+# Methods with these prefixes only read, so they are safe to retry
+READ_PREFIXES = ("get_", "list_")
+
+
+class DependencyUnavailableError(Exception):
+    """A call was refused or abandoned without a result from the dependency."""
+
+    def __init__(self, dependency: str, message: str, retry_after: float = 1):
+        super().__init__(f"{dependency}: {message}")
+        self.dependency = dependency
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(DependencyUnavailableError):
+    pass
+
+
+class BulkheadFullError(DependencyUnavailableError):
+    pass
+
+
+class DeadlineExceededError(DependencyUnavailableError):
+    pass
+
+
+class BreakerState(str, Enum):
+    closed = "closed"
+    open = "open"
+    half_open = "half_open"
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and fails calls
+    fast for `reset_timeout` seconds. Then a single trial call is let
+    through: success closes the breaker, failure opens it again."""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    def _state(self) -> BreakerState:
+        if self.opened_at is None:
+            return BreakerState.closed
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return BreakerState.half_open
+        return BreakerState.open
+
+    @property
+    def state(self) -> BreakerState:
+        with self.lock:
+            return self._state()
+
+    def before_call(self):
+        with self.lock:
+            state = self._state()
+            if state == BreakerState.closed:
+                return
+            if state == BreakerState.half_open and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return
+            retry_after = max(self.reset_timeout - (self.clock() - self.opened_at), 1)
+        raise CircuitOpenError(self.name, "circuit breaker is open", retry_after)
+
+    def record_success(self):
+        with self.lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            if (
+                self.trial_in_flight
+                or self.consecutive_failures >= self.failure_threshold
+            ):
+                self.opened_at = self.clock()
+            self.trial_in_flight = False
+
+    def record_skipped(self):
+        # The call never reached the dependency, so it says nothing about it
+        with self.lock:
+            self.trial_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "state": self._state().value,
+                "consecutive_failures": self.consecutive_failures,
+            }
+
+
+class Dependency:
+    """Guards calls to one external service with a circuit breaker, a
+    concurrency bulkhead, a per-call deadline and jittered retries for
+    idempotent calls.
+
+    Calls run on the dependency's own thread pool so the caller can stop
+    waiting at the deadline. An abandoned call keeps its bulkhead slot until
+    it actually returns, so a hung dependency can't take more than
+    `max_concurrent` threads.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        deadline: float = 10,
+        max_concurrent: int = 16,
+        bulkhead_wait: float = 1,
+        retries: int = 2,
+        backoff: float = 0.1,
+        max_backoff: float = 2,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+        ignored_exceptions: Tuple[Type[Exception], ...] = (),
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.name = name
+        self.deadline = deadline
+        self.max_concurrent = max_concurrent
+        self.bulkhead_wait = bulkhead_wait
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.ignored_exceptions = ignored_exceptions
+        self.clock = clock
+        self.sleep = sleep
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout, clock)
+        self.bulkhead = threading.BoundedSemaphore(max_concurrent)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_concurrent, thread_name_prefix=f"dependency-{name}"
+        )
+        self.in_flight = 0
+        self.counter_lock = threading.Lock()
+
+    def call(self, fn: Callable, *args, idempotent: bool = False, **kwargs):
+        deadline = self.clock() + self.deadline
+        attempt = 0
+        while True:
+            try:
+                return self._call_once(fn, args, kwargs, deadline)
+            except DependencyUnavailableError:
+                raise
+            except self.ignored_exceptions:
+                raise
+            except Exception:
+                attempt += 1
+                if not idempotent or attempt > self.retries:
+                    raise
+                # Full jitter, never sleeping past the deadline
+                delay = random.uniform(
+                    0, min(self.max_backoff, self.backoff * 2**attempt)
+                )
+                if self.clock() + delay >= deadline:
+                    raise
+                self.sleep(delay)
+
+    def _call_once(self, fn: Callable, args, kwargs, deadline: float):
+        self.breaker.before_call()
+        if not self.bulkhead.acquire(timeout=self.bulkhead_wait):
+            self.breaker.record_skipped()
+            raise BulkheadFullError(
+                self.name, f"more than {self.max_concurrent} calls in flight"
+            )
+        with self.counter_lock:
+            self.in_flight += 1
+        future = self.executor.submit(self._run, fn, args, kwargs)
+        try:
+            result = future.result(timeout=max(deadline - self.clock(), 0))
+        except FutureTimeoutError:
+            self.breaker.record_failure()
+            raise DeadlineExceededError(
+                self.name, f"no response within {self.deadline}s"
+            )
+        except self.ignored_exceptions:
+            self.breaker.record_success()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def _run(self, fn: Callable, args, kwargs):
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self.counter_lock:
+                self.in_flight -= 1
+            self.bulkhead.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.breaker.snapshot(),
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+        }
+
+
+class ResilientClient:
+    """Proxy that sends a client's method calls through dependencies.
+
+    `methods` maps method names to the dependency that guards them; other
+    public methods go through `default` if one is given. Generator methods
+    are passed through, since their work happens while they are iterated.
+    """
+
+    def __init__(
+        self,
+        target: Any,
+        default: Optional[Dependency] = None,
+        methods: Optional[Dict[str, Dependency]] = None,
+    ):
+        self._target = target
+        self._default = default
+        self._methods = methods or {}
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._target, name)
+        dependency = self._methods.get(name)
+        if dependency is None and not name.startswith("_"):
+            dependency = self._default
+        if (
+            dependency is None
+            or not callable(attr)
+            or inspect.isgeneratorfunction(attr)
+        ):
+            return attr
+        idempotent = name.startswith(READ_PREFIXES)
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            return dependency.call(attr, *args, idempotent=idempotent, **kwargs)
+
+        return call
+
+
+_dependencies: Dict[str, Dependency] = {}
+
+
+def register_dependency(dependency: Dependency) -> Dependency:
+    _dependencies[dependency.name] = dependency
+    return dependency
+
+
+def get_dependency_states() -> Dict[str, Dict[str, Any]]:
+    return {name: dependency.snapshot() for name, dependency in _dependencies.items()}
@@ -0,0 +1,110 @@
+from typing import Dict, Optional
+from models.models import (
+    AppConfig,
+    Agent,
+    Execution,
+    ExecutionStatus,
+    ResultCacheEntry,
+)
+import datetime
+import hashlib
+import json
+import os
+import uuid
+
+# Most recent entries kept per agent; older ones are evicted
+MAX_ENTRIES_PER_AGENT = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 1000))
+
+
+def get_input_hash(
+    agent: Agent, input: Dict, shard_size: Optional[int] = None
+) -> Optional[str]:
+    """Cache key of a run: the agent, its deployed image and the input with
+    sorted keys and no whitespace, so equivalent JSON hashes the same. The
+    shard size of a map run is included, since results are listed per shard.
+    None when the agent doesn't use caching or has no known image."""
+    if not agent.cache_ttl_seconds or not agent.image_digest:
+        return None
+    canonical_input = json.dumps(
+        input, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    digest = hashlib.sha256()
+    digest.update(agent.finic_id.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(agent.image_digest.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(canonical_input.encode("utf-8"))
+    if shard_size is not None:
+        digest.update(f"\0{shard_size}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Reuses the results of successful runs with the same input hash."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def lookup(
+        self, config: AppConfig, agent: Agent, input_hash: str
+    ) -> Optional[Execution]:
+        """A completed execution with the cached results, or None."""
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
+        entry = self.db.get_result_cache_entry(
+            app_id=config.app_id, key=input_hash, now=now
+        )
+        if entry is None:
+            return None
+        source = self.db.get_execution(
+            config=config,
+            finic_agent_id=agent.finic_id,
+            execution_id=entry.execution_id,
+        )
+        if source is None or source.status != ExecutionStatus.successful:
+            return None
+        return Execution(
+            id=str(uuid.uuid4()),
+            finic_agent_id=agent.finic_id,
+            user_defined_agent_id=agent.id,
+            app_id=agent.app_id,
+            # Points at the run that produced the results, and its logs
+            cloud_provider_id=source.cloud_provider_id,
+            cloud_job_id=source.cloud_job_id,
+            agent_version=source.agent_version,
+            status=ExecutionStatus.successful,
+            start_time=now,
+            end_time=now,
+            results=source.results,
+            results_ref=source.results_ref,
+            task_count=source.task_count,
+            shard_size=source.shard_size,
+            task_results_refs=source.task_results_refs,
+            input_hash=input_hash,
+            cached_from=source.id,
+        )
+
+    def store(self, agent: Agent, execution: Execution):
+        if (
+            not agent.cache_ttl_seconds
+            or execution.input_hash is None
+            or execution.cached_from is not None
+            or execution.status != ExecutionStatus.successful
+        ):
+            return
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
+        self.db.upsert_result_cache_entry(
+            ResultCacheEntry(
+                key=execution.input_hash,
+                app_id=execution.app_id,
+                agent_id=agent.id,
+                execution_id=execution.id,
+                expires_at=now + datetime.timedelta(seconds=agent.cache_ttl_seconds),
+                created_at=now,
+            )
+        )
+        self.db.evict_result_cache_entries(
+            app_id=execution.app_id,
+            agent_id=agent.id,
+            now=now,
+            max_entries=MAX_ENTRIES_PER_AGENT,
+        )
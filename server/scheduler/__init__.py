@@ -0,0 +1,2 @@
+from .cron import CronExpression
+from .scheduler import AgentScheduler, get_jitter
@@ -0,0 +1,75 @@
+from typing import List, Set
+import datetime
+
+# (minimum, maximum) of each field of a five-field cron expression
+FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+# Far enough to find the next match of any valid expression, e.g. Feb 29
+MAX_SEARCH_DAYS = 366 * 8
+
+
+def parse_field(field: str, minimum: int, maximum: int) -> Set[int]:
+    values = set()
+    for part in field.split(","):
+        range_part, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if range_part == "*":
+            start, end = minimum, maximum
+        elif "-" in range_part:
+            start, end = (int(value) for value in range_part.split("-", 1))
+        else:
+            start = int(range_part)
+            end = maximum if step > 1 else start
+        if step < 1 or start < minimum or end > maximum or start > end:
+            raise ValueError(f"Invalid cron field: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronExpression:
+    """Standard five-field cron expression (minute hour day month weekday),
+    evaluated in UTC. Sunday is 0 and 7 is accepted as Sunday too. As in
+    cron, when both day fields are restricted a day matching either runs."""
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression must have 5 fields: {expression}")
+        fields[4] = ",".join(
+            "0" if part == "7" else part for part in fields[4].split(",")
+        )
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            parse_field(field, *FIELD_RANGES[i]) for i, field in enumerate(fields)
+        )
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def _matches_day(self, date: datetime.date) -> bool:
+        day = date.day in self.days
+        # date.weekday() is 0 for Monday, cron uses 0 for Sunday
+        weekday = (date.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, after: datetime.datetime) -> datetime.datetime:
+        """The first matching minute strictly after `after`."""
+        after = after.astimezone(datetime.timezone.utc)
+        start = after.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        date = start.date()
+        for _ in range(MAX_SEARCH_DAYS):
+            if date.month in self.months and self._matches_day(date):
+                for hour in sorted(self.hours):
+                    for minute in sorted(self.minutes):
+                        candidate = datetime.datetime(
+                            date.year,
+                            date.month,
+                            date.day,
+                            hour,
+                            minute,
+                            tzinfo=datetime.timezone.utc,
+                        )
+                        if candidate >= start:
+                            return candidate
+            date += datetime.timedelta(days=1)
+        raise ValueError(f"Cron expression never matches: {self.expression}")
@@ -0,0 +1,119 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from models.models import Schedule
+from .cron import CronExpression
+import asyncio
+import datetime
+import hashlib
+import heapq
+import os
+
+# Schedules created or changed on another worker are picked up this often
+REFRESH_INTERVAL = float(os.getenv("SCHEDULER_REFRESH_INTERVAL", 60))
+
+
+def get_jitter(schedule: Schedule, tick: datetime.datetime) -> datetime.timedelta:
+    # Derived from the schedule and tick, so every worker waits the same
+    # amount and they race on the same tick
+    if schedule.jitter_seconds <= 0:
+        return datetime.timedelta(0)
+    digest = hashlib.sha1(f"{schedule.id}:{tick.isoformat()}".encode("utf-8"))
+    return datetime.timedelta(
+        seconds=int(digest.hexdigest(), 16) % (schedule.jitter_seconds + 1)
+    )
+
+
+class AgentScheduler:
+    """Launches agent runs from the schedule table.
+
+    Each worker keeps the enabled schedules in a heap ordered by fire time
+    (tick plus jitter) and sleeps until the earliest one. To fire, a worker
+    moves the schedule's next_run_at from the tick to the next tick after
+    now; the update only matches for the first worker, so each tick launches
+    once. Computing the next tick from now also coalesces ticks that were
+    missed while no worker was running into a single run.
+    """
+
+    def __init__(self, db, launch: Callable[[Schedule], None]):
+        self.db = db
+        self.launch = launch
+        self.heap: List[Tuple[datetime.datetime, str, datetime.datetime]] = []
+        self.schedules: Dict[str, Schedule] = {}
+        self.wake_event: Optional[asyncio.Event] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def wake(self):
+        """Reload schedules now, after one was created or deleted. Safe to
+        call from worker threads."""
+        if self.wake_event is None or self.loop is None or self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self.wake_event.set)
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.wake_event = asyncio.Event()
+        while True:
+            try:
+                await self.refresh()
+                await self.fire_due(REFRESH_INTERVAL)
+            except Exception as e:
+                print(f"Error in scheduling agent runs: {e}")
+                await asyncio.sleep(REFRESH_INTERVAL)
+
+    async def refresh(self):
+        schedules = await asyncio.to_thread(self.db.list_enabled_schedules)
+        self.schedules = {schedule.id: schedule for schedule in schedules}
+        self.heap = [
+            (
+                schedule.next_run_at + get_jitter(schedule, schedule.next_run_at),
+                schedule.id,
+                schedule.next_run_at,
+            )
+            for schedule in schedules
+        ]
+        heapq.heapify(self.heap)
+
+    async def fire_due(self, duration: float):
+        """Fire schedules as they come due for `duration` seconds, or until
+        woken."""
+        loop = asyncio.get_running_loop()
+        until = loop.time() + duration
+        self.wake_event.clear()
+        while True:
+            now = datetime.datetime.now(tz=datetime.timezone.utc)
+            while self.heap and self.heap[0][0] <= now:
+                _, id, tick = heapq.heappop(self.heap)
+                await self.fire(self.schedules[id], tick, now)
+            timeout = until - loop.time()
+            if self.heap:
+                timeout = min(timeout, (self.heap[0][0] - now).total_seconds())
+            if timeout <= 0 and loop.time() >= until:
+                return
+            try:
+                await asyncio.wait_for(self.wake_event.wait(), max(timeout, 0))
+                return
+            except asyncio.TimeoutError:
+                pass
+
+    async def fire(
+        self, schedule: Schedule, tick: datetime.datetime, now: datetime.datetime
+    ):
+        next_run_at = CronExpression(schedule.cron).next_after(now)
+        claimed = await asyncio.to_thread(
+            self.db.claim_schedule_tick,
+            id=schedule.id,
+            tick=tick,
+            next_run_at=next_run_at,
+            now=now,
+        )
+        # Whether or not this worker won the tick, the next one is known
+        schedule.next_run_at = next_run_at
+        heapq.heappush(
+            self.heap,
+            (next_run_at + get_jitter(schedule, next_run_at), schedule.id, next_run_at),
+        )
+        if not claimed:
+            return
+        try:
+            await asyncio.to_thread(self.launch, schedule)
+        except Exception as e:
+            print(f"Error in launching scheduled run of {schedule.agent_id}: {e}")
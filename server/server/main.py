@@ -12,12 +12,15 @@ from fastapi import (
     Form,
     Query,
     BackgroundTasks,
+    WebSocket,
+    WebSocketDisconnect,
 )
 from fastapi.exceptions import RequestValidationError
 
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from fastapi.encoders import jsonable_encoder
 
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
@@ -26,20 +29,77 @@ from models.api import (
     GetAgentRequest,
     GetExecutionRequest,
     DeployAgentRequest,
+    DeployAgentsRequest,
     RunAgentRequest,
     LogExecutionAttemptRequest,
+    AppendExecutionLogsRequest,
+    UploadExecutionAttemptChunkRequest,
+    CommitExecutionAttemptRequest,
+    SaveCredentialsRequest,
+    GetResultsUploadLinkRequest,
+    CreateWebhookRequest,
+    DeleteWebhookRequest,
+    RecomputeAnalyticsRequest,
+    CreateScheduleRequest,
+    DeleteScheduleRequest,
+    RollbackAgentRequest,
 )
 import uuid
-from models.models import AppConfig, Agent, AgentStatus, Execution
+from models.models import (
+    AppConfig,
+    Agent,
+    AgentStatus,
+    Execution,
+    ExecutionAttempt,
+    ExecutionStatus,
+    ExecutionLog,
+    ExecutionLogBatch,
+    ExecutionTask,
+    LogSeverity,
+    ResultsReference,
+    RollupGranularity,
+    Schedule,
+    Webhook,
+)
 from database import Database
+from database.database import get_etag
 import io
 import datetime
 import pdb
 import logging
 import sentry_sdk
-from agent_runner import AgentRunner
+from agent_runner import (
+    AgentRunner,
+    MAP_ITEMS_KEY,
+    MAP_DEFAULT_SHARD_SIZE,
+    MAP_MAX_TASKS,
+)
 import json
+import hashlib
 from agent_deployer import AgentDeployer
+from blob_storage import get_blob_storage
+from webhooks import WebhookDispatcher
+from execution_events import ExecutionEventHub
+from log_search import get_log_search_index
+from analytics import RollupUpdater, compute_rollups, summarize_rollups
+from archive import ExecutionArchiver
+from archive.archive import ARCHIVE_AFTER_DAYS
+from export import ExportFormat, export_executions
+from scheduler import AgentScheduler, CronExpression
+from result_cache import ResultCache, get_input_hash
+from resilience import (
+    Dependency,
+    DependencyUnavailableError,
+    ResilientClient,
+    get_dependency_states,
+    register_dependency,
+)
+import asyncio
+import secrets
+import functools
+import anyio
+import time
+import math
 
 SENTRY_DSN = os.environ.get("SENTRY_DSN")
 sentry_sdk.init(
@@ -61,10 +121,163 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 bearer_scheme = HTTPBearer()
-db = Database()
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", 500))
+supabase_dependency = register_dependency(
+    Dependency(
+        "supabase",
+        deadline=float(os.getenv("SUPABASE_DEADLINE", 10)),
+        max_concurrent=int(os.getenv("SUPABASE_MAX_CONCURRENT", 32)),
+    )
+)
+cloud_run_dependency = register_dependency(
+    Dependency(
+        "cloud_run",
+        deadline=float(os.getenv("CLOUD_RUN_DEADLINE", 30)),
+        max_concurrent=int(os.getenv("CLOUD_RUN_MAX_CONCURRENT", 8)),
+    )
+)
+cloud_logging_dependency = register_dependency(
+    Dependency(
+        "cloud_logging",
+        deadline=float(os.getenv("CLOUD_LOGGING_DEADLINE", 30)),
+        max_concurrent=int(os.getenv("CLOUD_LOGGING_MAX_CONCURRENT", 8)),
+    )
+)
+cloud_storage_dependency = register_dependency(
+    Dependency(
+        "cloud_storage",
+        deadline=float(os.getenv("CLOUD_STORAGE_DEADLINE", 10)),
+        max_concurrent=int(os.getenv("CLOUD_STORAGE_MAX_CONCURRENT", 16)),
+    )
+)
+db = ResilientClient(Database(), default=supabase_dependency)
+webhook_dispatcher = WebhookDispatcher(db)
+execution_events = ExecutionEventHub(db)
+log_search_index = get_log_search_index()
+rollup_updater = RollupUpdater(db)
+archiver = ExecutionArchiver(db, get_blob_storage())
+result_cache = ResultCache(db)
+WEBSOCKET_SEND_TIMEOUT = float(os.getenv("WEBSOCKET_SEND_TIMEOUT", 10))
+SCHEDULE_DEFAULT_JITTER = int(os.getenv("SCHEDULE_DEFAULT_JITTER", 60))
+SERVER_THREADS = int(os.getenv("SERVER_THREADS", 100))
+
+
+app.state.ready = False
+app.state.warm_up_error = None
+background_tasks = []
+
+
+@functools.lru_cache(maxsize=None)
+def get_agent_runner() -> AgentRunner:
+    # Shared by all requests of a worker, so clients are only built once
+    return ResilientClient(
+        AgentRunner(),
+        methods={
+            "start_agent": cloud_run_dependency,
+            "get_logs_for_execution": cloud_logging_dependency,
+            "get_results_upload_link": cloud_storage_dependency,
+            "verify_results_ref": cloud_storage_dependency,
+        },
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_agent_deployer() -> AgentDeployer:
+    return ResilientClient(
+        AgentDeployer(),
+        methods={
+            "get_agent_upload_link": cloud_storage_dependency,
+            "get_agent_resumable_upload_link": cloud_storage_dependency,
+            "get_source_hash": cloud_storage_dependency,
+            "deploy_cached_image": cloud_run_dependency,
+            "deploy_agent": cloud_run_dependency,
+            "deploy_agents": cloud_run_dependency,
+            "deploy_version_job": cloud_run_dependency,
+        },
+    )
+
+
+def to_http_exception(e: Exception) -> HTTPException:
+    # A dependency that is down or overloaded is a 503 the client can retry
+    if isinstance(e, DependencyUnavailableError):
+        return HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
+    return HTTPException(status_code=500, detail=str(e))
+
+
+@app.on_event("startup")
+async def warm_up():
+    # Handlers are sync and run on AnyIO's thread pool. It must be larger
+    # than the bulkheads combined, or one saturated dependency could hold
+    # every thread and stall requests to the others.
+    anyio.to_thread.current_default_thread_limiter().total_tokens = SERVER_THREADS
+    # Build the GCP clients before reporting ready, so the first requests
+    # don't pay for credential parsing and channel setup
+    try:
+        await asyncio.to_thread(get_agent_runner)
+        await asyncio.to_thread(get_agent_deployer)
+        app.state.ready = True
+    except Exception as e:
+        print(f"Error in warming up: {e}")
+        app.state.warm_up_error = str(e)
+
+
+@app.on_event("startup")
+async def start_webhook_dispatcher():
+    background_tasks.append(asyncio.create_task(webhook_dispatcher.run()))
+
+
+@app.on_event("startup")
+async def start_execution_events():
+    background_tasks.append(asyncio.create_task(execution_events.run()))
+
+
+@app.on_event("startup")
+async def start_scheduler():
+    background_tasks.append(asyncio.create_task(scheduler.run()))
+
+
+@app.on_event("startup")
+async def start_archiver():
+    if ARCHIVE_AFTER_DAYS:
+        background_tasks.append(asyncio.create_task(archiver.run()))
+
+
+@app.on_event("shutdown")
+async def drain():
+    # Uvicorn has already stopped accepting connections and waited for
+    # in-flight requests; stop the background loops before exiting
+    app.state.ready = False
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+
+
+@app.get("/live")
+async def live():
+    return {"status": "live"}
+
+
+@app.get("/ready")
+async def ready():
+    if not app.state.ready:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "not ready", "error": app.state.warm_up_error},
+        )
+    return {"status": "ready"}
+
+
+@app.get("/dependency-status")
+async def dependency_status():
+    return get_dependency_states()
 
 
 @app.exception_handler(RequestValidationError)
@@ -77,12 +290,14 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     )
 
 
-async def validate_token(
+def validate_token(
     credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
 ):
     try:
         print(credentials.credentials)
         app_config = db.get_config(credentials.credentials)
+    except DependencyUnavailableError as e:
+        raise to_http_exception(e)
     except Exception:
         print(credentials.credentials)
         raise HTTPException(status_code=401, detail="Invalid or missing public key")
@@ -92,7 +307,7 @@ async def validate_token(
     return app_config
 
 
-async def validate_optional_token(
+def validate_optional_token(
     credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
 ):
     try:
@@ -104,8 +319,58 @@ async def validate_optional_token(
     return app_config
 
 
+def etag_matches(request: Request, etag: Optional[str]) -> bool:
+    if etag is None:
+        return False
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/").strip('"') == etag for tag in tags)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": f'"{etag}"'}
+    )
+
+
+def etag_response(content, etag: Optional[str]) -> JSONResponse:
+    # no-cache makes browsers revalidate with If-None-Match on every poll
+    headers = {"Cache-Control": "no-cache"}
+    if etag is not None:
+        headers["ETag"] = f'"{etag}"'
+    return JSONResponse(content=jsonable_encoder(content), headers=headers)
+
+
+def save_execution(
+    execution: Execution,
+    previous_status: Optional[ExecutionStatus] = None,
+    expected_status: Optional[ExecutionStatus] = None,
+) -> bool:
+    """Persist an execution and, if its status changed, notify WebSocket
+    subscribers, queue completion webhooks and update the rollups.
+
+    With an expected_status, the execution is only written if the stored one
+    still has that status; False is returned if it didn't."""
+    if expected_status is not None:
+        if not db.update_execution_if_status(execution, expected_status):
+            return False
+    else:
+        db.upsert_execution(execution)
+    if execution.status != previous_status:
+        execution_events.publish(execution)
+        webhook_dispatcher.enqueue_completion(execution)
+        if previous_status == ExecutionStatus.running:
+            try:
+                rollup_updater.record_execution(execution)
+            except Exception as e:
+                print(e)
+    return True
+
+
 def deploy_agent_background(agent: Agent):
-    deployer = AgentDeployer()
+    deployer = get_agent_deployer()
     try:
         deployer.deploy_agent(agent=agent)
         agent.status = AgentStatus.deployed
@@ -117,7 +382,7 @@ def deploy_agent_background(agent: Agent):
 
 
 @app.post("/deploy-agent")
-async def deploy_agent(
+def deploy_agent(
     # background_tasks: BackgroundTasks,
     request: DeployAgentRequest = Body(...),
     config: AppConfig = Depends(validate_token),
@@ -125,32 +390,135 @@ async def deploy_agent(
     try:
         agent = db.get_agent(config=config, id=request.agent_id)
         agent.status = AgentStatus.deploying
+        if request.cache_ttl_seconds is not None:
+            agent.cache_ttl_seconds = request.cache_ttl_seconds
+        if request.parallelism is not None:
+            agent.parallelism = request.parallelism
         db.upsert_agent(agent)
         # background_tasks.add_task(deploy_agent_background, agent)
-        deployer = AgentDeployer()
+        deployer = get_agent_deployer()
         secret_key = db.get_secret_key_for_user(config.user_id)
         try:
-            deployer.deploy_agent(agent=agent, secret_key=secret_key)
+            source_hash = deployer.get_source_hash(agent=agent)
+            cached_image = source_hash and db.get_cached_image(
+                app_id=agent.app_id, source_hash=source_hash
+            )
+            if cached_image:
+                # Identical source was built before: reuse its image
+                deployer.deploy_cached_image(agent=agent, image=cached_image)
+                agent.status = AgentStatus.deployed
+                agent.source_hash = source_hash
+                agent.image_digest = cached_image
+                version = db.insert_agent_version(
+                    agent=agent, image_digest=cached_image
+                )
+                agent.current_version = version.version
+                db.upsert_agent(agent)
+                return agent
+            deployer.deploy_agent(
+                agent=agent, secret_key=secret_key, source_hash=source_hash
+            )
             agent.status = AgentStatus.deploying
             db.upsert_agent(agent)
             return agent
         except Exception as e:
             agent.status = AgentStatus.failed
             db.upsert_agent(agent)
-            raise HTTPException(status_code=500, detail=str(e))
+            raise to_http_exception(e)
+
+    except Exception as e:
+        print(e)
+        raise to_http_exception(e)
+
+
+@app.get("/list-agent-versions")
+def list_agent_versions(
+    agent_id: str = Query(...),
+    config: AppConfig = Depends(validate_token),
+):
+    try:
+        agent = db.get_agent(config=config, id=agent_id)
+        if agent is None:
+            raise HTTPException(status_code=404, detail=f"Agent {agent_id} not found")
+        return db.list_agent_versions(finic_agent_id=agent.finic_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(e)
+        raise to_http_exception(e)
+
 
+@app.post("/rollback-agent")
+def rollback_agent(
+    request: RollbackAgentRequest = Body(...),
+    config: AppConfig = Depends(validate_token),
+):
+    try:
+        agent = db.get_agent(config=config, id=request.agent_id)
+        if agent is None:
+            raise HTTPException(
+                status_code=404, detail=f"Agent {request.agent_id} not found"
+            )
+        version = db.get_agent_version(
+            finic_agent_id=agent.finic_id, version=request.version
+        )
+        if version is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Version {request.version} of agent {request.agent_id} not found",
+            )
+        # Re-points the job at the version's digest; nothing is rebuilt
+        get_agent_deployer().deploy_cached_image(
+            agent=agent, image=version.image_digest
+        )
+        agent.status = AgentStatus.deployed
+        agent.image_digest = version.image_digest
+        agent.source_hash = version.source_hash
+        agent.current_version = version.version
+        db.upsert_agent(agent)
+        return agent
+    except HTTPException:
+        raise
     except Exception as e:
         print(e)
-        raise HTTPException(status_code=500, detail=str(e))
+        raise to_http_exception(e)
+
+
+@app.post("/deploy-agents")
+def deploy_agents(
+    request: DeployAgentsRequest = Body(...),
+    config: AppConfig = Depends(validate_token),
+):
+    try:
+        agents = []
+        for agent_id in request.agent_ids:
+            agent = db.get_agent(config=config, id=agent_id)
+            if agent is None:
+                raise HTTPException(
+                    status_code=404, detail=f"Agent {agent_id} not found"
+                )
+            agents.append(agent)
+        deployer = get_agent_deployer()
+        secret_key = db.get_secret_key_for_user(config.user_id)
+        deployer.deploy_agents(agents=agents, secret_key=secret_key)
+        for agent in agents:
+            agent.status = AgentStatus.deploying
+            db.upsert_agent(agent)
+        return agents
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(e)
+        raise to_http_exception(e)
 
 
 @app.post("/get-agent-upload-link")
-async def get_agent_upload_link(
+def get_agent_upload_link(
     request: DeployAgentRequest = Body(...),
     config: AppConfig = Depends(validate_token),
 ):
     try:
-        deployer = AgentDeployer()
+        deployer = get_agent_deployer()
         agent = db.get_agent(config=config, id=request.agent_id)
         if agent is None:
             agent = Agent(
@@ -159,94 +527,428 @@ async def get_agent_upload_link(
                 id=request.agent_id,
                 description=request.agent_description,
                 num_retries=request.num_retries,
+                cache_ttl_seconds=request.cache_ttl_seconds,
+                parallelism=request.parallelism,
                 status="deploying",
             )
             db.upsert_agent(agent)
         link = deployer.get_agent_upload_link(agent=agent)
-        return {"upload_link": link}
+        resumable_link = deployer.get_agent_resumable_upload_link(agent=agent)
+        return {"upload_link": link, "resumable_upload_link": resumable_link}
     except Exception as e:
         print(e)
-        raise HTTPException(status_code=500, detail=str(e))
+        raise to_http_exception(e)
+
+
+def launch_agent(
+    config: AppConfig,
+    agent_id: str,
+    input: dict,
+    bypass_cache: bool = False,
+    version: Optional[int] = None,
+    map_items: Optional[List[Any]] = None,
+    shard_size: Optional[int] = None,
+) -> Execution:
+    runner = get_agent_runner()
+    if map_items is not None:
+        shard_size = shard_size or MAP_DEFAULT_SHARD_SIZE
+        if not map_items or shard_size < 1:
+            raise HTTPException(
+                status_code=400, detail="Map runs need items and a positive shard size"
+            )
+        if math.ceil(len(map_items) / shard_size) > MAP_MAX_TASKS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Map runs are limited to {MAP_MAX_TASKS} tasks; use a larger shard size",
+            )
+        input = {**input, MAP_ITEMS_KEY: map_items}
+    else:
+        shard_size = None
+    agent = db.get_agent(config=config, id=agent_id)
+    if agent is None:
+        raise HTTPException(status_code=404, detail=f"Agent {agent_id} not found")
+    job_id = None
+    if version is not None and version != agent.current_version:
+        agent_version = db.get_agent_version(
+            finic_agent_id=agent.finic_id, version=version
+        )
+        if agent_version is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Version {version} of agent {agent_id} not found",
+            )
+        job_id = get_agent_deployer().deploy_version_job(
+            agent=agent, version=agent_version
+        )
+        agent = agent.copy(update={"image_digest": agent_version.image_digest})
+    input_hash = get_input_hash(agent, input, shard_size)
+    if input_hash and not bypass_cache:
+        cached_execution = result_cache.lookup(
+            config=config, agent=agent, input_hash=input_hash
+        )
+        if cached_execution is not None:
+            save_execution(cached_execution)
+            return cached_execution
+    secret_key = db.get_secret_key_for_user(config.user_id)
+    execution = runner.start_agent(
+        secret_key=secret_key,
+        agent=agent,
+        input=input,
+        job_id=job_id,
+        shard_size=shard_size,
+    )
+    execution.input_hash = input_hash
+    execution.agent_version = version if version is not None else agent.current_version
+    execution.cloud_job_id = job_id
+    save_execution(execution)
+    return execution
+
+
+def launch_scheduled_run(schedule: Schedule):
+    config = AppConfig(user_id=schedule.user_id, app_id=schedule.app_id)
+    launch_agent(config=config, agent_id=schedule.agent_id, input=schedule.input)
+
+
+scheduler = AgentScheduler(db, launch_scheduled_run)
 
 
 @app.post("/run-agent")
-async def run_agent(
+def run_agent(
     request: RunAgentRequest = Body(...),
     config: AppConfig = Depends(validate_token),
 ):
     try:
-        runner = AgentRunner()
-        agent = db.get_agent(config=config, id=request.agent_id)
-        if agent is None:
-            raise HTTPException(
-                status_code=404, detail=f"Agent {request.agent_id} not found"
-            )
-        secret_key = db.get_secret_key_for_user(config.user_id)
-        execution = runner.start_agent(
-            secret_key=secret_key, agent=agent, input=request.input
+        return launch_agent(
+            config=config,
+            agent_id=request.agent_id,
+            input=request.input,
+            bypass_cache=request.bypass_cache,
+            version=request.version,
+            map_items=request.map_items,
+            shard_size=request.shard_size,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(e)
+        raise to_http_exception(e)
+
+
+def index_logs(
+    config: AppConfig,
+    agent_id: str,
+    execution_id: str,
+    attempt_number: int,
+    logs: List[ExecutionLog],
+    offset: int = 0,
+    sequence: Optional[int] = None,
+):
+    # Search is best effort, so a failure here never fails the request
+    try:
+        log_search_index.index_logs(
+            app_id=config.app_id,
+            agent_id=agent_id,
+            execution_id=execution_id,
+            attempt_number=attempt_number,
+            logs=logs,
+            offset=offset,
+            sequence=sequence,
         )
-        db.upsert_execution(execution)
-        return execution
     except Exception as e:
         print(e)
-        raise HTTPException(status_code=500, detail=str(e))
+
+
+def record_task_attempt(
+    config: AppConfig,
+    agent: Agent,
+    execution: Execution,
+    attempt: ExecutionAttempt,
+    batches: List[ExecutionLogBatch],
+    results: Dict,
+    results_ref: Optional[ResultsReference],
+) -> Execution:
+    """Record an attempt of one task of a map execution.
+
+    Tasks finish concurrently, so each one writes only its own row and then
+    reads all of them. The execution row is written once, by a task that
+    finds them settled, and only while it is still running."""
+    runner = get_agent_runner()
+    task = db.get_execution_task(
+        config=config, execution_id=execution.id, task_index=attempt.task_index
+    ) or ExecutionTask(execution_id=execution.id, task_index=attempt.task_index)
+    task.attempts = AgentRunner.merge_flushed_logs(task.attempts, batches)
+    task = runner.update_task(
+        agent=agent,
+        task=task,
+        attempt=attempt,
+        results=results,
+        results_ref=results_ref,
+    )
+    db.upsert_execution_task(config=config, task=task)
+    if execution.status != ExecutionStatus.running:
+        return execution
+
+    tasks = db.list_execution_tasks(config=config, execution_id=execution.id)
+    updated_execution = AgentRunner.update_map_execution(
+        execution=execution.copy(deep=True), tasks=tasks
+    )
+    if updated_execution.status == ExecutionStatus.running:
+        return updated_execution
+    if not save_execution(
+        updated_execution,
+        previous_status=ExecutionStatus.running,
+        expected_status=ExecutionStatus.running,
+    ):
+        # Another task settled the execution first
+        return db.get_execution(
+            config=config,
+            finic_agent_id=execution.finic_agent_id,
+            execution_id=execution.id,
+        )
+    return updated_execution
+
+
+def is_attempt_recorded(
+    config: AppConfig, execution: Execution, attempt_number: int, task_index: int
+) -> bool:
+    if execution.shard_size is None:
+        return AgentRunner.is_attempt_recorded(execution, attempt_number, task_index)
+    task = db.get_execution_task(
+        config=config, execution_id=execution.id, task_index=task_index
+    )
+    return task is not None and AgentRunner.is_attempt_recorded(
+        task, attempt_number, task_index
+    )
+
+
+def record_execution_attempt(
+    config: AppConfig, request: LogExecutionAttemptRequest
+) -> Execution:
+    runner = get_agent_runner()
+    attempt = request.attempt
+    agent = db.get_agent(config=config, id=request.agent_id)
+    if agent is None:
+        raise HTTPException(
+            status_code=404, detail=f"Agent {request.agent_id} not found"
+        )
+    execution = db.get_execution(
+        config=config,
+        finic_agent_id=agent.finic_id,
+        execution_id=request.execution_id,
+    )
+    results_ref = request.results_ref and runner.verify_results_ref(
+        app_id=config.app_id,
+        execution_id=request.execution_id,
+        results_ref=request.results_ref,
+    )
+    previous_status = execution.status
+    new_logs = attempt.logs
+    batches = db.list_execution_log_batches(
+        config=config, execution_id=execution.id, task_index=attempt.task_index
+    )
+    if execution.shard_size is not None:
+        updated_execution = record_task_attempt(
+            config=config,
+            agent=agent,
+            execution=execution,
+            attempt=attempt,
+            batches=batches,
+            results=request.results,
+            results_ref=results_ref,
+        )
+    else:
+        execution.attempts = AgentRunner.merge_flushed_logs(execution.attempts, batches)
+        updated_execution = runner.update_execution(
+            agent=agent,
+            execution=execution,
+            attempt=attempt,
+            results=request.results,
+            results_ref=results_ref,
+        )
+        save_execution(updated_execution, previous_status=previous_status)
+    if batches:
+        db.delete_execution_log_batches(
+            config=config,
+            execution_id=execution.id,
+            task_index=attempt.task_index,
+            max_attempt_number=attempt.attempt_number,
+        )
+    if previous_status != ExecutionStatus.successful:
+        try:
+            result_cache.store(agent=agent, execution=updated_execution)
+        except Exception as e:
+            print(e)
+    # Logs flushed earlier are already indexed and come first in the attempt
+    index_logs(
+        config=config,
+        agent_id=updated_execution.user_defined_agent_id,
+        execution_id=updated_execution.id,
+        attempt_number=attempt.attempt_number,
+        logs=new_logs,
+        offset=len(attempt.logs) - len(new_logs),
+    )
+    return updated_execution
 
 
 @app.post("/log-execution-attempt")
-async def log_execution_attempt(
+def log_execution_attempt(
     request: LogExecutionAttemptRequest = Body(...),
     config: AppConfig = Depends(validate_token),
 ):
     try:
-        runner = AgentRunner()
-        attempt = request.attempt
+        return record_execution_attempt(config=config, request=request)
+    except Exception as e:
+        print(e)
+        raise to_http_exception(e)
+
+
+@app.post("/upload-execution-attempt-chunk")
+def upload_execution_attempt_chunk(
+    request: UploadExecutionAttemptChunkRequest = Body(...),
+    config: AppConfig = Depends(validate_token),
+):
+    try:
+        db.upsert_execution_attempt_chunk(
+            config=config,
+            execution_id=request.execution_id,
+            attempt_number=request.attempt_number,
+            chunk_index=request.chunk_index,
+            data=request.data,
+            task_index=request.task_index,
+        )
+        return {"chunk_index": request.chunk_index}
+    except Exception as e:
+        print(e)
+        raise to_http_exception(e)
+
+
+@app.post("/commit-execution-attempt")
+def commit_execution_attempt(
+    request: CommitExecutionAttemptRequest = Body(...),
+    config: AppConfig = Depends(validate_token),
+):
+    try:
+        chunks = db.list_execution_attempt_chunks(
+            config=config,
+            execution_id=request.execution_id,
+            attempt_number=request.attempt_number,
+            task_index=request.task_index,
+        )
+        if not chunks:
+            # A retried commit whose first call already went through
+            agent = db.get_agent(config=config, id=request.agent_id)
+            execution = agent and db.get_execution(
+                config=config,
+                finic_agent_id=agent.finic_id,
+                execution_id=request.execution_id,
+            )
+            if execution and is_attempt_recorded(
+                config, execution, request.attempt_number, request.task_index
+            ):
+                return {"committed": True, "execution": execution}
+        received = {index for index, _ in chunks}
+        missing = [i for i in range(request.num_chunks) if i not in received]
+        if missing:
+            raise HTTPException(
+                status_code=409, detail=f"Missing attempt chunks: {missing}"
+            )
+        data = "".join(chunk for index, chunk in chunks if index < request.num_chunks)
+        if hashlib.sha256(data.encode("utf-8")).hexdigest() != request.checksum:
+            raise HTTPException(
+                status_code=400, detail="Attempt checksum does not match"
+            )
+        attempt_request = LogExecutionAttemptRequest(**json.loads(data))
+        execution = record_execution_attempt(config=config, request=attempt_request)
+        db.delete_execution_attempt_chunks(
+            config=config,
+            execution_id=request.execution_id,
+            attempt_number=request.attempt_number,
+            task_index=request.task_index,
+        )
+        return {"committed": True, "execution": execution}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(e)
+        raise to_http_exception(e)
+
+
+@app.post("/append-execution-logs")
+def append_execution_logs(
+    request: AppendExecutionLogsRequest = Body(...),
+    config: AppConfig = Depends(validate_token),
+):
+    try:
         agent = db.get_agent(config=config, id=request.agent_id)
         if agent is None:
             raise HTTPException(
                 status_code=404, detail=f"Agent {request.agent_id} not found"
             )
-        execution = db.get_execution(
+        # Old clients send no sequence; the arrival time still orders them
+        sequence = request.sequence
+        if sequence is None:
+            sequence = time.time_ns()
+        db.insert_execution_log_batch(
             config=config,
-            finic_agent_id=agent.finic_id,
-            execution_id=request.execution_id,
+            batch=ExecutionLogBatch(
+                execution_id=request.execution_id,
+                task_index=request.task_index,
+                attempt_number=request.attempt_number,
+                sequence=sequence,
+                logs=request.logs,
+            ),
         )
-        updated_execution = runner.update_execution(
-            agent=agent, execution=execution, attempt=attempt, results=request.results
+        index_logs(
+            config=config,
+            agent_id=agent.id,
+            execution_id=request.execution_id,
+            attempt_number=request.attempt_number,
+            logs=request.logs,
+            sequence=sequence,
         )
-        db.upsert_execution(updated_execution)
-        return execution
+        return {"appended": len(request.logs)}
+    except HTTPException:
+        raise
     except Exception as e:
         print(e)
-        raise HTTPException(status_code=500, detail=str(e))
+        raise to_http_exception(e)
 
 
 @app.get("/get-agent")
-async def get_agent(
+def get_agent(
+    request: Request,
     agent_id: str = Query(...),
     config: AppConfig = Depends(validate_token),
 ):
     try:
+        etag = db.get_agent_etag(config=config, id=agent_id)
+        if etag_matches(request, etag):
+            return not_modified(etag)
         agent = db.get_agent(config=config, id=agent_id)
-        return agent
+        return etag_response(agent, agent.etag if agent else None)
     except Exception as e:
         print(e)
-        raise HTTPException(status_code=500, detail=str(e))
+        raise to_http_exception(e)
 
 
 @app.get("/list-agents")
-async def list_agents(
+def list_agents(
+    request: Request,
     config: AppConfig = Depends(validate_token),
 ):
     try:
+        etag = db.get_agents_etag(config=config)
+        if etag_matches(request, etag):
+            return not_modified(etag)
         agents = db.list_agents(config=config)
-        return agents
+        return etag_response(agents, get_etag({a.id: a.etag for a in agents}))
     except Exception as e:
         print(e)
-        raise HTTPException(status_code=500, detail=str(e))
+        raise to_http_exception(e)
 
 
 @app.post("/delete-agent")
-async def delete_agent(
+def delete_agent(
     request: DeployAgentRequest = Body(...),
     config: AppConfig = Depends(validate_token),
 ):
@@ -254,7 +956,7 @@ async def delete_agent(
         agent = db.get_agent(config=config, id=request.agent_id)
         agent.status = AgentStatus.deploying
         db.upsert_agent(agent)
-        deployer = AgentDeployer()
+        deployer = get_agent_deployer()
         try:
             deployer.deploy_agent(agent=agent)
             agent.status = AgentStatus.deployed
@@ -263,31 +965,161 @@ async def delete_agent(
         except Exception as e:
             agent.status = AgentStatus.failed
             db.upsert_agent(agent)
-            raise HTTPException(status_code=500, detail=str(e))
+            raise to_http_exception(e)
     except Exception as e:
         print(e)
-        raise HTTPException(status_code=500, detail=str(e))
+        raise to_http_exception(e)
 
 
 @app.get("/get-execution")
-async def get_execution(
+def get_execution(
+    request: Request,
     execution_id: str = Query(...),
     agent_id: str = Query(...),
     config: AppConfig = Depends(validate_token),
 ):
     try:
+        etag = db.get_execution_etag(
+            config=config, user_defined_agent_id=agent_id, execution_id=execution_id
+        )
+        # Logs flushed by running attempts, and the tasks of a map execution,
+        # live outside the execution row
+        batch_keys = db.list_execution_log_batch_keys(
+            config=config, execution_id=execution_id
+        )
+        task_etags = db.list_execution_task_etags(
+            config=config, execution_id=execution_id
+        )
+        if etag is not None and (batch_keys or task_etags):
+            etag = get_etag(
+                {"execution": etag, "log_batches": batch_keys, "tasks": task_etags}
+            )
+        if etag_matches(request, etag):
+            return not_modified(etag)
         agent = db.get_agent(config=config, id=agent_id)
         execution = db.get_execution(
             config=config, finic_agent_id=agent.finic_id, execution_id=execution_id
         )
-        return execution
+        if (
+            execution is not None
+            and task_etags
+            and execution.status == ExecutionStatus.running
+        ):
+            tasks = db.list_execution_tasks(config=config, execution_id=execution_id)
+            execution.attempts = AgentRunner.get_task_attempts(tasks)
+        if execution is not None and batch_keys:
+            batches = db.list_execution_log_batches(
+                config=config, execution_id=execution_id
+            )
+            execution.attempts = AgentRunner.merge_flushed_logs(
+                execution.attempts, batches
+            )
+        return etag_response(execution, etag if execution else None)
+    except Exception as e:
+        print(e)
+        raise to_http_exception(e)
+
+
+@app.get("/get-execution-logs")
+def get_execution_logs(
+    execution_id: str = Query(...),
+    agent_id: str = Query(...),
+    config: AppConfig = Depends(validate_token),
+):
+    try:
+        agent = db.get_agent(config=config, id=agent_id)
+        if agent is None:
+            raise HTTPException(status_code=404, detail=f"Agent {agent_id} not found")
+        execution = db.get_execution(
+            config=config, finic_agent_id=agent.finic_id, execution_id=execution_id
+        )
+        if execution is None:
+            raise HTTPException(
+                status_code=404, detail=f"Execution {execution_id} not found"
+            )
+        runner = get_agent_runner()
+        logs = runner.get_logs_for_execution(execution=execution, agent=agent)
+        attempts = execution.attempts
+        if (
+            execution.shard_size is not None
+            and execution.status == ExecutionStatus.running
+        ):
+            tasks = db.list_execution_tasks(config=config, execution_id=execution.id)
+            attempts = AgentRunner.get_task_attempts(tasks)
+        return AgentRunner.attach_logs(attempts, logs)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(e)
+        raise to_http_exception(e)
+
+
+@app.post("/get-results-upload-link")
+def get_results_upload_link(
+    request: GetResultsUploadLinkRequest = Body(...),
+    config: AppConfig = Depends(validate_token),
+):
+    try:
+        runner = get_agent_runner()
+        key, url = runner.get_results_upload_link(
+            app_id=config.app_id,
+            execution_id=request.execution_id,
+            attempt_number=request.attempt_number,
+            task_index=request.task_index,
+        )
+        return {"key": key, "upload_link": url}
     except Exception as e:
         print(e)
-        raise HTTPException(status_code=500, detail=str(e))
+        raise to_http_exception(e)
+
+
+@app.get("/get-execution-results")
+def get_execution_results(
+    execution_id: str = Query(...),
+    agent_id: str = Query(...),
+    task_index: Optional[int] = Query(None),
+    config: AppConfig = Depends(validate_token),
+):
+    try:
+        agent = db.get_agent(config=config, id=agent_id)
+        if agent is None:
+            raise HTTPException(status_code=404, detail=f"Agent {agent_id} not found")
+        execution = db.get_execution(
+            config=config, finic_agent_id=agent.finic_id, execution_id=execution_id
+        )
+        if execution is None:
+            raise HTTPException(
+                status_code=404, detail=f"Execution {execution_id} not found"
+            )
+        results_ref = execution.results_ref
+        if task_index is not None:
+            # The results of one task of a map execution
+            task_results = Execution.get_task_results(execution, task_index)
+            if task_results is None:
+                raise HTTPException(
+                    status_code=404, detail=f"Task {task_index} not found"
+                )
+            results, results_ref = task_results
+            if results_ref is None:
+                return results
+        if results_ref is None:
+            return execution.results
+        # Stream offloaded results straight from storage
+        blob_storage = get_blob_storage()
+        return StreamingResponse(
+            blob_storage.stream(results_ref.key),
+            media_type=results_ref.content_type,
+            headers={"Content-Length": str(results_ref.size)},
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(e)
+        raise to_http_exception(e)
 
 
 @app.get("/list-executions")
-async def list_executions(
+def list_executions(
     agent_id: Optional[str] = Query(None),
     finic_agent_id: Optional[str] = Query(None),
     config: AppConfig = Depends(validate_token),
@@ -302,7 +1134,303 @@ async def list_executions(
         return executions
     except Exception as e:
         print(e)
-        raise HTTPException(status_code=500, detail=str(e))
+        raise to_http_exception(e)
+
+
+@app.get("/search-logs")
+def search_logs(
+    query: str = Query(...),
+    agent_id: Optional[str] = Query(None),
+    severity: Optional[LogSeverity] = Query(None),
+    start_time: Optional[datetime.datetime] = Query(None),
+    end_time: Optional[datetime.datetime] = Query(None),
+    limit: int = Query(50, ge=1, le=500),
+    config: AppConfig = Depends(validate_token),
+):
+    try:
+        return log_search_index.search(
+            app_id=config.app_id,
+            query=query,
+            agent_id=agent_id,
+            severity=severity,
+            start_time=start_time,
+            end_time=end_time,
+            limit=limit,
+        )
+    except Exception as e:
+        print(e)
+        raise to_http_exception(e)
+
+
+@app.post("/create-schedule")
+def create_schedule(
+    request: CreateScheduleRequest = Body(...),
+    config: AppConfig = Depends(validate_token),
+):
+    try:
+        cron = CronExpression(request.cron)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        agent = db.get_agent(config=config, id=request.agent_id)
+        if agent is None:
+            raise HTTPException(
+                status_code=404, detail=f"Agent {request.agent_id} not found"
+            )
+        jitter_seconds = request.jitter_seconds
+        if jitter_seconds is None:
+            jitter_seconds = SCHEDULE_DEFAULT_JITTER
+        schedule = db.upsert_schedule(
+            Schedule(
+                app_id=config.app_id,
+                user_id=config.user_id,
+                agent_id=request.agent_id,
+                cron=request.cron,
+                input=request.input,
+                jitter_seconds=jitter_seconds,
+                next_run_at=cron.next_after(
+                    datetime.datetime.now(tz=datetime.timezone.utc)
+                ),
+            )
+        )
+        scheduler.wake()
+        return schedule
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(e)
+        raise to_http_exception(e)
+
+
+@app.get("/list-schedules")
+def list_schedules(
+    agent_id: Optional[str] = Query(None),
+    config: AppConfig = Depends(validate_token),
+):
+    try:
+        return db.list_schedules(config=config, agent_id=agent_id)
+    except Exception as e:
+        print(e)
+        raise to_http_exception(e)
+
+
+@app.post("/delete-schedule")
+def delete_schedule(
+    request: DeleteScheduleRequest = Body(...),
+    config: AppConfig = Depends(validate_token),
+):
+    try:
+        db.delete_schedule(config=config, id=request.schedule_id)
+        scheduler.wake()
+        return {"schedule_id": request.schedule_id}
+    except Exception as e:
+        print(e)
+        raise to_http_exception(e)
+
+
+@app.get("/get-agent-analytics")
+def get_agent_analytics(
+    agent_id: str = Query(...),
+    granularity: RollupGranularity = Query(RollupGranularity.hour),
+    start_time: Optional[datetime.datetime] = Query(None),
+    end_time: Optional[datetime.datetime] = Query(None),
+    config: AppConfig = Depends(validate_token),
+):
+    try:
+        rollups = db.list_rollups(
+            config=config,
+            agent_id=agent_id,
+            granularity=granularity,
+            start_time=start_time,
+            end_time=end_time,
+        )
+        return {
+            "agent_id": agent_id,
+            "granularity": granularity,
+            **summarize_rollups(rollups),
+        }
+    except Exception as e:
+        print(e)
+        raise to_http_exception(e)
+
+
+@app.post("/recompute-analytics")
+def recompute_analytics(
+    request: RecomputeAnalyticsRequest = Body(...),
+    config: AppConfig = Depends(validate_token),
+):
+    try:
+        executions = db.list_executions(
+            config=config, user_defined_agent_id=request.agent_id
+        )
+        # Buckets that may have lost executions to the archive are kept
+        cutoff = ExecutionArchiver.get_cutoff()
+        rollups = compute_rollups(executions, complete_after=cutoff)
+        db.upsert_rollups(rollups)
+        return {"rollups": len(rollups), "skipped_before": cutoff}
+    except Exception as e:
+        print(e)
+        raise to_http_exception(e)
+
+
+@app.get("/export-executions")
+def export_executions_endpoint(
+    format: ExportFormat = Query(ExportFormat.ndjson),
+    agent_id: Optional[str] = Query(None),
+    status: Optional[ExecutionStatus] = Query(None),
+    start_time: Optional[datetime.datetime] = Query(None),
+    end_time: Optional[datetime.datetime] = Query(None),
+    config: AppConfig = Depends(validate_token),
+):
+    executions = db.iter_executions(
+        config=config,
+        user_defined_agent_id=agent_id,
+        status=status,
+        start_time=start_time,
+        end_time=end_time,
+        page_size=EXPORT_PAGE_SIZE,
+    )
+    filename = f"executions.{format.value}"
+    return StreamingResponse(
+        export_executions(executions, format),
+        media_type=format.media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.get("/list-archived-executions")
+def list_archived_executions(
+    agent_id: Optional[str] = Query(None),
+    start_date: Optional[datetime.date] = Query(None),
+    end_date: Optional[datetime.date] = Query(None),
+    status: Optional[ExecutionStatus] = Query(None),
+    execution_id: Optional[str] = Query(None),
+    config: AppConfig = Depends(validate_token),
+):
+    try:
+        return archiver.query(
+            app_id=config.app_id,
+            agent_id=agent_id,
+            start_date=start_date,
+            end_date=end_date,
+            status=status,
+            execution_id=execution_id,
+        )
+    except Exception as e:
+        print(e)
+        raise to_http_exception(e)
+
+
+@app.get("/list-credentials")
+def list_credentials(
+    config: AppConfig = Depends(validate_token),
+):
+    try:
+        return db.list_credentials(config=config)
+    except Exception as e:
+        print(e)
+        raise to_http_exception(e)
+
+
+@app.post("/save-credentials")
+def save_credentials(
+    request: SaveCredentialsRequest = Body(...),
+    config: AppConfig = Depends(validate_token),
+):
+    try:
+        db.upsert_credentials(
+            config=config,
+            credential_id=request.credential_id,
+            credentials=request.credentials,
+        )
+        return {"credential_id": request.credential_id}
+    except Exception as e:
+        print(e)
+        raise to_http_exception(e)
+
+
+@app.post("/create-webhook")
+def create_webhook(
+    request: CreateWebhookRequest = Body(...),
+    config: AppConfig = Depends(validate_token),
+):
+    try:
+        # The secret is returned once, here, so receivers can verify the
+        # X-Finic-Signature HMAC of each delivery
+        webhook = Webhook(
+            id=str(uuid.uuid4()),
+            app_id=config.app_id,
+            url=request.url,
+            secret=secrets.token_hex(32),
+            agent_id=request.agent_id,
+        )
+        return db.upsert_webhook(webhook)
+    except Exception as e:
+        print(e)
+        raise to_http_exception(e)
+
+
+@app.get("/list-webhooks")
+def list_webhooks(
+    config: AppConfig = Depends(validate_token),
+):
+    try:
+        webhooks = db.list_webhooks(config=config)
+        return [webhook.dict(exclude={"secret"}) for webhook in webhooks]
+    except Exception as e:
+        print(e)
+        raise to_http_exception(e)
+
+
+@app.post("/delete-webhook")
+def delete_webhook(
+    request: DeleteWebhookRequest = Body(...),
+    config: AppConfig = Depends(validate_token),
+):
+    try:
+        db.delete_webhook(config=config, id=request.webhook_id)
+        return {"webhook_id": request.webhook_id}
+    except Exception as e:
+        print(e)
+        raise to_http_exception(e)
+
+
+@app.websocket("/subscribe-executions")
+async def subscribe_executions(
+    websocket: WebSocket,
+    token: str = Query(...),
+    agent_id: Optional[str] = Query(None),
+):
+    # Browsers can't set headers on WebSockets, so the key is a query param
+    config = await asyncio.to_thread(db.get_config, token)
+    if config is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    subscription = execution_events.subscribe(app_id=config.app_id, agent_id=agent_id)
+    receiver = asyncio.create_task(websocket.receive_text())
+    try:
+        while True:
+            sender = asyncio.create_task(subscription.queue.get())
+            done, _ = await asyncio.wait(
+                [sender, receiver], return_when=asyncio.FIRST_COMPLETED
+            )
+            if receiver in done:
+                # Client messages are ignored; result() raises on disconnect
+                sender.cancel()
+                receiver.result()
+                receiver = asyncio.create_task(websocket.receive_text())
+                continue
+            # A client that stops reading is dropped rather than holding the
+            # send forever
+            await asyncio.wait_for(
+                websocket.send_json(sender.result()), timeout=WEBSOCKET_SEND_TIMEOUT
+            )
+    except (WebSocketDisconnect, asyncio.TimeoutError):
+        pass
+    finally:
+        receiver.cancel()
+        execution_events.unsubscribe(subscription)
 
 
 @app.get("/sentry-debug")
@@ -311,10 +1439,21 @@ async def trigger_error():
 
 
 def start():
+    port = int(os.getenv("PORT", 8080))
+    if os.getenv("SERVER_RELOAD", "false").lower() == "true":
+        uvicorn.run(
+            "server.main:app",
+            host="0.0.0.0",
+            port=port,
+            reload=True,
+            reload_excludes="subprocess_env/**",
+        )
+        return
     uvicorn.run(
         "server.main:app",
         host="0.0.0.0",
-        port=8080,
-        reload=True,
-        reload_excludes="subprocess_env/**",
+        port=port,
+        workers=int(os.getenv("SERVER_WORKERS", os.cpu_count() or 1)),
+        timeout_keep_alive=int(os.getenv("SERVER_KEEP_ALIVE", 5)),
+        proxy_headers=True,
     )
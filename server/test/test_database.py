@@ -0,0 +1,72 @@
+import unittest
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from database import Database
+from models.models import Execution, ExecutionStatus
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeTable:
+    """Stands in for a Supabase table: upserted rows are returned as stored."""
+
+    def __init__(self):
+        self.payload = None
+
+    def upsert(self, payload, **kwargs):
+        self.payload = payload
+        return self
+
+    def execute(self):
+        return FakeResponse([self.payload])
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.tables = {}
+
+    def table(self, name: str) -> FakeTable:
+        return self.tables.setdefault(name, FakeTable())
+
+
+def make_database() -> Database:
+    db = Database.__new__(Database)
+    db.supabase = FakeSupabase()
+    return db
+
+
+def make_execution() -> Execution:
+    return Execution(
+        id="execution",
+        finic_agent_id="finic-agent",
+        user_defined_agent_id="agent",
+        app_id="app",
+        cloud_provider_id="run",
+        status=ExecutionStatus.running,
+    )
+
+
+class TestExecutionEtag(unittest.TestCase):
+    def test_saving_an_unchanged_execution_keeps_its_etag(self):
+        db = make_database()
+        saved = db.upsert_execution(make_execution())
+        self.assertIsNotNone(saved.updated_at)
+        resaved = db.upsert_execution(saved)
+        self.assertEqual(resaved.etag, saved.etag)
+
+    def test_changing_an_execution_changes_its_etag(self):
+        db = make_database()
+        saved = db.upsert_execution(make_execution())
+        saved.status = ExecutionStatus.successful
+        resaved = db.upsert_execution(saved)
+        self.assertNotEqual(resaved.etag, saved.etag)
+
+
+if __name__ == "__main__":
+    unittest.main()
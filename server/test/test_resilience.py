@@ -0,0 +1,194 @@
+import unittest
+import os
+import sys
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from resilience import (
+    BreakerState,
+    BulkheadFullError,
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceededError,
+    Dependency,
+    ResilientClient,
+    get_dependency_states,
+    register_dependency,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+class FaultyService:
+    """Fake dependency that fails a set number of times before answering,
+    and can be made to hang until released."""
+
+    def __init__(self, failures: int = 0, error: Exception = None):
+        self.failures = failures
+        self.error = error or ConnectionError("injected failure")
+        self.calls = 0
+        self.hang = threading.Event()
+        self.release = threading.Event()
+
+    def get_value(self):
+        self.calls += 1
+        if self.hang.is_set():
+            self.release.wait(5)
+        if self.calls <= self.failures:
+            raise self.error
+        return "value"
+
+    def update_value(self):
+        return self.get_value()
+
+    def list_values(self):
+        yield "value"
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_after_threshold_and_fails_fast(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(
+            "test", failure_threshold=3, reset_timeout=30, clock=clock
+        )
+        for _ in range(3):
+            breaker.before_call()
+            breaker.record_failure()
+        self.assertEqual(breaker.state, BreakerState.open)
+        with self.assertRaises(CircuitOpenError) as context:
+            breaker.before_call()
+        self.assertEqual(context.exception.retry_after, 30)
+
+    def test_half_open_allows_one_trial(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(
+            "test", failure_threshold=1, reset_timeout=10, clock=clock
+        )
+        breaker.before_call()
+        breaker.record_failure()
+        clock.advance(10)
+        self.assertEqual(breaker.state, BreakerState.half_open)
+        breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, BreakerState.closed)
+
+    def test_failed_trial_opens_again(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(
+            "test", failure_threshold=1, reset_timeout=10, clock=clock
+        )
+        breaker.before_call()
+        breaker.record_failure()
+        clock.advance(10)
+        breaker.before_call()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, BreakerState.open)
+
+
+class TestDependency(unittest.TestCase):
+    def make_dependency(self, **kwargs) -> Dependency:
+        options = {"deadline": 1, "backoff": 0, "sleep": lambda seconds: None}
+        options.update(kwargs)
+        return Dependency("test", **options)
+
+    def test_idempotent_calls_retry_transient_failures(self):
+        service = FaultyService(failures=2)
+        dependency = self.make_dependency(retries=2)
+        result = dependency.call(service.get_value, idempotent=True)
+        self.assertEqual(result, "value")
+        self.assertEqual(service.calls, 3)
+
+    def test_writes_are_not_retried(self):
+        service = FaultyService(failures=1)
+        dependency = self.make_dependency(retries=2)
+        with self.assertRaises(ConnectionError):
+            dependency.call(service.update_value)
+        self.assertEqual(service.calls, 1)
+
+    def test_failures_open_the_breaker(self):
+        service = FaultyService(failures=100)
+        dependency = self.make_dependency(retries=0, failure_threshold=2)
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                dependency.call(service.get_value, idempotent=True)
+        with self.assertRaises(CircuitOpenError):
+            dependency.call(service.get_value, idempotent=True)
+        self.assertEqual(service.calls, 2)
+        self.assertEqual(dependency.snapshot()["state"], BreakerState.open.value)
+
+    def test_ignored_exceptions_do_not_trip_the_breaker(self):
+        service = FaultyService(failures=100, error=KeyError("not found"))
+        dependency = self.make_dependency(
+            retries=0, failure_threshold=1, ignored_exceptions=(KeyError,)
+        )
+        for _ in range(3):
+            with self.assertRaises(KeyError):
+                dependency.call(service.get_value, idempotent=True)
+        self.assertEqual(dependency.breaker.state, BreakerState.closed)
+
+    def test_hanging_call_hits_the_deadline(self):
+        service = FaultyService()
+        service.hang.set()
+        dependency = self.make_dependency(deadline=0.05, failure_threshold=1)
+        try:
+            with self.assertRaises(DeadlineExceededError):
+                dependency.call(service.get_value, idempotent=True)
+            self.assertEqual(dependency.breaker.state, BreakerState.open)
+        finally:
+            service.release.set()
+
+    def test_full_bulkhead_rejects_without_tripping_the_breaker(self):
+        service = FaultyService()
+        service.hang.set()
+        dependency = self.make_dependency(
+            deadline=0.05, max_concurrent=1, bulkhead_wait=0.01, failure_threshold=5
+        )
+        try:
+            with self.assertRaises(DeadlineExceededError):
+                dependency.call(service.get_value)
+            # The abandoned call still holds the only slot
+            with self.assertRaises(BulkheadFullError):
+                dependency.call(service.get_value)
+            self.assertEqual(dependency.breaker.consecutive_failures, 1)
+            self.assertEqual(dependency.snapshot()["in_flight"], 1)
+        finally:
+            service.release.set()
+
+
+class TestResilientClient(unittest.TestCase):
+    def test_reads_are_retried_and_writes_are_not(self):
+        dependency = Dependency(
+            "client", deadline=1, backoff=0, retries=1, sleep=lambda seconds: None
+        )
+        client = ResilientClient(FaultyService(failures=1), default=dependency)
+        self.assertEqual(client.get_value(), "value")
+        client = ResilientClient(FaultyService(failures=1), default=dependency)
+        with self.assertRaises(ConnectionError):
+            client.update_value()
+
+    def test_generators_are_passed_through(self):
+        dependency = Dependency("client", deadline=1)
+        client = ResilientClient(FaultyService(), default=dependency)
+        self.assertEqual(list(client.list_values()), ["value"])
+        self.assertEqual(dependency.snapshot()["in_flight"], 0)
+
+    def test_registered_states_are_visible(self):
+        register_dependency(Dependency("visible", deadline=1))
+        states = get_dependency_states()
+        self.assertEqual(states["visible"]["state"], BreakerState.closed.value)
+
+
+if __name__ == "__main__":
+    unittest.main()
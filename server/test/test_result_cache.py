@@ -0,0 +1,96 @@
+import unittest
+import datetime
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from models.models import (
+    Agent,
+    AgentStatus,
+    AppConfig,
+    Execution,
+    ExecutionStatus,
+    ResultCacheEntry,
+    ResultsReference,
+)
+from result_cache import ResultCache
+
+CONFIG = AppConfig(user_id="user", app_id="app")
+
+
+class FakeDatabase:
+    def __init__(self, source: Execution):
+        self.source = source
+
+    def get_result_cache_entry(self, app_id: str, key: str, now: datetime.datetime):
+        return ResultCacheEntry(
+            key=key,
+            app_id=app_id,
+            agent_id="agent",
+            execution_id=self.source.id,
+            expires_at=now + datetime.timedelta(hours=1),
+        )
+
+    def get_execution(self, config: AppConfig, finic_agent_id: str, execution_id: str):
+        if execution_id == self.source.id:
+            return self.source
+        return None
+
+
+def make_agent() -> Agent:
+    return Agent(
+        finic_id="finic-agent",
+        id="agent",
+        app_id="app",
+        description="",
+        status=AgentStatus.deployed,
+        cache_ttl_seconds=3600,
+    )
+
+
+def make_map_execution() -> Execution:
+    return Execution(
+        id="source",
+        finic_agent_id="finic-agent",
+        user_defined_agent_id="agent",
+        app_id="app",
+        cloud_provider_id="run",
+        status=ExecutionStatus.successful,
+        results={"results": [{"count": 1}, None]},
+        task_count=2,
+        shard_size=10,
+        task_results_refs={
+            1: ResultsReference(key="results/app/source/task-1/0.json", size=42)
+        },
+    )
+
+
+class TestCachedMapExecution(unittest.TestCase):
+    def setUp(self):
+        cache = ResultCache(FakeDatabase(make_map_execution()))
+        self.execution = cache.lookup(CONFIG, make_agent(), input_hash="hash")
+
+    def test_copies_the_map_results(self):
+        self.assertEqual(self.execution.cached_from, "source")
+        self.assertEqual(self.execution.shard_size, 10)
+        self.assertEqual(self.execution.task_count, 2)
+
+    def test_inline_task_results(self):
+        results, results_ref = Execution.get_task_results(self.execution, 0)
+        self.assertEqual(results, {"count": 1})
+        self.assertIsNone(results_ref)
+
+    def test_offloaded_task_results_keep_the_source_key(self):
+        results, results_ref = Execution.get_task_results(self.execution, 1)
+        self.assertIsNone(results)
+        self.assertEqual(results_ref.key, "results/app/source/task-1/0.json")
+        self.assertEqual(results_ref.size, 42)
+
+    def test_unknown_task(self):
+        self.assertIsNone(Execution.get_task_results(self.execution, 2))
+        self.assertIsNone(Execution.get_task_results(self.execution, -1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+import asyncio
+import os
+import sys
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from scheduler import AgentScheduler
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.refreshed = threading.Semaphore(0)
+
+    def list_enabled_schedules(self):
+        self.refreshed.release()
+        return []
+
+
+class TestAgentScheduler(unittest.IsolatedAsyncioTestCase):
+    async def test_wake_from_a_worker_thread_reloads_schedules(self):
+        db = FakeDatabase()
+        scheduler = AgentScheduler(db, launch=lambda schedule: None)
+        task = asyncio.create_task(scheduler.run())
+        try:
+            self.assertTrue(await asyncio.to_thread(db.refreshed.acquire, timeout=1))
+            # Handlers run on the thread pool, like create_schedule does
+            await asyncio.to_thread(scheduler.wake)
+            self.assertTrue(await asyncio.to_thread(db.refreshed.acquire, timeout=1))
+        finally:
+            task.cancel()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1 @@
+from .webhooks import WebhookDispatcher
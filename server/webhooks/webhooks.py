@@ -0,0 +1,146 @@
+from typing import Dict, List
+from collections import defaultdict
+from models.models import Execution, ExecutionStatus, WebhookDelivery
+from database import Database
+import asyncio
+import datetime
+import hashlib
+import hmac
+import json
+import os
+import random
+import time
+import httpx
+
+POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", 2))
+BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", 100))
+MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", 8))
+# A claimed delivery is retried by any worker once its lease runs out
+CLAIM_LEASE = datetime.timedelta(minutes=5)
+
+
+def sign_payload(secret: str, timestamp: str, body: bytes) -> str:
+    message = timestamp.encode("utf-8") + b"." + body
+    return hmac.new(secret.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+
+class WebhookDispatcher:
+    """Delivers execution completion events through the webhook_delivery outbox.
+
+    Events are written to the outbox in the request that finishes the
+    execution and sent by a background loop, so a slow receiver never delays
+    the API. Due deliveries for the same subscription are sent together in
+    one signed POST. Failed sends are retried with jittered exponential
+    backoff until MAX_ATTEMPTS.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def enqueue_completion(self, execution: Execution):
+        if execution.status not in (ExecutionStatus.successful, ExecutionStatus.failed):
+            return
+        subscriptions = self.db.list_webhooks_for_agent(
+            app_id=execution.app_id, agent_id=execution.user_defined_agent_id
+        )
+        if not subscriptions:
+            return
+        event = {
+            "type": "execution.completed",
+            "execution_id": execution.id,
+            "agent_id": execution.user_defined_agent_id,
+            "app_id": execution.app_id,
+            "status": execution.status.value,
+            "start_time": (
+                execution.start_time.isoformat() if execution.start_time else None
+            ),
+            "end_time": execution.end_time.isoformat() if execution.end_time else None,
+        }
+        self.db.insert_webhook_deliveries(
+            [
+                WebhookDelivery(
+                    webhook_id=subscription.id,
+                    app_id=execution.app_id,
+                    event=event,
+                )
+                for subscription in subscriptions
+            ]
+        )
+
+    async def run(self):
+        async with httpx.AsyncClient(timeout=10) as client:
+            while True:
+                try:
+                    delivered = await self.dispatch_due(client)
+                except Exception as e:
+                    print(f"Error in dispatching webhooks: {e}")
+                    delivered = 0
+                if delivered < BATCH_SIZE:
+                    await asyncio.sleep(POLL_INTERVAL)
+
+    async def dispatch_due(self, client: httpx.AsyncClient) -> int:
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
+        deliveries = await asyncio.to_thread(
+            self.db.claim_webhook_deliveries,
+            now=now,
+            lease_until=now + CLAIM_LEASE,
+            limit=BATCH_SIZE,
+        )
+        if not deliveries:
+            return 0
+        by_webhook: Dict[str, List[WebhookDelivery]] = defaultdict(list)
+        for delivery in deliveries:
+            by_webhook[delivery.webhook_id].append(delivery)
+        webhooks = await asyncio.to_thread(
+            self.db.get_webhooks, ids=list(by_webhook.keys())
+        )
+        await asyncio.gather(
+            *[
+                self._send(client, webhooks.get(webhook_id), batch)
+                for webhook_id, batch in by_webhook.items()
+            ]
+        )
+        return len(deliveries)
+
+    async def _send(
+        self, client: httpx.AsyncClient, webhook, batch: List[WebhookDelivery]
+    ):
+        if webhook is None:
+            # Subscription was deleted after the events were queued
+            await asyncio.to_thread(
+                self.db.mark_webhook_deliveries_failed,
+                ids=[d.id for d in batch],
+                error="Webhook deleted",
+            )
+            return
+        body = json.dumps({"events": [d.event for d in batch]}).encode("utf-8")
+        timestamp = str(int(time.time()))
+        headers = {
+            "Content-Type": "application/json",
+            "X-Finic-Timestamp": timestamp,
+            "X-Finic-Signature": f"sha256={sign_payload(webhook.secret, timestamp, body)}",
+        }
+        try:
+            response = await client.post(webhook.url, content=body, headers=headers)
+            response.raise_for_status()
+        except Exception as e:
+            await asyncio.to_thread(self._reschedule, batch, str(e))
+            return
+        await asyncio.to_thread(
+            self.db.mark_webhook_deliveries_delivered, ids=[d.id for d in batch]
+        )
+
+    def _reschedule(self, batch: List[WebhookDelivery], error: str):
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
+        for delivery in batch:
+            attempts = delivery.attempts + 1
+            if attempts >= MAX_ATTEMPTS:
+                self.db.mark_webhook_deliveries_failed(ids=[delivery.id], error=error)
+                continue
+            delay = min(2**attempts, 3600) * (0.5 + random.random())
+            self.db.reschedule_webhook_delivery(
+                id=delivery.id,
+                attempts=attempts,
+                next_attempt_at=now + datetime.timedelta(seconds=delay),
+                error=error,
+            )